@@ -15,3 +15,8 @@ struct ChatMessage: Identifiable, Codable {
     let text: String
     let timestamp: Date = Date()
 }
+
+// Chat messages sent close together arrive as one frame
+struct ChatBatch: Codable {
+    let messages: [ChatMessage]
+}
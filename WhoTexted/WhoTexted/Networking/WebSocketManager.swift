@@ -96,6 +96,11 @@ class WebSocketManager: NSObject, ObservableObject, URLSessionWebSocketDelegate
 
                 case .string(let text):
                     if let data = text.data(using: .utf8) {
+                        // Answer the server's heartbeat, or it drops us while we sit quiet
+                        if self.isPing(data) {
+                            self.sendDictionary(["type": "pong"])
+                            break
+                        }
                         NotificationCenter.default.post(
                             name: .webSocketDidReceiveData,
                             object: data
@@ -112,6 +117,13 @@ class WebSocketManager: NSObject, ObservableObject, URLSessionWebSocketDelegate
         }
     }
 
+    private func isPing(_ data: Data) -> Bool {
+        guard let json = try? JSONSerialization.jsonObject(with: data) as? [String: Any] else {
+            return false
+        }
+        return json["type"] as? String == "ping"
+    }
+
     // MARK: - DELEGATE (DETECT CONNECTION OPEN)
     func urlSession(_ session: URLSession,
                     webSocketTask: URLSessionWebSocketTask,
@@ -98,6 +98,11 @@ class GameViewModel: ObservableObject {
                 if let message = self.decodeMessage(from: data) {
                     self.messages.append(message)
                 }
+
+            case "chat_batch":
+                if let batch = try? JSONDecoder().decode(ChatBatch.self, from: data) {
+                    self.messages.append(contentsOf: batch.messages)
+                }
                 
             default:
                 print("[GameVM] Unknown message type: \(envelope.type)")
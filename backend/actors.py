@@ -0,0 +1,85 @@
+"""
+Per-room actors: everything that happens to a room runs in that room's actor, one event at a time.
+- An actor is a mailbox and a task draining it. Requests, phase timers, chat
+  flushes and disconnects for a room are posted to its mailbox rather than run
+  where they arrive, so one transition never interleaves with another event for
+  the same room, even across an await in a handler
+- The task takes everything queued as one batch and applies it in order. What
+  the batch sends is held in an Outbox and delivered once the batch is done, so
+  the room is encoded once per batch rather than once per event (see broadcaster.py)
+- Events posted while a batch runs or is being delivered make up the next batch
+- Actors only exist while they have work: the task exits once the mailbox is
+  empty, so idle rooms cost nothing
+"""
+import asyncio
+from collections import deque
+import inspect
+
+from broadcaster import holding
+from logger import get_logger
+from metrics import ROOM_BATCH_EVENTS
+
+log = get_logger("actors")
+
+
+class RoomActor:
+    __slots__ = ("room_id", "mailbox", "task")
+
+    def __init__(self, room_id: str):
+        self.room_id = room_id
+        self.mailbox = deque()  # (event name, callback, args, future resolved once it has run)
+        self.task = None
+
+
+class RoomActors:
+    def __init__(self):
+        self._actors = {}  # room_id -> RoomActor with events queued or running
+
+    def post(self, room_id: str, event: str, callback, *args) -> asyncio.Future:
+        """
+        Queues callback(*args) in the room's actor; callback may be a plain function
+        or a coroutine function. The returned future resolves once it has run and
+        what its batch sent is queued for delivery; it can be ignored.
+        """
+        actor = self._actors.get(room_id)
+        if actor is None:
+            actor = self._actors[room_id] = RoomActor(room_id)
+        done = asyncio.get_running_loop().create_future()
+        actor.mailbox.append((event, callback, args, done))
+        if actor.task is None:
+            actor.task = asyncio.create_task(self._run(actor))
+        return done
+
+    def __len__(self):
+        return len(self._actors)
+
+    def queued(self) -> int:
+        return sum(len(actor.mailbox) for actor in self._actors.values())
+
+    async def _run(self, actor: RoomActor):
+        try:
+            while actor.mailbox:
+                batch = list(actor.mailbox)
+                actor.mailbox.clear()
+                ROOM_BATCH_EVENTS.observe(len(batch))
+                try:
+                    with holding():
+                        for event, callback, args, _ in batch:
+                            await self._apply(actor, event, callback, args)
+                except Exception as e:
+                    log.error("room_batch_failed", room_id=actor.room_id, events=len(batch), error=repr(e))
+                for *_, done in batch:
+                    if not done.done():
+                        done.set_result(None)
+                await asyncio.sleep(0)  # let senders queue up the next batch
+        finally:
+            if self._actors.get(actor.room_id) is actor:
+                del self._actors[actor.room_id]
+
+    async def _apply(self, actor: RoomActor, event: str, callback, args: tuple):
+        try:
+            result = callback(*args)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            log.error("room_event_failed", room_id=actor.room_id, event=event, error=repr(e))
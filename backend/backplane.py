@@ -0,0 +1,233 @@
+"""
+Pub/sub backplane between workers.
+- Backplane.publish() is non-blocking and safe to call from sync code
+- Subscribers are plain callbacks taking the published message (a JSON-able dict)
+- InProcessBackplane connects workers living in one process (tests, single box dev)
+- SocketBackplane talks to a small hub over a Unix socket; run_hub() is the hub
+- On the socket, each frame is its JSON body's length (4 bytes, big-endian)
+  followed by the body, so a batch of full rooms is as welcome as a ping. A frame
+  over BACKPLANE_MAX_FRAME is skipped and logged; the connection carries on
+- SocketBackplane reconnects (and resubscribes) when the hub goes away; what is
+  published in the meantime is dropped, and counted in the reconnect log line
+"""
+import asyncio
+import json
+import struct
+from collections import defaultdict
+
+from constants import BACKPLANE_MAX_FRAME, BACKPLANE_RECONNECT_DELAY, BACKPLANE_RECONNECT_MAX
+from logger import get_logger
+
+log = get_logger("backplane")
+
+_HEADER = struct.Struct(">I")  # body length
+_SKIP_CHUNK = 64 * 1024  # bytes read at a time while skipping an oversized body
+
+
+class FrameTooLarge(Exception):
+    """A frame over the size limit; it has been skipped and the stream is at the next one."""
+
+
+def _encode(frame: dict) -> bytes:
+    body = json.dumps(frame, separators=(",", ":")).encode()
+    return _HEADER.pack(len(body)) + body
+
+
+async def _read_frame(reader: asyncio.StreamReader, max_frame: int):
+    """
+    The next frame's body, or None once the peer has closed the connection.
+    A frame over max_frame is read past and raises FrameTooLarge.
+    """
+    try:
+        (size,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise ConnectionResetError("backplane connection closed mid-frame") from None
+        return None
+    if size > max_frame:
+        remaining = size
+        while remaining:
+            remaining -= len(await reader.readexactly(min(remaining, _SKIP_CHUNK)))
+        raise FrameTooLarge(f"{size} bytes, limit {max_frame}")
+    return await reader.readexactly(size)
+
+
+def _decode(body: bytes):
+    """The frame as a dict, or None (logged) if it isn't one."""
+    try:
+        frame = json.loads(body)
+    except ValueError as e:
+        log.error("backplane_bad_frame", error=repr(e))
+        return None
+    return frame if isinstance(frame, dict) else None
+
+
+class Backplane:
+    async def start(self):
+        pass
+
+    def publish(self, channel: str, message: dict):
+        raise NotImplementedError
+
+    def subscribe(self, channel: str, callback):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class InProcessBackplane(Backplane):
+    """Delivers on the next loop iteration, like a remote backplane would, but without copying."""
+
+    def __init__(self):
+        self._subscribers = defaultdict(list)
+
+    def publish(self, channel: str, message: dict):
+        loop = asyncio.get_running_loop()
+        for callback in self._subscribers.get(channel, ()):
+            loop.call_soon(callback, message)
+
+    def subscribe(self, channel: str, callback):
+        self._subscribers[channel].append(callback)
+
+
+class SocketBackplane(Backplane):
+    """
+    Client side of the Unix socket hub.
+    Frames are {"op": "sub"|"pub", "channel": ..., "message": ...}, length-prefixed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_frame: int = BACKPLANE_MAX_FRAME,
+        reconnect_delay: float = BACKPLANE_RECONNECT_DELAY,
+        reconnect_max: float = BACKPLANE_RECONNECT_MAX,
+    ):
+        self.path = path
+        self.max_frame = max_frame
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_max = reconnect_max
+        self._subscribers = defaultdict(list)
+        self._reader = None
+        self._writer = None  # None while disconnected
+        self._task = None
+        self._dropped = 0  # frames published while disconnected
+
+    async def start(self):
+        await self._connect()
+        self._task = asyncio.create_task(self._run())
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+        for channel in self._subscribers:
+            self._send({"op": "sub", "channel": channel})
+
+    def _send(self, frame: dict):
+        if self._writer is None:
+            self._dropped += 1
+            return
+        data = _encode(frame)
+        if len(data) - _HEADER.size > self.max_frame:
+            # The hub would drop it anyway; better to say so where it was published
+            log.error("backplane_frame_too_large", channel=frame.get("channel"), bytes=len(data))
+            return
+        self._writer.write(data)
+
+    def publish(self, channel: str, message: dict):
+        self._send({"op": "pub", "channel": channel, "message": message})
+
+    def subscribe(self, channel: str, callback):
+        first = channel not in self._subscribers
+        self._subscribers[channel].append(callback)
+        if first and self._writer is not None:
+            self._send({"op": "sub", "channel": channel})
+
+    async def _run(self):
+        """Reads from the hub for as long as this backplane lives, reconnecting whenever the connection drops."""
+        while True:
+            try:
+                await self._read()
+                log.error("backplane_closed", path=self.path)
+            except OSError as e:
+                log.error("backplane_closed", path=self.path, error=repr(e))
+            self._writer.close()
+            self._writer = None
+            await self._reconnect()
+
+    async def _reconnect(self):
+        delay = self.reconnect_delay
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self._connect()
+            except OSError as e:
+                log.warning("backplane_reconnect_failed", path=self.path, error=repr(e))
+                delay = min(delay * 2, self.reconnect_max)
+                continue
+            log.info("backplane_reconnected", path=self.path, dropped=self._dropped)
+            self._dropped = 0
+            return
+
+    async def _read(self):
+        while True:
+            try:
+                body = await _read_frame(self._reader, self.max_frame)
+            except FrameTooLarge as e:
+                log.error("backplane_frame_dropped", path=self.path, error=str(e))
+                continue
+            if body is None:
+                return
+            frame = _decode(body)
+            if frame is None:
+                continue
+            for callback in self._subscribers.get(frame.get("channel"), ()):
+                try:
+                    callback(frame["message"])
+                except Exception as e:
+                    log.error("backplane_callback_failed", channel=frame["channel"], error=repr(e))
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+        if self._writer:
+            self._writer.close()
+
+
+async def run_hub(path: str, max_frame: int = BACKPLANE_MAX_FRAME):
+    """Routes published frames to every connection subscribed to the channel. Runs until cancelled."""
+    subscribers = defaultdict(set)  # channel -> writers
+
+    async def serve(reader, writer):
+        channels = set()
+        try:
+            while True:
+                try:
+                    body = await _read_frame(reader, max_frame)
+                except FrameTooLarge as e:
+                    log.error("backplane_frame_dropped", error=str(e))
+                    continue
+                if body is None:
+                    break
+                frame = _decode(body)
+                if frame is None:
+                    continue
+                if frame.get("op") == "sub":
+                    subscribers[frame["channel"]].add(writer)
+                    channels.add(frame["channel"])
+                elif frame.get("op") == "pub":
+                    # Subscribers read the same frame shape, so forward the bytes as-is
+                    data = _HEADER.pack(len(body)) + body
+                    for subscriber in subscribers.get(frame["channel"], ()):
+                        subscriber.write(data)
+        except OSError as e:
+            log.warning("backplane_client_lost", error=repr(e))
+        finally:
+            for channel in channels:
+                subscribers[channel].discard(writer)
+            writer.close()
+
+    server = await asyncio.start_unix_server(serve, path=path)
+    log.info("backplane_hub_listening", path=path)
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,67 @@
+"""
+Micro-benchmark: per-message decode cost of the old two-step parser
+(json.loads, then a match on type building the model) against the
+single-pass discriminated-union parser in handlers.parse_message.
+
+Run from backend/:  python -m benchmarks.decode
+"""
+import json
+import timeit
+
+from models import (
+    CreateRoomRequest, JoinRoomRequest, SendMessageRequest, LeaveRoomRequest,
+    StartGameRequest, SubmitResponseRequest, SubmitVoteRequest, NextRoundRequest
+)
+from handlers import parse_message
+
+SAMPLES = {
+    "create_room": '{"type":"create_room","username":"Otter"}',
+    "join_room": '{"type":"join_room","roomId":"ABCD","username":"Panda"}',
+    "send_message": '{"type":"send_message","roomId":"ABCD","text":"who even says that"}',
+    "submit_response": '{"type":"submit_response","roomId":"ABCD","text":"omw, 5 min"}',
+    "submit_vote": '{"type":"submit_vote","roomId":"ABCD","responseId":"0b9f6a52-52c1-4c4e-9a8e-3f1d2b7c9e10"}',
+}
+
+
+def legacy_parse(raw: str):
+    """The decoder this replaced, kept here as the baseline."""
+    data = json.loads(raw)
+    msg_type = data.get("type")
+
+    match msg_type:
+        case "create_room":
+            return CreateRoomRequest(**data)
+        case "join_room":
+            return JoinRoomRequest(**data)
+        case "start_game":
+            return StartGameRequest(**data)
+        case "send_message":
+            return SendMessageRequest(**data)
+        case "leave_room":
+            return LeaveRoomRequest(**data)
+        case "submit_response":
+            return SubmitResponseRequest(**data)
+        case "submit_vote":
+            return SubmitVoteRequest(**data)
+        case "next_round":
+            return NextRoundRequest(**data)
+        case _:
+            raise ValueError(f"Unknown WebSocket event type: {msg_type}")
+
+
+def per_call_us(fn, raw: str, number: int) -> float:
+    best = min(timeit.repeat(lambda: fn(raw), number=number, repeat=5))
+    return best / number * 1e6
+
+
+def main(number: int = 20000):
+    print(f"{'event':<16} {'legacy us':>10} {'single-pass us':>15} {'speedup':>8}")
+    for event, raw in SAMPLES.items():
+        assert legacy_parse(raw) == parse_message(raw)
+        before = per_call_us(legacy_parse, raw, number)
+        after = per_call_us(parse_message, raw, number)
+        print(f"{event:<16} {before:>10.2f} {after:>15.2f} {before / after:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
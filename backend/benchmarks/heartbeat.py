@@ -0,0 +1,77 @@
+"""
+Micro-benchmark: heartbeat cost as connections grow.
+- tick: wall time of one wheel tick (one slot's connections), which is how long
+  the event loop is held, and the CPU the heartbeat takes per connection per
+  interval. Connections are quiet enough to be pinged each time, the worst case
+- timers: scheduler entries pending, which stays at one whatever the count
+- add / discard: cost of registering a socket and removing it
+
+Connections are stand-ins that drop their frames.
+
+Run from backend/:  python -m benchmarks.heartbeat --connections 1000 10000 100000
+"""
+import argparse
+import asyncio
+import time
+import timeit
+
+from heartbeat import Heartbeat
+from registry import Registry
+from scheduler import PhaseScheduler
+from wire import JSON
+
+
+class NullConnection:
+    codec = JSON
+    answers_pings = True
+
+    def __init__(self, player_id: str, last_seen: float):
+        self.player_id = player_id
+        self.last_seen = last_seen
+
+    def enqueue(self, frame) -> bool:
+        return True
+
+
+async def run(count: int, number: int):
+    scheduler = PhaseScheduler()
+    heartbeat = Heartbeat(Registry(), scheduler)
+    quiet = time.monotonic() - heartbeat.interval  # every connection due a ping, none timed out
+    conns = [NullConnection(str(i), quiet) for i in range(count)]
+    for conn in conns:
+        heartbeat.add(conn)
+    heartbeat.start()
+
+    slots = len(heartbeat._wheel)
+    ticks = []
+    for _ in range(slots):  # one full turn of the wheel
+        started = time.perf_counter()
+        heartbeat.check()
+        ticks.append(time.perf_counter() - started)
+    per_conn_us = sum(ticks) / count * 1e6
+
+    spare = [NullConnection(f"spare-{i}", quiet) for i in range(number)]
+    add_us = timeit.timeit(lambda: heartbeat.add(spare.pop()), number=number) / number * 1e6
+    added = list(heartbeat._slot_of)[-number:]
+    discard_us = timeit.timeit(lambda: heartbeat.discard(added.pop()), number=number) / number * 1e6
+
+    print(
+        f"{count:>8} conns  tick max {max(ticks) * 1000:7.2f} ms  "
+        f"{per_conn_us:5.2f} us/conn/interval  timers {len(scheduler)}  "
+        f"add {add_us:.2f} us  discard {discard_us:.2f} us"
+    )
+    heartbeat.stop()
+    await scheduler.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--number", type=int, default=10000, help="operations per add/discard sample")
+    args = parser.parse_args()
+    for count in args.connections:
+        asyncio.run(run(count, args.number))
+
+
+if __name__ == "__main__":
+    main()
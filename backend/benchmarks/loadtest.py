@@ -0,0 +1,377 @@
+"""
+Load generator: simulated players drive full games against /ws and the run
+is summarised as machine-readable JSON.
+- Each room is one host plus --players - 1 guests playing real games:
+  create_room, join_room, start_game, then submit_response / submit_vote /
+  next_round for every round until game_finished
+- events: request -> acknowledgement latency, measured at the sender
+  (e.g. submit_vote -> vote_submitted)
+- phases: transition latency measured at every player in the room; action-driven
+  transitions start at the request that completed the phase, timer-driven ones
+  (prompt -> responding, reveal -> scoring) are the observed phase length
+- server: CPU and memory of the server process, read from /proc (Linux only)
+
+By default a server is started on a free localhost port with a throwaway room
+store; pass --url and optionally --server-pid to measure a running one instead.
+
+Run from backend/:  python -m benchmarks.loadtest --rooms 250 --players 4 --output run.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import websockets
+
+# --- Measurements ---
+
+class Recorder:
+    def __init__(self):
+        self.events = defaultdict(list)  # request type -> latencies (s)
+        self.phases = defaultdict(list)  # transition -> latencies (s)
+        self.sent = 0
+        self.received = 0
+        self.games_completed = 0
+        self.games_failed = 0
+        self.errors = []
+
+    def error(self, message: str):
+        self.games_failed += 1
+        if len(self.errors) < 20:
+            self.errors.append(message)
+
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50": round(rank(50), 3),
+        "p95": round(rank(95), 3),
+        "p99": round(rank(99), 3),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+def process_stats(pid: int) -> dict:
+    """CPU seconds, current and peak RSS for a process, or {} where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status") as f:
+            status = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return {}
+    ticks = os.sysconf("SC_CLK_TCK")
+    return {
+        "cpu_seconds": (int(fields[11]) + int(fields[12])) / ticks,
+        "rss_mb": int(status["VmRSS"].split()[0]) / 1024,
+        "peak_rss_mb": int(status.get("VmHWM", status["VmRSS"]).split()[0]) / 1024,
+    }
+
+# --- Simulated players ---
+
+class Player:
+    def __init__(self, ws, recorder: Recorder):
+        self.ws = ws
+        self.recorder = recorder
+        self.player_id = None
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        try:
+            async for raw in self.ws:
+                self.recorder.received += 1
+                message = json.loads(raw)
+                if message.get("type") == "ping":
+                    await self.ws.send('{"type": "pong"}')  # or the heartbeat drops us in long phases
+                    continue
+                self.inbox.put_nowait((time.perf_counter(), message))
+        except websockets.ConnectionClosed:
+            pass
+
+    async def send(self, **request) -> float:
+        self.recorder.sent += 1
+        started = time.perf_counter()
+        await self.ws.send(json.dumps(request))
+        return started
+
+    async def expect(self, message_type: str, timeout: float, where=None) -> tuple:
+        """Waits for the next message of a type (optionally matching where), skipping others."""
+        deadline = time.perf_counter() + timeout
+        while True:
+            try:
+                received, message = await asyncio.wait_for(self.inbox.get(), deadline - time.perf_counter())
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"no {message_type} within {timeout}s") from None
+            if message.get("type") == "error":
+                raise RuntimeError(f"server error while waiting for {message_type}: {message.get('message')}")
+            if message.get("type") == message_type and (where is None or where(message)):
+                return received, message
+
+    async def request(self, ack: str, timeout: float, **request) -> dict:
+        started = await self.send(**request)
+        received, message = await self.expect(ack, timeout)
+        self.recorder.events[request["type"]].append(received - started)
+        return message
+
+    async def close(self):
+        await self.ws.close()
+        self._reader.cancel()
+
+
+async def everyone(players: list, message_type: str, timeout: float, where=None) -> list:
+    return await asyncio.gather(*(p.expect(message_type, timeout, where) for p in players))
+
+
+def record_phase(recorder: Recorder, name: str, started: float, arrivals: list):
+    recorder.phases[name].extend(received - started for received, _ in arrivals)
+
+
+async def play_game(url: str, size: int, timeout: float, recorder: Recorder):
+    players = []
+    try:
+        host = Player(await websockets.connect(url, max_size=None), recorder)
+        players.append(host)
+        joined = await host.request("room_joined", timeout, type="create_room", username="host")
+        host.player_id = joined["playerId"]
+        room_id = joined["roomId"]
+
+        for i in range(size - 1):
+            guest = Player(await websockets.connect(url, max_size=None), recorder)
+            players.append(guest)
+            joined = await guest.request("room_joined", timeout, type="join_room", roomId=room_id, username=f"guest{i}")
+            guest.player_id = joined["playerId"]
+
+        # The first round's prompt is broadcast before game_start reaches the host
+        started = await host.send(type="start_game", roomId=room_id)
+        arrivals = await everyone(players, "prompt_display", timeout)
+        received, _ = await host.expect("game_start", timeout)
+        recorder.events["start_game"].append(received - started)
+
+        while True:
+            round_data = arrivals[0][1]["room"]["currentRoundData"]
+            prompt_shown = [received for received, _ in arrivals]
+            target = round_data["targetPlayerId"]
+            responders = [p for p in players if p.player_id != target]
+
+            # prompt -> responding is driven by the server's timer
+            responding = await everyone(
+                players, "room_update", timeout,
+                where=lambda m: (m["room"].get("currentRoundData") or {}).get("state") == "responding"
+            )
+            recorder.phases["prompt->responding"].extend(
+                received - shown for (received, _), shown in zip(responding, prompt_shown)
+            )
+
+            texts, sent = {}, []
+            for p in responders:
+                texts[p.player_id] = f"on my way {random.randrange(1000)} {p.player_id[:6]}"
+                sent.append(await p.send(type="submit_response", roomId=room_id, text=texts[p.player_id]))
+            acks = await asyncio.gather(*(p.expect("response_submitted", timeout) for p in responders))
+            recorder.events["submit_response"].extend(received - start for (received, _), start in zip(acks, sent))
+            voting = await everyone(players, "voting_phase", timeout)
+            record_phase(recorder, "responding->voting", sent[-1], voting)
+
+            responses, sent = voting[0][1]["responses"], []
+            for p in responders:
+                choices = [r for r in responses if r["text"] != texts[p.player_id]] or responses
+                sent.append(await p.send(type="submit_vote", roomId=room_id, responseId=random.choice(choices)["id"]))
+            acks = await asyncio.gather(*(p.expect("vote_submitted", timeout) for p in responders))
+            recorder.events["submit_vote"].extend(received - start for (received, _), start in zip(acks, sent))
+            reveal = await everyone(players, "reveal_phase", timeout)
+            record_phase(recorder, "voting->reveal", sent[-1], reveal)
+
+            # reveal -> scoring is driven by the server's timer
+            scoring = await everyone(players, "scoring_phase", timeout)
+            recorder.phases["reveal->scoring"].extend(
+                received - shown for (received, _), (shown, _) in zip(scoring, reveal)
+            )
+            await everyone(players, "round_complete", timeout)
+
+            started = await host.send(type="next_round", roomId=room_id)
+            finished = scoring[0][1]["room"]["currentRound"] >= scoring[0][1]["room"]["maxRounds"]
+            if finished:
+                arrivals = await everyone(players, "game_finished", timeout)
+                recorder.events["next_round"].append(arrivals[0][0] - started)
+                record_phase(recorder, "scoring->finished", started, arrivals)
+                break
+            arrivals = await everyone(players, "prompt_display", timeout)
+            recorder.events["next_round"].append(arrivals[0][0] - started)
+            record_phase(recorder, "scoring->prompt", started, arrivals)
+
+        recorder.games_completed += 1
+    except Exception as e:
+        recorder.error(f"{type(e).__name__}: {e}")
+    finally:
+        await asyncio.gather(*(p.close() for p in players), return_exceptions=True)
+
+
+async def run(url: str, rooms: int, size: int, ramp: float, timeout: float, recorder: Recorder):
+    async def staggered(i):
+        await asyncio.sleep(ramp * i / max(rooms, 1))
+        await play_game(url, size, timeout, recorder)
+
+    await asyncio.gather(*(staggered(i) for i in range(rooms)))
+
+# --- Server under test ---
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, store_path: str, overrides: dict, log_path: str = None) -> subprocess.Popen:
+    """Starts main:app in a child process, applying constant overrides before it is imported."""
+    settings = {"ROOM_STORE_PATH": store_path, **overrides}
+    bootstrap = (
+        "import constants\n"
+        f"for name, value in {settings!r}.items(): setattr(constants, name, value)\n"
+        "import uvicorn\n"
+        f"uvicorn.run('main:app', host='127.0.0.1', port={port}, log_level='warning')\n"
+    )
+    output = open(log_path, "w") if log_path else subprocess.DEVNULL
+    server = subprocess.Popen(
+        [sys.executable, "-c", bootstrap],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        stdout=output, stderr=output
+    )
+
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit("server exited during startup")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    sys.exit("server did not start listening")
+
+
+def print_summary(result: dict):
+    out = sys.stderr
+    print(f"\n{result['games_completed']} games completed, {result['games_failed']} failed "
+          f"in {result['duration_s']}s ({result['throughput']['messages_received_per_s']} msgs/s received)", file=out)
+    for section in ("events", "phases"):
+        print(f"\n{section:<22}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)", file=out)
+        for name, stats in result[section].items():
+            if stats["count"]:
+                print(f"{name:<22}{stats['count']:>8}{stats['p50']:>10}{stats['p95']:>10}{stats['p99']:>10}{stats['max']:>10}", file=out)
+    server = result["server"]
+    if server:
+        print(f"\nserver: {server['cpu_percent']}% CPU, {server['rss_mb']} MB RSS (peak {server['peak_rss_mb']} MB)", file=out)
+    # Near 100% here means the generator, not the server, is the bottleneck
+    print(f"load generator: {result['client']['cpu_percent']}% CPU", file=out)
+    for error in result["errors"][:5]:
+        print(f"error: {error}", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=50, help="games played concurrently")
+    parser.add_argument("--players", type=int, default=4, help="players per room (at least 3)")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which rooms are started")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for any one message")
+    parser.add_argument("--url", help="ws:// URL of a running server; by default one is started")
+    parser.add_argument("--server-pid", type=int, help="pid to sample CPU/memory from when using --url")
+    parser.add_argument("--prompt-duration", type=float, help="override PROMPT_DURATION on the started server")
+    parser.add_argument("--reveal-duration", type=float, help="override REVEAL_DURATION on the started server")
+    parser.add_argument("--server-log", help="file for the started server's output")
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    args = parser.parse_args()
+
+    if args.players < 3:
+        parser.error("--players must be at least 3 to start a game")
+
+    server, store = None, None
+    url, server_pid = args.url, args.server_pid
+    if url is None:
+        overrides = {}
+        if args.prompt_duration is not None:
+            overrides["PROMPT_DURATION"] = args.prompt_duration
+        if args.reveal_duration is not None:
+            overrides["REVEAL_DURATION"] = args.reveal_duration
+        store = tempfile.TemporaryDirectory()
+        port = free_port()
+        server = start_server(port, os.path.join(store.name, "rooms.db"), overrides, args.server_log)
+        url, server_pid = f"ws://127.0.0.1:{port}/ws", server.pid
+
+    recorder = Recorder()
+    server_before = process_stats(server_pid) if server_pid else {}
+    client_before = time.process_time()
+    started = time.perf_counter()
+    try:
+        asyncio.run(run(url, args.rooms, args.players, args.ramp, args.timeout, recorder))
+    finally:
+        duration = time.perf_counter() - started
+        server_after = process_stats(server_pid) if server_pid else {}
+        if server is not None:
+            server.terminate()
+            server.wait()
+            store.cleanup()
+
+    client_cpu = time.process_time() - client_before
+    server_stats = {}
+    if server_before and server_after:
+        cpu = server_after["cpu_seconds"] - server_before["cpu_seconds"]
+        server_stats = {
+            "cpu_seconds": round(cpu, 3),
+            "cpu_percent": round(cpu / duration * 100, 1),
+            "rss_mb": round(server_after["rss_mb"], 1),
+            "peak_rss_mb": round(server_after["peak_rss_mb"], 1),
+        }
+
+    result = {
+        "config": {
+            "rooms": args.rooms, "players": args.players, "clients": args.rooms * args.players,
+            "ramp": args.ramp, "url": url,
+            "prompt_duration": args.prompt_duration, "reveal_duration": args.reveal_duration,
+        },
+        "duration_s": round(duration, 3),
+        "games_completed": recorder.games_completed,
+        "games_failed": recorder.games_failed,
+        "messages_sent": recorder.sent,
+        "messages_received": recorder.received,
+        "throughput": {
+            "games_per_s": round(recorder.games_completed / duration, 3),
+            "messages_sent_per_s": round(recorder.sent / duration, 1),
+            "messages_received_per_s": round(recorder.received / duration, 1),
+        },
+        "events": {name: percentiles(samples) for name, samples in sorted(recorder.events.items())},
+        "phases": {name: percentiles(samples) for name, samples in recorder.phases.items()},
+        "server": server_stats,
+        "client": {
+            "cpu_seconds": round(client_cpu, 3),
+            "cpu_percent": round(client_cpu / duration * 100, 1),
+        },
+        "errors": recorder.errors,
+    }
+
+    encoded = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(encoded + "\n")
+    else:
+        print(encoded)
+    print_summary(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Micro-benchmark: quick-play queue operations and matching throughput
+- enqueue / cancel: cost per operation with --queued players already waiting
+- match: how long the matching passes take to place everyone (they run back to
+  back while full rooms are waiting), and the wall time of the slowest pass,
+  which is how long the event loop is held
+
+Players are stand-in connections that drop their frames; rooms are real and
+started through the room actors, so start_game's cost is included.
+
+Run from backend/:  python -m benchmarks.matchmaking --queued 50000
+"""
+import argparse
+import asyncio
+import time
+import timeit
+import uuid
+
+from matchmaking import Matchmaker
+from registry import Registry
+from scheduler import PhaseScheduler
+from wire import JSON
+
+
+class NullConnection:
+    codec = JSON
+    delta_sync = False
+    sync_revision = None
+    sync_room_id = None
+
+    def __init__(self):
+        self.player_id = str(uuid.uuid4())
+
+    def enqueue(self, frame) -> bool:
+        return True
+
+
+async def run(queued: int, number: int):
+    registry = Registry()
+    scheduler = PhaseScheduler()
+    matchmaker = registry.matchmaker = Matchmaker(registry, scheduler)
+
+    conns = [NullConnection() for _ in range(queued)]
+    started = time.perf_counter()
+    for conn in conns:
+        matchmaker.enqueue(conn, "player")
+    print(f"enqueue      {(time.perf_counter() - started) / queued * 1e6:8.2f} us  ({queued} players)")
+
+    extra = [NullConnection() for _ in range(number)]
+    timer = iter(extra)
+    enqueue_us = min(timeit.repeat(lambda: matchmaker.enqueue(next(timer), "player"), number=number // 5, repeat=5)) / (number // 5) * 1e6
+    cancel_us = timeit.timeit(lambda: matchmaker.cancel(extra.pop().player_id), number=number // 5 * 5) / (number // 5 * 5) * 1e6
+    print(f"enqueue      {enqueue_us:8.2f} us  (with {queued} waiting)")
+    print(f"cancel       {cancel_us:8.2f} us")
+
+    durations = []
+    match = matchmaker.match
+
+    def timed_match():
+        pass_started = time.perf_counter()
+        match()
+        durations.append(time.perf_counter() - pass_started)
+
+    matchmaker.match = timed_match
+    started = time.perf_counter()
+    timed_match()  # the first pass; the scheduler runs the rest back to back
+    while len(matchmaker) >= matchmaker.room_size:
+        await asyncio.sleep(0.001)
+    await asyncio.sleep(0.01)  # let the room actors start the last games
+    elapsed = time.perf_counter() - started
+    print(
+        f"match        {elapsed:8.2f} s   {matchmaker.matched} players into {len(registry.rooms)} rooms, "
+        f"{len(durations)} passes, slowest pass {max(durations) * 1000:.1f} ms, "
+        f"{matchmaker.matched / elapsed:,.0f} players/s"
+    )
+    await scheduler.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queued", type=int, default=50000)
+    parser.add_argument("--number", type=int, default=20000, help="operations per timing sample")
+    args = parser.parse_args()
+    asyncio.run(run(args.queued, args.number))
+
+
+if __name__ == "__main__":
+    main()
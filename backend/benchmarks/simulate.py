@@ -0,0 +1,202 @@
+"""
+Headless game simulator: plays whole games through the state machine in game.py,
+with no sockets, no event loop and no waiting. Phase timers fire as soon as
+nobody has anything left to do.
+- Each game is seeded (--seed plus the game's index) and gets its own
+  random.Random for roles, prompts, ids and the players' choices, so any game
+  can be replayed on its own with --seed N --games 1
+- --chaos turns it into a rules fuzzer: players also send requests out of
+  turn, vote for responses that don't exist, submit twice, leave mid-round,
+  and timers fire early. Every game must still finish, scores must add up to
+  the points players hold, and the winner must be a top scorer; the seed of any
+  game that breaks a rule is printed
+- Games are independent, so --processes splits the seeds across that many
+  worker processes; throughput scales with cores
+
+Run from backend/:  python -m benchmarks.simulate --games 100000 [--players 4] [--chaos] [--processes 8]
+"""
+import argparse
+import multiprocessing
+import random
+import time
+
+import game
+from models import Player, Room
+from helpers import new_id, remove_player_round_data
+
+MAX_EVENTS = 10000  # per game; a game still going after this many is stuck
+
+
+class Rule(Exception):
+    """A broken game rule, found while simulating."""
+
+
+def new_room(rng: random.Random, players: int) -> Room:
+    ids = [new_id(rng) for _ in range(players)]
+    return Room(
+        id="SIM",
+        hostId=ids[0],
+        players=[
+            Player(id=player_id, username=f"p{i}", displayName=f"p{i}", isHost=i == 0, points=0)
+            for i, player_id in enumerate(ids)
+        ],
+    )
+
+
+def leave(room: Room, player_id: str):
+    """A player drops out mid-game: Registry.remove_player and evict_player's room-side work."""
+    player = room._members.pop(player_id)
+    room.players = [p for p in room.players if p is not player]
+    room._standings.remove(player_id)
+    if room.currentRoundData:
+        remove_player_round_data(room, player_id)
+    if player.isHost and room.players:
+        room.players[0].isHost = True
+        room.hostId = room.players[0].id
+
+
+def moves(room: Room, phase: str, rng: random.Random, chaos: bool) -> list:
+    """Requests the players would send now: (event, player_id, data)."""
+    round_data = room.currentRoundData
+    if phase == "responding":
+        done = round_data._responders
+        return [
+            ("submit_response", p.id, f"omw {rng.randrange(100)}")
+            for p in room.players
+            if p.id != round_data.targetPlayerId and (chaos or p.id not in done)
+        ]
+    if phase == "voting":
+        responses = round_data.responses
+        if not responses:
+            return []
+        done = round_data._voters
+        return [
+            ("submit_vote", p.id, rng.choice(responses).id)
+            for p in room.players
+            if p.id != round_data.targetPlayerId and (chaos or p.id not in done)
+        ]
+    if phase == "scoring":
+        return [("next_round", room.hostId, None)]
+    return []
+
+
+def chaos_move(room: Room, rng: random.Random):
+    """A request that may well be out of turn, or not even valid."""
+    player_id = rng.choice(room.players).id
+    event = rng.choice(("submit_response", "submit_vote", "next_round", "start_game"))
+    data = "" if rng.random() < 0.2 else ("no-such-response" if event == "submit_vote" else "hmm")
+    return event, player_id, data
+
+
+def play(seed: int, players: int, chaos: bool) -> tuple:
+    """Plays one game to the end. Returns (events applied, rounds scored)."""
+    rng = random.Random(seed)
+    room = new_room(rng, players)
+    earned = {p.id: 0 for p in room.players}  # from scoring_phase effects
+    timer = None  # (event, round_id) pending, as the last timer effect left it
+    winner = None
+    rounds = 0
+
+    event, player_id, data, round_id = "start_game", room.hostId, None, None
+    for applied in range(1, MAX_EVENTS + 1):
+        phase, effects = game.apply(room, event, player_id, data, round_id, rng)
+        for effect in effects:
+            kind = effect[0]
+            if kind == "timer":
+                timer = effect[2:]
+            elif kind == "cancel_timer":
+                timer = None
+            elif kind == "broadcast" and effect[1] == "scoring_phase":
+                rounds += 1
+                for scored_id, points in effect[2].items():
+                    earned[scored_id] += points
+            elif kind == "broadcast" and effect[1] == "game_finished":
+                winner = effect[2]
+            elif kind == "error":
+                raise Rule(f"round setup failed: {effect[1]}")
+
+        if phase == "finished":
+            break
+        if phase == "lobby":
+            raise Rule("game fell back to the lobby")
+
+        if chaos and rng.random() < 0.3:
+            if len(room.players) > game.MIN_PLAYERS and rng.random() < 0.05:
+                leave(room, rng.choice(room.players).id)
+                event, player_id, data, round_id = "player_left", None, None, None
+            elif timer is not None and rng.random() < 0.3:
+                (event, round_id), player_id, data = timer, None, None
+            else:
+                (event, player_id, data), round_id = chaos_move(room, rng), None
+            continue
+
+        pending = moves(room, phase, rng, chaos)
+        if pending:
+            (event, player_id, data), round_id = rng.choice(pending), None
+        elif timer is not None:
+            (event, round_id), player_id, data = timer, None, None
+            timer = None
+        else:
+            raise Rule(f"stuck in {phase} with nothing to do")
+    else:
+        raise Rule(f"no end after {MAX_EVENTS} events")
+
+    for player in room.players:
+        if player.points != earned[player.id]:
+            raise Rule(f"{player.username} holds {player.points} points but earned {earned[player.id]}")
+    if winner is None or winner.points != max(p.points for p in room.players):
+        raise Rule("the winner is not a top scorer")
+    return applied, rounds
+
+
+def play_range(seeds: range, players: int, chaos: bool) -> tuple:
+    """Plays a run of games. Returns (events, rounds, failures), failures as (seed, reason)."""
+    events = rounds = 0
+    failures = []
+    for seed in seeds:
+        try:
+            applied, scored = play(seed, players, chaos)
+        except (Rule, ValueError) as e:  # ValueError: an illegal phase transition
+            failures.append((seed, str(e)))
+            continue
+        events += applied
+        rounds += scored
+    return events, rounds, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game; game i uses seed + i")
+    parser.add_argument("--chaos", action="store_true", help="fuzz the rules with out-of-turn and invalid requests")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes to split the games across")
+    args = parser.parse_args()
+
+    seeds = range(args.seed, args.seed + args.games)
+    chunks = [(seeds[i::args.processes], args.players, args.chaos) for i in range(args.processes)]
+    started = time.perf_counter()
+    if args.processes > 1:
+        with multiprocessing.Pool(args.processes) as pool:
+            results = pool.starmap(play_range, chunks)
+    else:
+        results = [play_range(*chunks[0])]
+    elapsed = time.perf_counter() - started
+
+    events = sum(r[0] for r in results)
+    rounds = sum(r[1] for r in results)
+    failures = sorted(failure for r in results for failure in r[2])
+    for seed, reason in failures:
+        print(f"seed {seed}: {reason}")
+    broken = len(failures)
+
+    print(
+        f"{args.games} games ({args.players} players{', chaos' if args.chaos else ''}, "
+        f"{args.processes} process{'es' if args.processes > 1 else ''}) in {elapsed:.2f} s: "
+        f"{args.games / elapsed * 60:,.0f} games/min, {events / elapsed:,.0f} events/s, "
+        f"{rounds / max(1, args.games - broken):.1f} rounds/game, {broken} broken"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Micro-benchmark: bytes on the wire and encode CPU per event for each wire format
+- json / msgpack: the frames broadcaster produces for a connection that
+  negotiated that subprotocol
+- +deflate: the same frames through compression.ThresholdPerMessageDeflate with
+  the server's settings, in game order on one connection (context takeover), as
+  a client that offers permessage-deflate receives them
+- encode us is the cost of building one frame with the room's encoded cache cold
+  (its players' and round's caches warm), i.e. the first connection in a room to
+  get this event after a change at the top of the room; deflate us is added per
+  connection, since compression state is per connection
+
+The room is a mid-game room of --players players, with a full round in it.
+
+Run from backend/:  python -m benchmarks.wire --players 8
+"""
+import argparse
+import timeit
+import uuid
+from types import SimpleNamespace
+
+from websockets.frames import Frame, OP_BINARY, OP_TEXT
+
+from broadcaster import RoomEnvelope, envelope, sync_frame, _encode_payload
+from compression import ThresholdPerMessageDeflate
+from constants import DEFLATE_WINDOW_BITS, DEFLATE_MEM_LEVEL, DEFLATE_LEVEL, animal_names
+from models import (
+    Room, Player, Round, Response, Vote, ErrorResponse, ChatMessageResponse,
+    RoomUpdateResponse, PromptDisplayResponse, VotingPhaseResponse, RevealPhaseResponse,
+    ScoringPhaseResponse, VoteSubmittedResponse
+)
+from wire import JSON, MSGPACK
+
+
+def build_room(players: int) -> Room:
+    members = [
+        Player(
+            id=str(uuid.uuid4()),
+            username=f"player{i}",
+            displayName=f"{animal_names[i % len(animal_names)]} {i}",
+            isHost=i == 0,
+            points=i * 3
+        )
+        for i in range(players)
+    ]
+    room = Room(id="KQWX", hostId=members[0].id, players=members, state="playing", currentRound=2)
+    responses = [
+        Response(id=str(uuid.uuid4()), playerId=p.id, text=f"lol no way, omw in {i} min", isReal=i == 1, voteCount=0)
+        for i, p in enumerate(members)
+    ]
+    room.currentRoundData = Round(
+        id=str(uuid.uuid4()),
+        roundNumber=2,
+        prompt="What would Otter 0 text after missing the bus?",
+        targetPlayerId=members[0].id,
+        promptSenderId=members[2].id,
+        realImpersonatorId=members[1].id,
+        responses=responses,
+        state="voting"
+    )
+    room.currentPrompt = room.currentRoundData.prompt
+    return room
+
+
+def game_events(room: Room) -> list:
+    """(name, payload, change) in game order; change() is applied to the room before the payload is built."""
+    round_data = room.currentRoundData
+    players = room.players
+    responses = round_data.responses
+
+    def vote():
+        response = responses[(len(round_data.votes) + 1) % len(responses)]
+        response.voteCount += 1
+        round_data.append("votes", Vote(voterId=players[len(round_data.votes)].id, responseId=response.id))
+
+    def reveal():
+        round_data.state = "reveal"
+
+    def score():
+        round_data.state = "scoring"
+        players[1].points += 3
+
+    anonymous = [Response(id=r.id, text=r.text, isReal=False) for r in responses]
+    return [
+        ("chat_message", lambda: ChatMessageResponse(senderId=players[0].id, senderDisplayName=players[0].displayName, text="ok who wrote #3").model_dump(), None),
+        ("error", lambda: ErrorResponse(message="You already voted", requestType="submit_vote").model_dump(), None),
+        ("room_update", lambda: envelope(RoomUpdateResponse(room=room)), lambda: setattr(players[-1], "points", players[-1].points + 1)),
+        ("prompt_display", lambda: envelope(PromptDisplayResponse(room=room, promptText=round_data.prompt, targetPlayerName=players[0].displayName)), None),
+        ("voting_phase", lambda: envelope(VotingPhaseResponse(room=room, responses=anonymous)), None),
+        ("vote_submitted", lambda: envelope(VoteSubmittedResponse(room=room, allVoted=False)), vote),
+        ("reveal_phase", lambda: envelope(RevealPhaseResponse(room=room, responses=responses, votes=round_data.votes)), reveal),
+        ("scoring_phase", lambda: envelope(ScoringPhaseResponse(
+            room=room,
+            scores={p.id: 3 if i == 1 else 0 for i, p in enumerate(players)},
+            roundSummary={"roundNumber": "2", "totalVotes": str(len(round_data.votes))}
+        )), score),
+    ]
+
+
+def cold(payload):
+    """
+    Drops the room's own cached dumps and encodings, as a change to a top-level
+    room field would; its players and round keep theirs.
+    """
+    if isinstance(payload, RoomEnvelope):
+        room = payload.room
+        room._dumped_version = room._tagged_version = -1
+        room._json_version = room._packed_version = -1
+
+
+def frame_for(codec, payload, delta: bool):
+    if delta and isinstance(payload, RoomEnvelope):
+        conn = SimpleNamespace(
+            codec=codec, sync_revision=payload.room._sync.revision or None, sync_room_id=payload.room.id
+        )
+        frame, _ = sync_frame(conn, payload, {})
+        return frame
+    return _encode_payload(payload, codec)
+
+
+def encode_us(codec, payload, delta: bool, number: int) -> float:
+    def run():
+        cold(payload)
+        frame_for(codec, payload, delta)
+    return min(timeit.repeat(run, number=number, repeat=5)) / number * 1e6
+
+
+def deflater():
+    return ThresholdPerMessageDeflate(
+        False, False, 15, DEFLATE_WINDOW_BITS,
+        {"memLevel": DEFLATE_MEM_LEVEL, "level": DEFLATE_LEVEL}
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=8)
+    parser.add_argument("--number", type=int, default=2000, help="encodes per timing sample")
+    parser.add_argument("--delta", action="store_true", help="room-carrying events as room_patch (sync_subscribe clients)")
+    args = parser.parse_args()
+
+    room = build_room(args.players)
+    room._sync.commit(room.dump(), room._version)
+    compressors = {codec.name: deflater() for codec in (JSON, MSGPACK)}
+    totals = {key: 0 for key in ("json", "json+deflate", "msgpack", "msgpack+deflate")}
+
+    print(f"{args.players} players, {'delta sync' if args.delta else 'full room'} frames")
+    print(f"{'event':<16} {'json':>7} {'+deflate':>9} {'msgpack':>8} {'+deflate':>9} {'json us':>8} {'msgpack us':>11} {'deflate us':>11}")
+    for name, build, change in game_events(room):
+        if change is not None:
+            change()
+        payload = build()
+        row = {}
+        for codec in (JSON, MSGPACK):
+            frame = frame_for(codec, payload, args.delta)
+            data = frame if codec.binary else frame.encode()
+            opcode = OP_BINARY if codec.binary else OP_TEXT
+            compressed = compressors[codec.name].encode(Frame(opcode, data))
+            row[codec.name] = (len(data), len(compressed.data))
+        if args.delta:
+            room._sync.commit(room.dump(), room._version)
+
+        json_us = encode_us(JSON, payload, args.delta, args.number)
+        msgpack_us = encode_us(MSGPACK, payload, args.delta, args.number)
+        sample, compressor = frame_for(JSON, payload, args.delta).encode(), deflater()
+        deflate_us = min(timeit.repeat(lambda: compressor.encode(Frame(OP_TEXT, sample)), number=args.number, repeat=3)) / args.number * 1e6
+
+        (json_raw, json_deflated), (msgpack_raw, msgpack_deflated) = row[JSON.name], row[MSGPACK.name]
+        totals["json"] += json_raw
+        totals["json+deflate"] += json_deflated
+        totals["msgpack"] += msgpack_raw
+        totals["msgpack+deflate"] += msgpack_deflated
+        print(
+            f"{name:<16} {json_raw:>7} {json_deflated:>9} {msgpack_raw:>8} {msgpack_deflated:>9} "
+            f"{json_us:>8.1f} {msgpack_us:>11.1f} {deflate_us:>11.1f}"
+        )
+
+    print("total bytes: " + ", ".join(
+        f"{key} {size} ({size / totals['json']:.0%})" for key, size in totals.items()
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+
+from fastapi import WebSocket
+from pydantic import BaseModel
+
+from constants import OUTBOUND_QUEUE_SIZE, SLOW_CLIENT_TIMEOUT
+from models import Room, RoomSnapshotResponse, RoomPatchResponse, ErrorResponse
+from logger import get_logger
+from wire import JSON
+from metrics import SERIALIZE_SECONDS, BROADCAST_SECONDS, BROADCAST_FANOUT, DROPPED_FRAMES, COALESCED_FRAMES
+
+log = get_logger("broadcast")
+
+_outbox = ContextVar("outbox", default=None)  # the Outbox of the room actor batch running in this task
+
+
+class Connection:
+    """
+    Outbound side of a client WebSocket.
+    - Frames go into a bounded queue drained by a single writer task,
+      so callers never wait on the client's network
+    - When the queue is full new frames are dropped; a client that stays
+      backed up for longer than max_backlog_seconds is disconnected
+    - Clients that opted into delta sync get room_patch/room_snapshot envelopes
+      instead of the full room; sync_revision is the last revision they hold of
+      room sync_room_id, and a frame for any other room is a snapshot
+    - codec is the wire format negotiated at connect; frames handed to enqueue()
+      are already in it, and binary codecs' frames go out as binary messages
+    - last_seen is when the client last sent anything; the heartbeat pings
+      connections that go quiet and times out the ones that stay silent, once
+      answers_pings shows the client speaks the heartbeat
+    """
+
+    def __init__(
+        self,
+        ws: WebSocket,
+        player_id: str,
+        max_queue: int = OUTBOUND_QUEUE_SIZE,
+        max_backlog_seconds: float = SLOW_CLIENT_TIMEOUT,
+        codec=JSON,
+    ):
+        self.ws = ws
+        self.player_id = player_id
+        self.codec = codec
+        self.max_backlog_seconds = max_backlog_seconds
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.backed_up_since = None  # monotonic time the queue first filled up
+        self.dropped = 0
+        self.closed = False
+        self.delta_sync = False
+        self.sync_revision = None
+        self.sync_room_id = None  # room sync_revision belongs to
+        self.remote_owner = None  # worker owning this player's room, when sharded and not us
+        self.last_seen = time.monotonic()  # last inbound frame, pongs included
+        self.answers_pings = False  # set by the first pong; clients that never answer are not timed out
+        self._writer = asyncio.create_task(self._drain())
+
+    def reset_sync(self):
+        """Forgets the room revision held, so the next room frame is a snapshot."""
+        self.sync_revision = None
+        self.sync_room_id = None
+
+    def enqueue(self, frame) -> bool:
+        """Queue a frame encoded with this connection's codec. Returns False if the frame was not accepted."""
+        if self.closed:
+            return False
+
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        self.dropped += 1
+        DROPPED_FRAMES.inc()
+        now = time.monotonic()
+        if self.backed_up_since is None:
+            self.backed_up_since = now
+        elif now - self.backed_up_since > self.max_backlog_seconds:
+            log.warning("slow_client_disconnected", player_id=self.player_id, dropped=self.dropped)
+            self._disconnect()
+        return False
+
+    async def _drain(self):
+        send_frame = self.ws.send_bytes if self.codec.binary else self.ws.send_text
+        while True:
+            frame = await self.queue.get()
+            try:
+                await send_frame(frame)
+            except Exception:
+                # Socket is gone; the receive loop will notice and clean up
+                self.closed = True
+                return
+            if self.backed_up_since is not None and not self.queue.full():
+                self.backed_up_since = None
+
+    def supersede(self):
+        """The player resumed on a newer connection; close this one."""
+        self._disconnect(code=4001)
+
+    def time_out(self):
+        """The client stopped answering pings; close this connection."""
+        self._disconnect(code=4002)
+
+    def _disconnect(self, code: int = 1013):  # "try again later"
+        self.closed = True
+        self._writer.cancel()
+        asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.ws.close(code=code)
+        except Exception:
+            pass
+
+    async def close(self):
+        """Stop the writer task. Frames still queued are discarded."""
+        self.closed = True
+        self._writer.cancel()
+        try:
+            await self._writer
+        except (asyncio.CancelledError, Exception):
+            pass
+
+
+class RoomEnvelope:
+    """
+    An outgoing message that carries the room.
+    Only the event's own fields are serialized per message; the room body comes
+    from the room's per-version cache and is spliced into the frame already
+    encoded, in whichever wire format the frame is for.
+    """
+    __slots__ = ("room", "fields")
+
+    def __init__(self, room: Room, fields: dict = None):
+        self.room = room
+        self.fields = fields or {}
+
+    @property
+    def type(self):
+        return self.fields.get("type")
+
+    def to_dict(self) -> dict:
+        return {**self.fields, "room": self.room.dump()}
+
+    def encode(self, codec=JSON):
+        return codec.encode_room(self.fields, self.room)
+
+
+def envelope(message: BaseModel) -> RoomEnvelope:
+    """Wraps a room-carrying response model without dumping its room."""
+    return RoomEnvelope(message.room, message.model_dump(exclude={"room"}))
+
+
+def _encode_payload(payload, codec=JSON):
+    started = time.perf_counter()
+    frame = payload.encode(codec) if isinstance(payload, RoomEnvelope) else codec.encode(payload)
+    SERIALIZE_SECONDS.observe(time.perf_counter() - started, codec.name)
+    return frame
+
+
+def sync_frame(conn: Connection, payload: RoomEnvelope, frames: dict) -> tuple:
+    """
+    Builds the delta-sync envelope of a room-carrying payload for one connection.
+    The room is committed to its revision tracker once per payload (skipping the
+    diff if the room has not changed), and frames are shared between connections
+    patching from the same base revision with the same codec.
+    Returns (frame, revision).
+    """
+    room = payload.room
+    sync = room._sync
+    if "revision" not in frames:
+        frames["revision"] = sync.commit(room.dump(), room._version)
+    revision = frames["revision"]
+    event = payload.fields or None
+
+    # A revision of another room (the client switched rooms) is no base for a patch
+    base = conn.sync_revision if conn.sync_room_id == room.id else None
+    ops = sync.ops_since(base) if base is not None else None
+    key = (conn.codec.name, base if ops is not None else "snapshot")
+    if key not in frames:
+        if ops is None:
+            sync_envelope = RoomSnapshotResponse(
+                roomId=room.id,
+                revision=revision,
+                room=sync.snapshot,
+                event=event
+            )
+        else:
+            sync_envelope = RoomPatchResponse(
+                roomId=room.id,
+                baseRevision=base,
+                revision=revision,
+                ops=ops,
+                event=event
+            )
+        frames[key] = _encode_payload(sync_envelope.model_dump(), conn.codec)
+    return frames[key], revision
+
+
+def _enqueue_for(conn: Connection, payload, frames: dict) -> bool:
+    if not conn.delta_sync or not isinstance(payload, RoomEnvelope):
+        codec = conn.codec
+        if codec.name not in frames:
+            frames[codec.name] = _encode_payload(payload, codec)
+        return conn.enqueue(frames[codec.name])
+
+    delta_frame, revision = sync_frame(conn, payload, frames)
+    if not conn.enqueue(delta_frame):
+        return False  # keep the old base so the next patch covers this one
+    conn.sync_revision = revision
+    conn.sync_room_id = payload.room.id
+    return True
+
+
+def send(conn: Connection, payload) -> bool:
+    """Queue a payload (a plain dict or a RoomEnvelope) for a single client."""
+    if _hold(_send, conn, payload):
+        return True
+    return _send(conn, payload)
+
+
+def _send(conn: Connection, payload) -> bool:
+    return _enqueue_for(conn, payload, {})
+
+
+def send_to(registry, room_id: str, player_id: str, payload) -> bool:
+    """
+    Queue a payload for one player in a room by id. If they are waiting to
+    resume, the frame is kept for them instead, as JSON.
+    """
+    if _hold(_send_to, registry, room_id, player_id, payload):
+        return True
+    return _send_to(registry, room_id, player_id, payload)
+
+
+def _send_to(registry, room_id: str, player_id: str, payload) -> bool:
+    conn = registry.connections.get(player_id)
+    if conn is not None:
+        return _send(conn, payload)
+    if registry.sessions.is_suspended(player_id):
+        registry.sessions.record(room_id, _encode_payload(payload), player_id)
+    return False
+
+
+def send_error(conn: Connection, message: str, request_type: str = None) -> bool:
+    """Tell a single client its request was rejected, without closing the connection."""
+    return send(conn, ErrorResponse(message=message, requestType=request_type).model_dump())
+
+
+def broadcast(registry, room_id: str, payload, exclude_player_id=None) -> int:
+    """
+    Queue a payload (a plain dict or a RoomEnvelope) for every connected player in a room.
+    The payload is encoded once per wire format in use and the same frame is handed
+    to each connection's writer, so a slow client never delays the others.
+    Returns the number of connections that accepted the frame, or 0 if it is held
+    until the end of a room actor's batch.
+    """
+    if _hold(_broadcast, registry, room_id, payload, exclude_player_id):
+        return 0
+    return _broadcast(registry, room_id, payload, exclude_player_id)
+
+
+def _broadcast(registry, room_id: str, payload, exclude_player_id=None) -> int:
+    room = registry.get_room(room_id)
+    if not room:
+        log.warning("room_not_found", room_id=room_id)
+        return 0
+
+    started = time.perf_counter()
+    frames = {}  # encoded frames, shared by every connection that receives the same bytes
+    sent_count = 0
+    for player in room.players:
+        if player.id == exclude_player_id:
+            continue
+        conn = registry.connections.get(player.id)
+        if conn is None:
+            log.debug("no_connection", room_id=room_id, player_id=player.id)
+            continue
+        if _enqueue_for(conn, payload, frames):
+            sent_count += 1
+
+    # Players waiting to resume get this frame replayed when they reconnect
+    if registry.sessions.recording(room_id):
+        if JSON.name not in frames:
+            frames[JSON.name] = _encode_payload(payload)
+        registry.sessions.record(room_id, frames[JSON.name])
+    BROADCAST_SECONDS.observe(time.perf_counter() - started)
+    BROADCAST_FANOUT.observe(sent_count)
+    if isinstance(payload, RoomEnvelope):
+        registry.spectators.changed(room, payload.type)  # the audience catches up on its own tick
+    event = payload.type if isinstance(payload, RoomEnvelope) else payload.get("type")
+    log.debug("broadcast", room_id=room_id, event=event, sent=sent_count, players=len(room.players))
+    return sent_count
+
+
+# --- Batched delivery for room actors ---
+
+class Outbox:
+    """
+    What a room actor's batch sends, held until the batch is done and then
+    delivered in the order it was sent (see actors.py).
+    - Room-carrying frames are encoded when delivered, so every frame from the
+      batch carries the room as the batch left it and shares its encoded cache
+    - A room_update broadcast followed by another to the same players in the
+      same batch is skipped: the later one carries everything it would have
+    """
+    __slots__ = ("entries", "open")
+
+    def __init__(self):
+        self.entries = []  # (deliver function, args) in the order they were sent
+        self.open = True
+
+    def deliver(self) -> int:
+        """Sends everything held. Returns how many room_updates were skipped."""
+        self.open = False
+        latest = {}  # (room_id, excluded player) -> index of its last room_update
+        for i, (deliver, args) in enumerate(self.entries):
+            if deliver is _broadcast and _is_room_update(args[2]):
+                latest[(args[1], args[3])] = i
+
+        skipped = 0
+        for i, (deliver, args) in enumerate(self.entries):
+            if deliver is _broadcast and _is_room_update(args[2]) and latest[(args[1], args[3])] != i:
+                skipped += 1
+                continue
+            deliver(*args)
+        if skipped:
+            COALESCED_FRAMES.inc(amount=skipped)
+        return skipped
+
+
+def _is_room_update(payload) -> bool:
+    return isinstance(payload, RoomEnvelope) and payload.type == "room_update"
+
+
+def _hold(deliver, *args) -> bool:
+    """Holds a delivery in the outbox of the batch running in this task, if there is one."""
+    outbox = _outbox.get()
+    if outbox is None or not outbox.open:
+        return False  # tasks started during a batch inherit its outbox, closed once the batch is done
+    outbox.entries.append((deliver, args))
+    return True
+
+
+@contextmanager
+def holding():
+    """Holds what this task sends inside the block in an Outbox, delivered when the block exits."""
+    outbox = Outbox()
+    token = _outbox.set(outbox)
+    try:
+        yield outbox
+    finally:
+        _outbox.reset(token)
+        outbox.deliver()
@@ -0,0 +1,375 @@
+"""
+Sharded deployment: N workers, each owning the rooms whose code hashes to it.
+- HashRing assigns room codes to workers by consistent hashing
+- A worker creates rooms only under codes it owns
+- join_room (or watch_room) for a room owned elsewhere is either redirected (the client reconnects
+  to the owner's URL) or forwarded: the player stays connected here, their requests
+  go to the owner over the backplane, and the owner's frames come back the same way
+- The owner runs the normal handlers against a RemoteConnection, so game
+  semantics are identical to a single worker
+
+Run locally with `python -m cluster --workers 4` (see main()).
+"""
+import argparse
+import asyncio
+import bisect
+import hashlib
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import time
+
+from pydantic import ValidationError
+
+from backplane import Backplane, InProcessBackplane, SocketBackplane, run_hub
+from broadcaster import send, send_error
+from handlers import parse_message, describe_error, dispatch
+from logger import get_logger
+from models import RedirectResponse
+from persistence import SQLiteRoomStore
+from sockets import connection_closed, resume_session
+from wire import JSON
+from constants import RESUME_GRACE, ROOM_STORE_PATH, BACKPLANE_HUB_START_TIMEOUT
+
+log = get_logger("cluster")
+
+VIRTUAL_NODES = 128  # ring points per worker; more points, more even spread
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    def __init__(self, workers: list, virtual_nodes: int = VIRTUAL_NODES):
+        points = sorted(
+            (_hash(f"{worker}#{i}"), worker)
+            for worker in workers
+            for i in range(virtual_nodes)
+        )
+        self._keys = [point for point, _ in points]
+        self._workers = [worker for _, worker in points]
+
+    def owner(self, key: str) -> str:
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._workers[index]
+
+
+class RemoteConnection:
+    """
+    Stands in for a player connected to another worker.
+    Frames are handed to the node, which batches them per edge worker and tick.
+    They cross the backplane as JSON; the edge transcodes them for its client.
+    """
+    codec = JSON
+
+    def __init__(self, node: "ClusterNode", edge: str, player_id: str):
+        self.node = node
+        self.edge = edge
+        self.player_id = player_id
+        self.closed = False
+        self.delta_sync = False
+        self.sync_revision = None
+        self.sync_room_id = None
+
+    def reset_sync(self):
+        self.sync_revision = None
+        self.sync_room_id = None
+
+    def enqueue(self, frame: str) -> bool:
+        if self.closed:
+            return False
+        self.node.send_frame(self.edge, self.player_id, frame)
+        return True
+
+    def supersede(self):
+        self.closed = True
+
+    async def close(self):
+        self.closed = True
+
+
+class ClusterNode:
+    def __init__(self, worker_id: str, workers: list, backplane: Backplane, mode: str = "forward", urls: dict = None):
+        self.worker_id = worker_id
+        self.ring = HashRing(workers)
+        self.backplane = backplane
+        self.mode = mode  # "forward" or "redirect"
+        self.urls = urls or {}  # worker_id -> public ws URL, needed for redirect
+        self.registry = None
+        self.scheduler = None
+        self._inbox = asyncio.Queue()
+        self._outbox = {}  # edge -> {frame: [player_ids]}, flushed once per loop tick
+        self._flush_scheduled = False
+        self._task = None
+
+    def owns(self, room_id: str) -> bool:
+        return self.ring.owner(room_id) == self.worker_id
+
+    async def start(self, registry, scheduler):
+        self.registry = registry
+        self.scheduler = scheduler
+        registry.owns_room = self.owns
+        self.backplane.subscribe(f"worker:{self.worker_id}", self._inbox.put_nowait)
+        await self.backplane.start()
+        self._task = asyncio.create_task(self._consume())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        await self.backplane.close()
+
+    # --- Edge side: the worker holding the player's socket ---
+
+    def intercept(self, conn, request, raw) -> bool:
+        """Returns True if the request was redirected or forwarded instead of handled here."""
+        if request.type in ("create_room", "quick_play"):
+            self._move_to(conn, None)  # new rooms are always created locally
+            return False
+
+        if request.type not in ("join_room", "watch_room"):
+            if conn.remote_owner is not None:
+                self._forward(conn.remote_owner, conn, request, raw)
+                return True
+            return False
+
+        # Joins go wherever the room's code hashes, whichever worker the player was with before
+        owner = self.ring.owner(request.roomId)
+        if owner == self.worker_id:
+            self._move_to(conn, None)
+            return False
+
+        if self.mode == "redirect" and owner in self.urls:
+            send(conn, RedirectResponse(roomId=request.roomId, url=self.urls[owner]).model_dump())
+            return True
+
+        self._move_to(conn, owner)
+        self._forward(owner, conn, request, raw)
+        return True
+
+    def _move_to(self, conn, owner):
+        """
+        Points the player's requests at owner (None for this worker). The worker
+        they leave drops its proxy for them, and their seat there if they still had
+        one: their requests can no longer reach it.
+        """
+        if conn.remote_owner is not None and conn.remote_owner != owner:
+            self.forward_disconnect(conn, None)
+        conn.remote_owner = owner
+
+    def resume(self, conn, room_id: str):
+        """Resumes a session whose room lives on another worker."""
+        owner = self.ring.owner(room_id)
+        if self.mode == "redirect" and owner in self.urls:
+            # The client reconnects to the owner with the same resume token
+            send(conn, RedirectResponse(roomId=room_id, url=self.urls[owner]).model_dump())
+            return
+
+        conn.remote_owner = owner
+        self.backplane.publish(
+            f"worker:{owner}",
+            {"kind": "resume", "player": conn.player_id, "edge": self.worker_id}
+        )
+
+    def forward_disconnect(self, conn, grace=RESUME_GRACE):
+        if conn.remote_owner is not None:
+            self.backplane.publish(
+                f"worker:{conn.remote_owner}",
+                {"kind": "disconnect", "player": conn.player_id, "edge": self.worker_id, "grace": grace}
+            )
+
+    def _forward(self, owner: str, conn, request, raw):
+        if isinstance(raw, bytes):
+            # Requests cross the backplane as JSON whatever the client speaks
+            raw = request.model_dump_json() if conn.codec.binary else raw.decode()
+        self.backplane.publish(
+            f"worker:{owner}",
+            {"kind": "request", "player": conn.player_id, "edge": self.worker_id, "raw": raw}
+        )
+
+    # --- Owner side: the worker holding the room ---
+
+    def send_frame(self, edge: str, player_id: str, frame: str):
+        # Frames broadcast to several players on the same edge cross the backplane once
+        self._outbox.setdefault(edge, {}).setdefault(frame, []).append(player_id)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush)
+
+    def _flush(self):
+        self._flush_scheduled = False
+        outbox, self._outbox = self._outbox, {}
+        for edge, frames in outbox.items():
+            self.backplane.publish(
+                f"worker:{edge}",
+                {"kind": "frames", "frames": [[frame, players] for frame, players in frames.items()]}
+            )
+
+    async def _consume(self):
+        # One consumer keeps each player's requests in order
+        while True:
+            message = await self._inbox.get()
+            try:
+                await self._handle(message)
+            except Exception as e:
+                log.error("cluster_message_failed", kind=message.get("kind"), error=repr(e))
+
+    async def _handle(self, message: dict):
+        kind = message["kind"]
+        if kind == "frames":
+            for frame, players in message["frames"]:
+                encoded = {}  # codec name -> frame, transcoded once per format in use
+                for player_id in players:
+                    conn = self.registry.connections.get(player_id)
+                    if conn:
+                        codec = conn.codec
+                        if codec.name not in encoded:
+                            encoded[codec.name] = codec.from_json(frame)
+                        conn.enqueue(encoded[codec.name])
+
+        elif kind == "request":
+            player_id = message["player"]
+            conn = self.registry.connections.get(player_id)
+            if conn is None:
+                conn = RemoteConnection(self, message["edge"], player_id)
+                self.registry.connect(player_id, conn)
+            try:
+                request = parse_message(message["raw"])
+            except ValidationError as e:
+                error_message, request_type = describe_error(e)
+                send_error(conn, error_message, request_type)
+                return
+            await dispatch(conn, self.registry, self.scheduler, request, player_id)
+
+        elif kind == "resume":
+            player_id = message["player"]
+            conn = RemoteConnection(self, message["edge"], player_id)
+            previous = self.registry.connections.get(player_id)
+            self.registry.connect(player_id, conn)
+            if previous is not None:
+                previous.supersede()
+            if not resume_session(conn, self.registry, self.scheduler, player_id):
+                send_error(conn, "Session expired", "resume")
+
+        elif kind == "disconnect":
+            # Ignore a stale disconnect for a player who already resumed through another edge
+            conn = self.registry.connections.get(message["player"])
+            if isinstance(conn, RemoteConnection) and conn.edge == message["edge"]:
+                connection_closed(self.registry, self.scheduler, conn, message.get("grace", RESUME_GRACE))
+
+
+def node_from_env():
+    """
+    Builds this worker's ClusterNode from the environment, or None when not sharded.
+    - WHO_TEXTED_WORKERS: comma-separated worker ids, or id=ws-url pairs for redirect mode
+    - WHO_TEXTED_WORKER_ID: this worker's id
+    - WHO_TEXTED_BACKPLANE: path of the hub's Unix socket
+    - WHO_TEXTED_SHARD_MODE: "forward" (default) or "redirect"
+    """
+    spec = os.environ.get("WHO_TEXTED_WORKERS")
+    if not spec:
+        return None
+
+    workers, urls = [], {}
+    for entry in spec.split(","):
+        worker, _, url = entry.partition("=")
+        workers.append(worker)
+        if url:
+            urls[worker] = url
+
+    return ClusterNode(
+        worker_id=os.environ["WHO_TEXTED_WORKER_ID"],
+        workers=workers,
+        backplane=SocketBackplane(os.environ["WHO_TEXTED_BACKPLANE"]),
+        mode=os.environ.get("WHO_TEXTED_SHARD_MODE", "forward"),
+        urls=urls
+    )
+
+
+def stored_resume_secret() -> str:
+    """
+    The resume secret kept in the room store at ROOM_STORE_PATH itself (workers
+    use ROOM_STORE_PATH.<id>), so relaunched workers still accept old tokens.
+    Without a store nothing survives a relaunch, so a fresh one will do.
+    """
+    if not ROOM_STORE_PATH:
+        return secrets.token_hex(32)
+
+    async def read():
+        store = SQLiteRoomStore(ROOM_STORE_PATH)
+        try:
+            return await store.resume_secret()
+        finally:
+            await store.stop()
+
+    return asyncio.run(read()).hex()
+
+
+def main():
+    """
+    Runs a hub and N uvicorn workers on this machine.
+    forward mode: every worker accepts on one shared port and forwards joins to the owner
+    redirect mode: worker i listens on port + i and redirects joins to the owner's port
+    """
+    parser = argparse.ArgumentParser(description="Run a sharded who-texted backend on one machine")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--mode", choices=["forward", "redirect"], default="forward")
+    parser.add_argument("--backplane", default="/tmp/who-texted-backplane.sock")
+    args = parser.parse_args()
+
+    if os.path.exists(args.backplane):
+        os.unlink(args.backplane)
+    hub = subprocess.Popen([sys.executable, "-c", f"import asyncio, backplane; asyncio.run(backplane.run_hub({args.backplane!r}))"])
+    deadline = time.monotonic() + BACKPLANE_HUB_START_TIMEOUT
+    while not os.path.exists(args.backplane):
+        if hub.poll() is not None:
+            sys.exit("backplane hub failed to start")
+        if time.monotonic() > deadline:
+            hub.kill()
+            sys.exit(f"backplane hub didn't open {args.backplane} within {BACKPLANE_HUB_START_TIMEOUT}s")
+        time.sleep(0.05)
+
+    ids = [str(i) for i in range(args.workers)]
+    if args.mode == "redirect":
+        spec = ",".join(f"{i}=ws://{args.host}:{args.port + int(i)}/ws" for i in ids)
+    else:
+        spec = ",".join(ids)
+        shared = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        shared.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        shared.bind((args.host, args.port))
+        shared.set_inheritable(True)
+
+    # Every worker must accept resume tokens issued by the others, and by their previous run
+    resume_secret = os.environ.get("WHO_TEXTED_RESUME_SECRET") or stored_resume_secret()
+
+    procs = [hub]
+    for worker_id in ids:
+        env = dict(
+            os.environ,
+            WHO_TEXTED_RESUME_SECRET=resume_secret,
+            WHO_TEXTED_WORKERS=spec,
+            WHO_TEXTED_WORKER_ID=worker_id,
+            WHO_TEXTED_BACKPLANE=args.backplane,
+            WHO_TEXTED_SHARD_MODE=args.mode
+        )
+        if args.mode == "redirect":
+            bind = ["--host", args.host, "--port", str(args.port + int(worker_id))]
+            procs.append(subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--ws", "compression:WebSocketProtocol", *bind], env=env))
+        else:
+            bind = ["--fd", str(shared.fileno())]
+            procs.append(subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--ws", "compression:WebSocketProtocol", *bind], env=env, pass_fds=(shared.fileno(),)))
+
+    try:
+        for proc in procs:
+            proc.wait()
+    except KeyboardInterrupt:
+        for proc in procs:
+            proc.terminate()
+
+
+if __name__ == "__main__":
+    main()
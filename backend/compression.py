@@ -0,0 +1,66 @@
+"""
+permessage-deflate tuned for lots of small frames.
+- uvicorn compresses every message with the websockets defaults (32 KB window,
+  memLevel 8: roughly 300 KB of zlib state per connection). Chat lines and acks
+  come out of deflate no smaller, so messages under DEFLATE_MIN_SIZE are sent
+  uncompressed (RFC 7692 leaves that per message) and the window is shrunk to
+  DEFLATE_WINDOW_BITS, which still covers a whole room
+- Clients that don't offer the extension are unaffected
+
+Enable with `uvicorn main:app --ws compression:WebSocketProtocol` (the cluster
+launcher does). `--ws-per-message-deflate false` still turns compression off.
+"""
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+from websockets.frames import CTRL_OPCODES, OP_CONT
+from uvicorn.protocols.websockets import websockets_impl
+
+from constants import DEFLATE_MIN_SIZE, DEFLATE_WINDOW_BITS, DEFLATE_MEM_LEVEL, DEFLATE_LEVEL
+
+
+class ThresholdPerMessageDeflate(PerMessageDeflate):
+    """PerMessageDeflate that leaves unfragmented messages below min_size uncompressed."""
+
+    def __init__(self, *args, min_size: int = DEFLATE_MIN_SIZE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+
+    def encode(self, frame):
+        if (
+            frame.opcode not in CTRL_OPCODES
+            and frame.opcode is not OP_CONT
+            and frame.fin
+            and len(frame.data) < self.min_size
+        ):
+            return frame  # rsv1 stays clear, so the client reads it as-is
+        return super().encode(frame)
+
+
+class ThresholdDeflateFactory(ServerPerMessageDeflateFactory):
+    def __init__(self, min_size: int = DEFLATE_MIN_SIZE, **kwargs):
+        super().__init__(**kwargs)
+        self.min_size = min_size
+
+    def process_request_params(self, params, accepted_extensions):
+        response, extension = super().process_request_params(params, accepted_extensions)
+        return response, ThresholdPerMessageDeflate(
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            extension.compress_settings,
+            min_size=self.min_size,
+        )
+
+
+class WebSocketProtocol(websockets_impl.WebSocketProtocol):
+    """uvicorn's websockets protocol, negotiating ThresholdDeflateFactory instead of the default."""
+
+    def __init__(self, config, *args, **kwargs):
+        super().__init__(config, *args, **kwargs)
+        if config.ws_per_message_deflate:
+            self.available_extensions = [
+                ThresholdDeflateFactory(
+                    server_max_window_bits=DEFLATE_WINDOW_BITS,
+                    compress_settings={"memLevel": DEFLATE_MEM_LEVEL, "level": DEFLATE_LEVEL},
+                )
+            ]
@@ -1,4 +1,123 @@
+import os
+
 animal_names = [
     "Otter", "Giraffe", "Panda", "Walrus",
     "Falcon", "Tiger", "Koala", "Hawk"
-]
\ No newline at end of file
+]
+
+# --- Outbound broadcasting ---
+
+OUTBOUND_QUEUE_SIZE = 256  # frames buffered per connection before it counts as backed up
+SLOW_CLIENT_TIMEOUT = 5.0  # seconds a connection may stay backed up before it is disconnected
+
+# --- Room state sync ---
+
+ROOM_PATCH_HISTORY = 64  # revisions kept per room for patching clients that fall behind
+
+# --- Phase timing (seconds) ---
+
+PROMPT_DURATION = 3  # prompt shown before responses open
+REVEAL_DURATION = 5  # reveal shown before scoring
+RESPONDING_DEADLINE = 90  # responding closes early after this; None waits for everyone
+VOTING_DEADLINE = 60  # voting closes early after this; None waits for everyone
+
+# --- Logging ---
+
+LOG_LEVEL = "INFO"
+LOG_SAMPLE_RATES = {  # event -> fraction of records kept
+    "message_handled": 0.01,
+    "broadcast": 0.01,
+}
+
+# --- Persistence ---
+
+# SQLite file for room snapshots and their change log, from WHO_TEXTED_ROOM_STORE.
+# Off by default, so dev and test runs don't restore each other's rooms
+ROOM_STORE_PATH = os.environ.get("WHO_TEXTED_ROOM_STORE") or None
+PERSIST_INTERVAL = 0.5  # seconds between batched writes
+SNAPSHOT_EVERY = 50  # logged changes per room before it is compacted into a fresh snapshot
+
+# --- Sessions ---
+
+RESUME_GRACE = 30  # seconds a dropped player keeps their seat; None evicts immediately
+RESUME_BUFFER = 128  # frames kept per room for players waiting to resume
+
+# --- Room lifecycle ---
+
+ROOM_TTL = {  # seconds without activity before a room in each state is reaped
+    "lobby": 30 * 60,
+    "playing": 20 * 60,
+    "finished": 5 * 60,
+}
+ROOM_MEMORY_BUDGET = 64 * 1024 * 1024  # serialized bytes of resident room state; None disables
+REAPER_INTERVAL = 30  # seconds between sweeps
+ARCHIVE_EVICTED_ROOMS = True  # keep a copy of reaped rooms in the room store
+
+# --- Round history ---
+
+ROUND_RETENTION = 3 if ROOM_STORE_PATH else None  # finished rounds kept in memory per room; older ones are read from the room store. None (no store) keeps all of them
+ROUND_HISTORY_PAGE = 20  # most rounds returned by one get_round_history request
+
+# --- Room codes ---
+
+ROOM_CODE_ALPHABET = "ABCDEFGHJKMNPQRTUVWXYZ"  # no look-alikes (I/L/O/S)
+ROOM_CODE_TIERS = (4, 5, 6)  # code lengths, shortest first
+ROOM_CODE_TIER_FILL = 0.5  # move on to longer codes once a tier is this full
+
+# --- Prompts ---
+
+PROMPT_PACK_DIR = "prompt_packs"  # extra prompt packs (*.txt), relative to backend/; skipped if missing
+PROMPT_CACHE_SIZE = 4096  # compiled templates kept from file packs
+
+# --- Wire format ---
+
+DEFLATE_MIN_SIZE = 256  # bytes; smaller messages are sent uncompressed, since deflate rarely shrinks them
+DEFLATE_WINDOW_BITS = 12  # 4 KB compression window per connection instead of 32 KB
+DEFLATE_MEM_LEVEL = 5  # zlib memLevel; 16 KB of hash state instead of 128 KB
+DEFLATE_LEVEL = 6  # zlib compression level
+
+# --- Rate limits ---
+
+RATE_LIMITS = {  # event type -> (tokens per second, burst) per connection; "*" covers every inbound frame
+    "*": (20, 40),
+    "send_message": (2, 8),
+    "create_room": (0.2, 3),
+    "join_room": (1, 5),
+    "get_round_history": (2, 10),
+    "watch_room": (1, 5),
+    "audience_vote": (1, 3),
+    "quick_play": (0.2, 3),
+}
+CHAT_COALESCE_TICK = 0.1  # seconds chat is held so messages sent together share a frame; None sends each at once
+
+# --- Spectators ---
+
+SPECTATOR_TICK = 0.5  # seconds; an audience gets at most one frame per room per tick
+SPECTATOR_FANOUT_CHUNK = 256  # spectators sent to before yielding to the event loop
+SPECTATOR_BACKLOG = 2  # frames a spectator may have queued before updates skip it
+
+# --- Matchmaking ---
+
+MATCH_ROOM_SIZE = 6  # players per quick-play room
+MATCH_MIN_PLAYERS = 3  # smallest room quick play starts (start_game's minimum)
+MATCH_MAX_WAIT = 10  # seconds the longest-waiting player waits for a full room before a smaller one forms
+MATCH_TICK = 0.25  # seconds between matching passes while anyone is waiting
+MATCH_ROOMS_PER_PASS = 40  # rooms formed per pass at most; a backlog drains in passes run back to back, yielding in between
+
+# --- Heartbeat ---
+
+HEARTBEAT_INTERVAL = 5  # seconds; a connection that has sent nothing for half of this is pinged, and each is checked once per interval
+HEARTBEAT_TIMEOUT = 12  # seconds without any inbound frame (pongs included) before a connection is dropped
+HEARTBEAT_SLOTS = 50  # timer wheel slots; one slot's connections are checked every HEARTBEAT_INTERVAL / HEARTBEAT_SLOTS
+HEARTBEAT_REAP_GRACE = 5  # seconds a timed-out player keeps their seat, instead of RESUME_GRACE; None evicts immediately
+
+# --- Metrics ---
+
+LOOP_LAG_INTERVAL = 0.5  # seconds between event-loop lag samples
+
+# --- Backplane ---
+
+BACKPLANE_MAX_FRAME = 16 * 1024 * 1024  # bytes; a larger message is dropped (and logged) rather than relayed
+BACKPLANE_RECONNECT_DELAY = 0.5  # seconds before the first reconnect to the hub; doubles per failed attempt
+BACKPLANE_RECONNECT_MAX = 10  # seconds between reconnect attempts at most
+BACKPLANE_HUB_START_TIMEOUT = 10  # seconds the cluster launcher waits for the hub's socket to appear
@@ -0,0 +1,246 @@
+"""
+The round lifecycle as a table-driven state machine, free of I/O.
+- A room's phase is "lobby", its round's state (prompt, responding, voting,
+  reveal, scoring) while playing, or "finished". TRANSITIONS lists which events
+  each phase accepts and the function applying them; every phase change is
+  checked against helpers.validate_state_transition
+- apply(room, event, ...) updates the room and returns (phase, effects): what
+  the caller should now do, in order. It never sends, schedules or sleeps, and
+  randomness (roles, prompt order, ids) comes from the rng passed in, so a
+  seeded random.Random replays a game exactly
+- Effects are tuples, first item the kind:
+    ("broadcast", message, *args)  to every player in the room
+    ("send", player_id, message, *args)  to one player
+    ("reply", message, *args)  to the player whose request this was
+    ("timer", delay, event, round_id)  apply event after delay, replacing the room's pending timer
+    ("cancel_timer",)
+    ("archive", round_dict)  a finished round, for the round archive
+    ("reject", reason)  a player's request that was refused
+    ("error", message)  a round that could not be set up
+  message names the outbound frame (its type); the caller builds it from the
+  room as it is once apply returns
+- sockets.run_game_event drives it for live rooms; benchmarks/simulate.py plays
+  whole games through it headless
+"""
+import random
+
+from helpers import (
+    initialize_round, validate_response, process_response, check_all_responses_submitted,
+    check_all_votes_submitted, process_vote, calculate_round_scores, check_game_completion,
+    validate_state_transition, discard_unscored_round
+)
+from constants import PROMPT_DURATION, RESPONDING_DEADLINE, VOTING_DEADLINE, REVEAL_DURATION
+
+MIN_PLAYERS = 3  # players needed to start a game (assign_round_roles needs a target and two others)
+
+# Phase -> (seconds, event applied when they run out); a None delay waits for the players
+PHASE_TIMERS = {
+    "prompt": (PROMPT_DURATION, "prompt_over"),
+    "responding": (RESPONDING_DEADLINE, "responding_deadline"),
+    "voting": (VOTING_DEADLINE, "voting_deadline"),
+    "reveal": (REVEAL_DURATION, "reveal_over"),
+}
+
+
+def phase(room) -> str:
+    if room.state == "playing" and room.currentRoundData is not None:
+        return room.currentRoundData.state
+    return room.state
+
+
+def apply(room, event: str, player_id: str = None, data: str = None, round_id: str = None, rng: random.Random = None) -> tuple:
+    """
+    Applies one event to the room and returns (phase, effects).
+    - player_id: who sent it, for player requests
+    - data: the response text for submit_response, the response id for submit_vote
+    - round_id: for timer events, the round they were armed for; they are dropped
+      if that round has moved on
+    An event the phase has no transition for changes nothing; a player's gets a
+    reject effect, a timer's or player_left's is dropped quietly.
+    """
+    current = phase(room)
+    transition = TRANSITIONS.get((current, event))
+    if transition is None:
+        return current, ([("reject", f"not_during_{current}")] if player_id is not None else [])
+    if round_id is not None and room.currentRoundData.id != round_id:
+        return current, []
+
+    effects = []
+    transition(room, effects, player_id, data, rng)
+    return phase(room), effects
+
+
+def timer(room) -> list:
+    """Effects re-arming the current phase's timer, for a room restored from storage."""
+    if phase(room) not in PHASE_TIMERS:
+        return []
+    effects = []
+    _arm(room, effects)
+    return effects
+
+
+def _move(room, new_state: str):
+    current = phase(room)
+    if not validate_state_transition(current, new_state):
+        raise ValueError(f"Illegal transition {current} -> {new_state} in room {room.id}")
+    if new_state == "finished":
+        room.state = "finished"
+    else:
+        room.currentRoundData.state = new_state
+
+
+def _arm(room, effects: list):
+    delay, event = PHASE_TIMERS[phase(room)]
+    if delay is None:
+        effects.append(("cancel_timer",))
+    else:
+        effects.append(("timer", delay, event, room.currentRoundData.id))
+
+
+# --- Rounds starting ---
+
+def _start_round(room, effects: list, round_number: int, rng) -> bool:
+    """
+    Sets up the next round (roundSetup -> prompt). If it can't be set up (players
+    left, say), the room goes back to the lobby. Returns whether it started.
+    """
+    if not validate_state_transition(phase(room), "roundSetup"):
+        raise ValueError(f"Illegal transition {phase(room)} -> roundSetup in room {room.id}")
+    try:
+        round_data = initialize_round(room, round_number, rng)
+    except Exception as e:
+        effects.append(("error", repr(e)))
+        discard_unscored_round(room)
+        room.state = "lobby"
+        room.currentRoundData = None
+        room.currentPrompt = None
+        return False
+
+    discard_unscored_round(room)
+    room.currentRound = round_number
+    room.state = "playing"
+    room.currentRoundData = round_data
+    room.currentPrompt = round_data.prompt
+
+    # Responders learn their role, then everyone sees the prompt
+    for player in room.players:
+        if player.id != round_data.targetPlayerId:
+            effects.append(("send", player.id, "round_setup"))
+    effects.append(("broadcast", "prompt_display"))
+    return True
+
+
+def _start_game(room, effects, player_id, data, rng):
+    host = room._members.get(player_id)
+    if not host or not host.isHost:
+        effects.append(("reject", "not_host"))
+        return
+    if len(room.players) < MIN_PLAYERS:
+        effects.append(("reject", "too_few_players"))
+        return
+
+    if _start_round(room, effects, 1, rng):
+        effects.append(("broadcast", "game_start"))
+        _arm(room, effects)
+
+
+def _next_round(room, effects, player_id, data, rng):
+    """The host moves on: after scoring, or skipping ahead mid-round (the round goes unscored)."""
+    host = room._members.get(player_id)
+    if not host or not host.isHost:
+        effects.append(("reject", "not_host"))
+        return
+    effects.append(("cancel_timer",))
+
+    if check_game_completion(room):
+        _move(room, "finished")
+        if not room.players:
+            effects.append(("reject", "no_winner"))
+            return
+        # Standings are kept sorted; ties go to whoever joined first
+        discard_unscored_round(room)
+        effects.append(("broadcast", "game_finished", room._members[room._standings.leader()]))
+        return
+
+    if _start_round(room, effects, room.currentRound + 1, rng):
+        effects.append(("broadcast", "room_update"))
+        _arm(room, effects)
+
+
+# --- Phases of a round ---
+
+def _open_responses(room, effects, player_id, data, rng):
+    _move(room, "responding")
+    effects.append(("broadcast", "room_update"))
+    _arm(room, effects)
+
+
+def _submit_response(room, effects, player_id, data, rng):
+    if not validate_response(room, player_id, data):
+        effects.append(("reject", "invalid_response"))
+        return
+    process_response(room, player_id, data, rng)
+    all_submitted = check_all_responses_submitted(room)
+    effects.append(("reply", "response_submitted", all_submitted))
+    if all_submitted:
+        _open_voting(room, effects, player_id, data, rng)
+
+
+def _open_voting(room, effects, player_id, data, rng):
+    _move(room, "voting")
+    effects.append(("broadcast", "voting_phase"))
+    _arm(room, effects)
+
+
+def _submit_vote(room, effects, player_id, data, rng):
+    all_voted = process_vote(room, player_id, data)
+    effects.append(("reply", "vote_submitted", all_voted))
+    if all_voted:
+        _reveal(room, effects, player_id, data, rng)
+
+
+def _reveal(room, effects, player_id, data, rng):
+    _move(room, "reveal")
+    if room.currentRoundData._audience is not None:
+        room.currentRoundData._audience.closed = True
+    effects.append(("broadcast", "reveal_phase"))
+    _arm(room, effects)
+
+
+def _score(room, effects, player_id, data, rng):
+    round_data = room.currentRoundData
+    scores = calculate_round_scores(round_data, room.players)
+    for player in room.players:
+        player.points += scores[player.id]
+    _move(room, "scoring")
+    effects.append(("broadcast", "scoring_phase", scores))
+    effects.append(("archive", room._history.add(round_data)))
+    effects.append(("broadcast", "round_complete"))
+
+
+# A player leaving mid-round may have been the last one the round was waiting for
+
+def _responses_in(room, effects, player_id, data, rng):
+    if check_all_responses_submitted(room):
+        _open_voting(room, effects, player_id, data, rng)
+        _votes_in(room, effects, player_id, data, rng)
+
+
+def _votes_in(room, effects, player_id, data, rng):
+    if check_all_votes_submitted(room):
+        _reveal(room, effects, player_id, data, rng)
+
+
+# (phase, event) -> transition(room, effects, player_id, data, rng)
+TRANSITIONS = {
+    ("lobby", "start_game"): _start_game,
+    ("prompt", "prompt_over"): _open_responses,
+    ("responding", "submit_response"): _submit_response,
+    ("responding", "responding_deadline"): _open_voting,
+    ("responding", "player_left"): _responses_in,
+    ("voting", "submit_vote"): _submit_vote,
+    ("voting", "voting_deadline"): _reveal,
+    ("voting", "player_left"): _votes_in,
+    ("reveal", "reveal_over"): _score,
+    **{(state, "next_round"): _next_round for state in ("prompt", "responding", "voting", "reveal", "scoring")},
+}
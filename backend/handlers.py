@@ -1,30 +1,91 @@
-import json
+from typing import Annotated, Union
+
+from pydantic import Field, TypeAdapter, ValidationError
+
 from models import (
     BaseWSMessage, CreateRoomRequest, JoinRoomRequest,
     SendMessageRequest, LeaveRoomRequest, StartGameRequest,
-    SubmitResponseRequest, SubmitVoteRequest, NextRoundRequest
+    SubmitResponseRequest, SubmitVoteRequest, NextRoundRequest,
+    SyncSubscribeRequest, SyncAckRequest, RoundHistoryRequest, WatchRoomRequest,
+    AudienceVoteRequest, QuickPlayRequest, PongRequest
+)
+from sockets import (
+    handle_create_room, handle_join_room, handle_send_message,
+    handle_leave_room, handle_start_game, handle_submit_response,
+    handle_submit_vote, handle_next_round, handle_sync_subscribe, handle_sync_ack,
+    handle_get_round_history, handle_watch_room, handle_audience_vote, handle_pong
 )
+from matchmaking import handle_quick_play
+from wire import JSON
+
+# Requests run where they arrive rather than in their room's actor: create_room and
+# quick_play have no room yet, get_round_history only reads, then waits on the round archive (which
+# would hold up the room's other events), and watch_room, audience_vote and pong never
+# touch the room itself
+DIRECT = {"create_room", "quick_play", "get_round_history", "watch_room", "audience_vote", "pong"}
+
+# Event type -> (request model, handler). Every handler takes
+# (conn, registry, scheduler, request, player_id).
+EVENTS = {
+    "create_room": (CreateRoomRequest, handle_create_room),
+    "join_room": (JoinRoomRequest, handle_join_room),
+    "start_game": (StartGameRequest, handle_start_game),
+    "send_message": (SendMessageRequest, handle_send_message),
+    "leave_room": (LeaveRoomRequest, handle_leave_room),
+    "submit_response": (SubmitResponseRequest, handle_submit_response),
+    "submit_vote": (SubmitVoteRequest, handle_submit_vote),
+    "next_round": (NextRoundRequest, handle_next_round),
+    "sync_subscribe": (SyncSubscribeRequest, handle_sync_subscribe),
+    "sync_ack": (SyncAckRequest, handle_sync_ack),
+    "get_round_history": (RoundHistoryRequest, handle_get_round_history),
+    "watch_room": (WatchRoomRequest, handle_watch_room),
+    "audience_vote": (AudienceVoteRequest, handle_audience_vote),
+    "quick_play": (QuickPlayRequest, handle_quick_play),
+    "pong": (PongRequest, handle_pong),
+}
+
+# Discriminated on "type", so pydantic-core picks the model and validates in one pass
+IncomingMessage = Annotated[
+    Union[tuple(model for model, _ in EVENTS.values())],
+    Field(discriminator="type")
+]
+_incoming = TypeAdapter(IncomingMessage)
+
+
+def parse_message(raw: str | bytes, codec=JSON) -> BaseWSMessage:
+    """
+    Validates a raw frame straight into its request model.
+    Binary frames from clients that negotiated a binary codec are decoded with it
+    first; everything else is JSON.
+    Raises pydantic.ValidationError for malformed frames, unknown types and bad fields.
+    """
+    if codec.binary and isinstance(raw, bytes):
+        return _incoming.validate_python(codec.decode(raw))
+    return _incoming.validate_json(raw)
+
+
+async def dispatch(conn, registry, scheduler, request: BaseWSMessage, player_id: str):
+    """
+    Runs a request's handler in its room's actor, after whatever the room already
+    has queued. Returns once it has run and what it sent is queued, so each
+    connection has one request in flight and its requests apply in order.
+    """
+    _, handler = EVENTS[request.type]
+    if request.type in DIRECT:
+        await handler(conn, registry, scheduler, request, player_id)
+        return
+    await registry.actors.post(request.roomId, request.type, handler, conn, registry, scheduler, request, player_id)
+
 
-def parse_message(raw: str) -> BaseWSMessage:
-    data = json.loads(raw)
-    msg_type = data.get("type")
-
-    match msg_type:
-        case "create_room":
-            return CreateRoomRequest(**data)
-        case "join_room":
-            return JoinRoomRequest(**data)
-        case "start_game":
-            return StartGameRequest(**data)
-        case "send_message":
-            return SendMessageRequest(**data)
-        case "leave_room":
-            return LeaveRoomRequest(**data)
-        case "submit_response":
-            return SubmitResponseRequest(**data)
-        case "submit_vote":
-            return SubmitVoteRequest(**data)
-        case "next_round":
-            return NextRoundRequest(**data)
-        case _:
-            raise ValueError(f"Unknown WebSocket event type: {msg_type}")
+def describe_error(error: ValidationError) -> tuple:
+    """Returns (message, request_type) for an error reply; request_type is None if unreadable."""
+    first = error.errors()[0]
+    loc = first.get("loc") or ()
+    if loc and loc[0] in EVENTS:
+        request_type = loc[0]
+        field = ".".join(str(part) for part in loc[1:])
+        message = f"{field}: {first['msg']}" if field else first["msg"]
+    else:
+        request_type = (first.get("ctx") or {}).get("tag")
+        message = first["msg"]
+    return message, request_type
@@ -0,0 +1,109 @@
+"""
+Heartbeat: finds clients that went away without closing their socket.
+- A half-open connection (a phone that lost signal, a NAT that forgot the
+  mapping) never makes ws.receive() return, so the player would hold their seat
+  and the round would wait on them until the phase deadline
+- Every inbound frame stamps Connection.last_seen. Connections that have been
+  quiet for half of HEARTBEAT_INTERVAL are sent a ping, which clients answer
+  with pong; one silent for HEARTBEAT_TIMEOUT is closed and handed to
+  connection_closed with HEARTBEAT_REAP_GRACE instead of the usual resume grace
+- Only clients that have answered a ping at least once are timed out. Older
+  clients that don't know about pong can sit quiet through a whole phase, so
+  they keep relying on the socket closing, as before the heartbeat
+- Connections sit in a timer wheel of HEARTBEAT_SLOTS slots, spread round-robin,
+  and one scheduler entry checks one slot per tick, a full turn per interval.
+  Nothing is scheduled per connection and an inbound frame costs one attribute
+  store, so the heartbeat's cost grows with connections / slots per tick
+- The ping is encoded once per wire format and shared by every connection
+"""
+import time
+
+from models import PingResponse
+from sockets import connection_closed
+from constants import HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT, HEARTBEAT_SLOTS, HEARTBEAT_REAP_GRACE
+from logger import get_logger
+from metrics import HEARTBEAT_TIMEOUTS
+
+log = get_logger("heartbeat")
+
+TICK_KEY = "heartbeat"  # scheduler key
+
+
+class Heartbeat:
+    def __init__(
+        self,
+        registry,
+        scheduler,
+        node=None,
+        interval: float = HEARTBEAT_INTERVAL,
+        timeout: float = HEARTBEAT_TIMEOUT,
+        slots: int = HEARTBEAT_SLOTS,
+        grace: float = HEARTBEAT_REAP_GRACE,
+    ):
+        self.registry = registry
+        self.scheduler = scheduler
+        self.node = node  # the ClusterNode when sharded, to tell a room's owner
+        self.interval = interval
+        self.timeout = timeout
+        self.grace = grace
+        self.tick = interval / slots
+        self._wheel = [set() for _ in range(slots)]  # slot -> connections checked on its tick
+        self._slot_of = {}  # Connection -> its slot
+        self._next_slot = 0  # where the next connection goes
+        self._hand = 0  # slot the next tick checks
+        self._pings = {}  # codec name -> encoded ping
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def start(self):
+        self.scheduler.schedule(TICK_KEY, self.tick, self.check)
+
+    def stop(self):
+        self.scheduler.cancel(TICK_KEY)
+
+    def add(self, conn):
+        slot = self._next_slot
+        self._next_slot = (slot + 1) % len(self._wheel)
+        self._wheel[slot].add(conn)
+        self._slot_of[conn] = slot
+
+    def discard(self, conn):
+        slot = self._slot_of.pop(conn, None)
+        if slot is not None:
+            self._wheel[slot].discard(conn)
+
+    def check(self):
+        """One tick: pings the quiet connections in the current slot and drops the silent ones."""
+        try:
+            slot = self._wheel[self._hand]
+            self._hand = (self._hand + 1) % len(self._wheel)
+            if not slot:
+                return
+            now = time.monotonic()
+            quiet = self.interval / 2
+            for conn in list(slot):
+                silent = now - conn.last_seen
+                if silent >= self.timeout and conn.answers_pings:
+                    self._time_out(conn, silent)
+                elif silent >= quiet:
+                    conn.enqueue(self._ping(conn.codec))
+        finally:
+            self.start()
+
+    def _ping(self, codec):
+        frame = self._pings.get(codec.name)
+        if frame is None:
+            frame = self._pings[codec.name] = codec.encode(PingResponse().model_dump())
+        return frame
+
+    def _time_out(self, conn, silent: float):
+        log.info("heartbeat_timeout", player_id=conn.player_id, silent_s=round(silent, 1))
+        HEARTBEAT_TIMEOUTS.inc()
+        self.discard(conn)
+        conn.time_out()
+        # Cleaned up now rather than when the socket finally reports closing; the
+        # receive loop's own cleanup then finds the player already handled
+        if self.node is not None:
+            self.node.forward_disconnect(conn, self.grace)
+        connection_closed(self.registry, self.scheduler, conn, self.grace)
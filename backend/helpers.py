@@ -1,57 +1,18 @@
-from fastapi import WebSocket
 import random
 import uuid
 
 from models import Player, Room, Round, Response, Vote
-from prompts import generate_prompt
+from prompts import generate_prompt, catalog, PromptSampler
+from tally import AudienceBallot
 
-def validate_room_id(request, rooms):
+def validate_room_id(request, registry):
     room_id = request.roomId
-    if room_id not in rooms:
+    if room_id not in registry.rooms:
         return False
     return True
 
-def generate_room_code(rooms=None):
-    """Generate a unique room code. If rooms dict provided, ensures uniqueness."""
-    max_attempts = 100
-    for _ in range(max_attempts):
-        code = "".join(random.choice("ABCDEFGHJKMNPQRTUVWXYZ") for _ in range(4))
-        if rooms is None or code not in rooms:
-            return code
-    # Fallback: use UUID if we can't generate unique code
-    return str(uuid.uuid4())[:8].upper()
-
-
-async def send(ws: WebSocket, payload: dict):
-    """Send JSON to a single client."""
-    await ws.send_json(payload)
-
-
-async def broadcast(rooms, connections, room_id: str, payload: dict, exclude_player_id=None):
-    room = rooms.get(room_id) # get room information
-    if not room:
-        print(f"Room {room_id} doesn't exist")
-        return
-    
-    # send payload to every included player in the room (to update)
-    print(f"[BROADCAST] Sending to room {room_id} with {len(room.players)} players")
-    sent_count = 0
-    for player in room.players:
-        if player.id == exclude_player_id:
-            print(f"[BROADCAST] Skipping excluded player {player.id}")
-            continue
-        ws = connections.get(player.id)
-        if ws:
-            print(f"[BROADCAST] Sending to player {player.id} ({player.username})")
-            await ws.send_json(payload)
-            sent_count += 1
-        else:
-            print(f"[BROADCAST] WARNING: No WebSocket connection found for player {player.id} ({player.username})")
-    print(f"[BROADCAST] Sent to {sent_count}/{len(room.players)} players")
-
-
-def initialize_new_room(rooms, player_id: str, username: str):
-    room_id = generate_room_code(rooms)
+def initialize_new_room(registry, player_id: str, username: str, prompt_tags=None):
+    room_id = registry.codes.allocate(registry.rooms, registry.owns_room)
     display_name = username # just assign username to player creating game for now
 
     host_player = Player(
@@ -69,16 +30,17 @@ def initialize_new_room(rooms, player_id: str, username: str):
         state="lobby",
         currentRound=0,
         currentPrompt=None,
-        rounds=[]
+        rounds=[],
+        promptTags=prompt_tags
     )
 
-    rooms[room_id] = new_room
+    registry.add_room(new_room)
 
     return room_id, display_name
 
 
-def join_room(rooms, player_id: str, username: str, room_id: str):
-    room: Room = rooms[room_id]
+def join_room(registry, player_id: str, username: str, room_id: str):
+    room: Room = registry.rooms[room_id]
     display_name = username
 
     # Create new player for joining player
@@ -91,16 +53,23 @@ def join_room(rooms, player_id: str, username: str, room_id: str):
     )
 
     # Add player to room
-    room.players.append(new_player)
+    registry.add_player(room, new_player)
 
     return display_name, room
 
 
 # --- Game Logic Functions ---
 
-def assign_round_roles(players: list, target_player_id: str) -> dict:
+def new_id(rng: random.Random = None) -> str:
+    """A random UUID4 string, drawn from rng when one is given so seeded games get the same ids."""
+    if rng is None:
+        return str(uuid.uuid4())
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def assign_round_roles(players: list, target_player_id: str, rng: random.Random = None) -> dict:
     """
-    Assigns roles for a round.
+    Assigns roles for a round, drawing from rng (the random module if None).
     Returns:
     {
         'targetPlayerId': str,
@@ -109,6 +78,8 @@ def assign_round_roles(players: list, target_player_id: str) -> dict:
         'fakeResponderIds': List[str]  # All other players
     }
     """
+    rng = rng or random
+
     # Get all player IDs except the target
     available_players = [p.id for p in players if p.id != target_player_id]
     
@@ -116,11 +87,11 @@ def assign_round_roles(players: list, target_player_id: str) -> dict:
         raise ValueError("Not enough players for role assignment (need at least 3 players)")
     
     # Randomly select prompt sender (different from target)
-    prompt_sender_id = random.choice(available_players)
+    prompt_sender_id = rng.choice(available_players)
     
     # Randomly select real impersonator (different from target and sender)
     real_impersonator_candidates = [p for p in available_players if p != prompt_sender_id]
-    real_impersonator_id = random.choice(real_impersonator_candidates)
+    real_impersonator_id = rng.choice(real_impersonator_candidates)
     
     # All other players (except target and real impersonator) are fake responders
     fake_responder_ids = [p.id for p in players if p.id != target_player_id and p.id != real_impersonator_id]
@@ -133,64 +104,14 @@ def assign_round_roles(players: list, target_player_id: str) -> dict:
     }
 
 
-async def start_new_round(room: Room, rooms: dict, connections: dict) -> None:
-    """
-    Starts a new round according to specification:
-    - Creates new Round object
-    - Sends RoundSetupResponse (optional UX enhancement)
-    - Sends PromptDisplayResponse to all players
-    """
-    round_number = room.currentRound
-    round_data = initialize_round(room, round_number)
-    room.currentRoundData = round_data
-    room.currentPrompt = round_data.prompt
-    
-    # Get player names
-    target_player = next((p for p in room.players if p.id == round_data.targetPlayerId), None)
-    sender_player = next((p for p in room.players if p.id == round_data.promptSenderId), None)
-    
-    if not target_player or not sender_player:
-        raise ValueError("Target or sender player not found")
-    
-    target_name = target_player.displayName or target_player.username
-    sender_name = sender_player.displayName or sender_player.username
-    
-    # Send RoundSetupResponse to responding players (UX enhancement - not in spec but useful)
-    from models import RoundSetupResponse
-    for player in room.players:
-        if player.id == round_data.targetPlayerId:
-            continue  # Target doesn't respond
-        
-        role = "real_impersonator" if player.id == round_data.realImpersonatorId else "fake_responder"
-        ws = connections.get(player.id)
-        if ws:
-            response = RoundSetupResponse(
-                room=room,
-                targetPlayerName=target_name,
-                promptSenderName=sender_name,
-                yourRole=role
-            ).model_dump()
-            await send(ws, response)
-    
-    # Send PromptDisplayResponse to all players (spec requirement)
-    from models import PromptDisplayResponse
-    prompt_response = PromptDisplayResponse(
-        room=room,
-        promptText=round_data.prompt,
-        targetPlayerName=target_name
-    ).model_dump()
-    
-    # Broadcast to all players (use room.id as room_id)
-    await broadcast(rooms, connections, room.id, prompt_response)
-
-
-def initialize_round(room: Room, round_number: int) -> Round:
+def initialize_round(room: Room, round_number: int, rng: random.Random = None) -> Round:
     """
     Initializes a new round:
     - Selects target player (round-robin or random)
     - Assigns roles
     - Generates prompt
     - Creates new Round object
+    Roles, the room's prompt order and the round id are drawn from rng when one is given.
     """
     players = room.players
     
@@ -202,21 +123,23 @@ def initialize_round(room: Room, round_number: int) -> Round:
     target_player = players[target_index]
     
     # Assign roles
-    roles = assign_round_roles(players, target_player.id)
+    roles = assign_round_roles(players, target_player.id, rng)
     
     # Get player names for prompt generation
     target_name = target_player.displayName or target_player.username
-    sender_player = next((p for p in players if p.id == roles['promptSenderId']), None)
+    sender_player = room._members.get(roles['promptSenderId'])
     if not sender_player:
         raise ValueError(f"Prompt sender {roles['promptSenderId']} not found in players")
     sender_name = sender_player.displayName or sender_player.username
     
-    # Generate prompt
-    prompt_text = generate_prompt(target_name, sender_name)
+    # Generate prompt, without repeats for this room
+    if room._prompts is None:
+        room._prompts = PromptSampler(catalog(), room.promptTags, rng)
+    prompt_text = generate_prompt(target_name, sender_name, room._prompts)
     
     # Create round
     new_round = Round(
-        id=str(uuid.uuid4()),
+        id=new_id(rng),
         roundNumber=round_number,
         prompt=prompt_text,
         targetPlayerId=roles['targetPlayerId'],
@@ -247,8 +170,7 @@ def validate_response(room: Room, player_id: str, response_text: str) -> bool:
         return False
     
     # Check if player is in room
-    player = next((p for p in room.players if p.id == player_id), None)
-    if not player:
+    if player_id not in room._members:
         return False
     
     # Check if player is the target (target doesn't respond)
@@ -256,11 +178,7 @@ def validate_response(room: Room, player_id: str, response_text: str) -> bool:
         return False
     
     # Check if player already submitted
-    existing_response = next(
-        (r for r in room.currentRoundData.responses if r.playerId == player_id),
-        None
-    )
-    if existing_response:
+    if player_id in room.currentRoundData._responders:
         return False
     
     # Validate response length (1-200 characters)
@@ -272,7 +190,7 @@ def validate_response(room: Room, player_id: str, response_text: str) -> bool:
     return True
 
 
-def process_response(room: Room, player_id: str, response_text: str) -> Response:
+def process_response(room: Room, player_id: str, response_text: str, rng: random.Random = None) -> Response:
     """
     Processes and stores a response submission.
     Returns the created Response object.
@@ -282,17 +200,49 @@ def process_response(room: Room, player_id: str, response_text: str) -> Response
     is_real = (player_id == round_data.realImpersonatorId)
     
     response = Response(
-        id=str(uuid.uuid4()),
+        id=new_id(rng),
         playerId=player_id,  # Store for reveal/scoring, but hide in voting phase
         text=response_text.strip(),
         isReal=is_real,
         voteCount=0
     )
     
-    round_data.responses.append(response)
+    round_data.append("responses", response)
+    round_data._responses_by_id[response.id] = response
+    round_data._responders[player_id] = response
+    room._standings.apply(round_data._tally.response_added(response))
     return response
 
 
+def expected_participants(room: Room) -> int:
+    """
+    Number of players expected to respond and vote this round (everyone but the target).
+    Responders and voters are only ever current members other than the target,
+    so comparing counts against this is enough to know everyone is done.
+    """
+    target_in_room = room.currentRoundData.targetPlayerId in room._members
+    return len(room.players) - (1 if target_in_room else 0)
+
+
+def remove_player_round_data(room: Room, player_id: str) -> None:
+    """Drops a leaving player's response and vote from the current round, keeping the indexes and tally in sync."""
+    round_data = room.currentRoundData
+    tally = round_data._tally
+    response = round_data._responders.pop(player_id, None)
+    if response:
+        round_data.responses = [r for r in round_data.responses if r is not response]
+        del round_data._responses_by_id[response.id]
+        room._standings.apply(tally.response_removed(response))
+
+    vote = round_data._voters.pop(player_id, None)
+    if vote:
+        round_data.votes = [v for v in round_data.votes if v is not vote]
+        voted_response = round_data._responses_by_id.get(vote.responseId)
+        if voted_response:
+            voted_response.voteCount -= 1
+        room._standings.apply(tally.vote_removed(player_id))
+
+
 def check_all_responses_submitted(room: Room) -> bool:
     """
     Checks if all players have submitted responses.
@@ -301,13 +251,18 @@ def check_all_responses_submitted(room: Room) -> bool:
         return False
     
     # All players except target should submit
-    expected_responders = [p.id for p in room.players if p.id != room.currentRoundData.targetPlayerId]
-    # Responses have playerId set (not None) when stored
-    submitted_ids = {r.playerId for r in room.currentRoundData.responses if r.playerId is not None}
-    
-    return len(expected_responders) == len(submitted_ids) and all(
-        pid in submitted_ids for pid in expected_responders
-    )
+    return len(room.currentRoundData._responders) >= expected_participants(room)
+
+
+def check_all_votes_submitted(room: Room) -> bool:
+    """
+    Checks if all players have voted.
+    """
+    if not room.currentRoundData:
+        return False
+
+    # All players except target should vote
+    return len(room.currentRoundData._voters) >= expected_participants(room)
 
 
 def process_vote(room: Room, voter_id: str, response_id: str) -> bool:
@@ -326,93 +281,72 @@ def process_vote(room: Room, voter_id: str, response_id: str) -> bool:
     if voter_id == room.currentRoundData.targetPlayerId:
         return False
     
+    # Check if voter is in room
+    if voter_id not in room._members:
+        return False
+    
     # Check if player already voted
-    existing_vote = next(
-        (v for v in room.currentRoundData.votes if v.voterId == voter_id),
-        None
-    )
-    if existing_vote:
+    if voter_id in room.currentRoundData._voters:
         return False
     
     # Check if response exists
-    response = next(
-        (r for r in room.currentRoundData.responses if r.id == response_id),
-        None
-    )
+    response = room.currentRoundData._responses_by_id.get(response_id)
     if not response:
         return False
     
     # Record vote
     vote = Vote(voterId=voter_id, responseId=response_id)
-    room.currentRoundData.votes.append(vote)
+    room.currentRoundData.append("votes", vote)
+    room.currentRoundData._voters[voter_id] = vote
     
-    # Update vote count on response
+    # Update vote count on response, and the running score
     response.voteCount += 1
+    room._standings.apply(room.currentRoundData._tally.vote_added(voter_id, response))
     
     # Check if all players have voted (all except target player)
-    expected_voters = [p.id for p in room.players if p.id != room.currentRoundData.targetPlayerId]
-    voted_ids = {v.voterId for v in room.currentRoundData.votes}
-    
-    return len(expected_voters) == len(voted_ids) and all(
-        vid in voted_ids for vid in expected_voters
-    )
+    return check_all_votes_submitted(room)
+
+
+def process_audience_vote(room: Room, seat: int, response_id: str) -> bool:
+    """
+    Counts a spectator's vote, by their audience seat. O(1): it only touches the
+    round's AudienceBallot, not the room, so nothing is sent per vote.
+    Returns False if the vote isn't accepted.
+    """
+    round_data = room.currentRoundData
+    if not round_data or round_data.state != "voting":
+        return False
+
+    if round_data._audience is None:
+        round_data._audience = AudienceBallot(round_data._responses_by_id)
+    return round_data._audience.vote(seat, response_id)
+
+
+def audience_results(round_data: Round) -> dict:
+    """response_id -> audience votes, or {} if the audience didn't vote this round."""
+    if round_data._audience is None:
+        return {}
+    return round_data._audience.results(round_data._responses_by_id)
 
 
 def calculate_round_scores(round_data: Round, players: list) -> dict:
     """
-    Calculates scores for a completed round.
-    Returns:
-    {
-        player_id: {
-            'points_earned': int,
-            'reason': str
-        }
-    }
+    Closes a round's tally and returns {player_id: points_earned} for players.
+    The tally has been kept current vote by vote, so this only reads it; room
+    standings already include these points.
     """
-    scores = {p.id: {'points_earned': 0, 'reason': ''} for p in players}
-    
-    # Get real response
-    real_response = next((r for r in round_data.responses if r.isReal), None)
-    if not real_response:
-        return scores
-    
-    # Count correct guesses (votes for real response)
-    correct_guesses = [v for v in round_data.votes if v.responseId == real_response.id]
-    num_correct = len(correct_guesses)
-    num_wrong = len(round_data.votes) - num_correct
-    
-    # Real Impersonator scoring (per spec)
-    # +2 per correct guess, +1 per fooled guess (wrong guess)
-    real_impersonator_points = (num_correct * 2) + num_wrong
-    scores[round_data.realImpersonatorId]['points_earned'] = real_impersonator_points
-    scores[round_data.realImpersonatorId]['reason'] = f"Real response: {num_correct} correct guesses (+{num_correct * 2}), {num_wrong} fooled (+{num_wrong})"
-    
-    # Fake Responders scoring
-    # +1 per vote received
-    for response in round_data.responses:
-        if not response.isReal and response.playerId:
-            # Only score if playerId exists (defensive check)
-            if response.playerId in scores:
-                fake_points = response.voteCount
-                scores[response.playerId]['points_earned'] = fake_points
-                if fake_points > 0:
-                    scores[response.playerId]['reason'] = f"Fake response received {fake_points} vote(s)"
-                else:
-                    scores[response.playerId]['reason'] = "Fake response received 0 votes"
-    
-    # Guessers scoring
-    # +1 for correctly identifying real response
-    for vote in correct_guesses:
-        if vote.voterId != round_data.realImpersonatorId:  # Don't double-count
-            scores[vote.voterId]['points_earned'] += 1
-            if scores[vote.voterId]['reason']:
-                scores[vote.voterId]['reason'] += f", +1 for correct guess"
-            else:
-                scores[vote.voterId]['reason'] = "+1 for correct guess"
-    
+    tally = round_data._tally
+    scores = tally.scores(players)
+    tally.closed = True
     return scores
 
 
+def discard_unscored_round(room: Room) -> None:
+    """Takes the current round's provisional points back out of the standings if it was never scored (the host skipped ahead)."""
+    if room.currentRoundData:
+        room._standings.apply(room.currentRoundData._tally.discard())
+
+
 def check_round_completion(room: Room) -> bool:
     """
     Checks if round is complete (all responses submitted and all votes cast).
@@ -420,16 +354,9 @@ def check_round_completion(room: Room) -> bool:
     if not room.currentRoundData:
         return False
     
-    # Check responses
-    expected_responders = [p.id for p in room.players if p.id != room.currentRoundData.targetPlayerId]
-    # Responses have playerId set (not None) when stored
-    submitted_ids = {r.playerId for r in room.currentRoundData.responses if r.playerId is not None}
-    all_responses_submitted = len(expected_responders) == len(submitted_ids)
-    
-    # Check votes
-    expected_voters = [p.id for p in room.players if p.id != room.currentRoundData.targetPlayerId]
-    voted_ids = {v.voterId for v in room.currentRoundData.votes}
-    all_voted = len(expected_voters) == len(voted_ids)
+    expected = expected_participants(room)
+    all_responses_submitted = len(room.currentRoundData._responders) >= expected
+    all_voted = len(room.currentRoundData._voters) >= expected
     
     return all_responses_submitted and all_voted
 
@@ -445,13 +372,14 @@ def validate_state_transition(current_state: str, new_state: str) -> bool:
     """
     Validates legal state transitions.
     """
+    # roundSetup/finished from mid-round: the host skipped ahead with next_round
     valid_transitions = {
         "lobby": ["roundSetup"],
         "roundSetup": ["prompt"],
-        "prompt": ["responding"],
-        "responding": ["voting"],
-        "voting": ["reveal"],
-        "reveal": ["scoring"],
+        "prompt": ["responding", "roundSetup", "finished"],
+        "responding": ["voting", "roundSetup", "finished"],
+        "voting": ["reveal", "roundSetup", "finished"],
+        "reveal": ["scoring", "roundSetup", "finished"],
         "scoring": ["roundSetup", "finished"],
         "finished": []
     }
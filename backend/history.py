@@ -0,0 +1,117 @@
+"""
+Compact history of finished rounds.
+- A finished Round becomes a RoundRecord: __slots__ only, player ids interned to
+  small ints per room, response authors and vote tallies kept in arrays
+- Each room keeps its newest ROUND_RETENTION records in memory. Every record is
+  also written to the round archive (the room store) when one is configured, so
+  older rounds are read back from disk on request instead of staying resident.
+  Without a room store the retention is None and a room keeps all its rounds
+- Records expand back to the Round wire shape only when someone asks for them
+"""
+from array import array
+from collections import deque
+import sys
+
+from constants import ROUND_RETENTION
+
+
+class PlayerIds:
+    """Interns one room's player id strings to small ints."""
+    __slots__ = ("ids", "index")
+
+    def __init__(self):
+        self.ids = []
+        self.index = {}
+
+    def intern(self, player_id) -> int:
+        if player_id is None:
+            return -1
+        n = self.index.get(player_id)
+        if n is None:
+            n = self.index[player_id] = len(self.ids)
+            self.ids.append(player_id)
+        return n
+
+    def lookup(self, n: int):
+        return self.ids[n] if n >= 0 else None
+
+
+class RoundRecord:
+    __slots__ = (
+        "round_id", "round_number", "prompt", "target", "sender", "impersonator",
+        "response_ids", "response_texts", "authors", "real", "tallies", "voters", "choices",
+    )
+
+    @classmethod
+    def from_round(cls, round_data, players: PlayerIds) -> "RoundRecord":
+        record = cls()
+        record.round_id = round_data.id
+        record.round_number = round_data.roundNumber
+        record.prompt = sys.intern(round_data.prompt)  # prompts repeat across rooms
+        record.target = players.intern(round_data.targetPlayerId)
+        record.sender = players.intern(round_data.promptSenderId)
+        record.impersonator = players.intern(round_data.realImpersonatorId)
+
+        responses = round_data.responses
+        position = {r.id: i for i, r in enumerate(responses)}
+        record.response_ids = tuple(r.id for r in responses)
+        record.response_texts = tuple(r.text for r in responses)
+        record.authors = array("i", (players.intern(r.playerId) for r in responses))
+        record.real = next((i for i, r in enumerate(responses) if r.isReal), -1)
+        record.tallies = array("H", (r.voteCount for r in responses))
+
+        votes = [v for v in round_data.votes if v.responseId in position]
+        record.voters = array("i", (players.intern(v.voterId) for v in votes))
+        record.choices = array("H", (position[v.responseId] for v in votes))
+        return record
+
+    def to_dict(self, players: PlayerIds) -> dict:
+        """The record in the same shape as a Round on the wire."""
+        return {
+            "id": self.round_id,
+            "roundNumber": self.round_number,
+            "prompt": self.prompt,
+            "targetPlayerId": players.lookup(self.target),
+            "promptSenderId": players.lookup(self.sender),
+            "realImpersonatorId": players.lookup(self.impersonator),
+            "responses": [
+                {
+                    "id": response_id,
+                    "playerId": players.lookup(self.authors[i]),
+                    "text": self.response_texts[i],
+                    "isReal": i == self.real,
+                    "voteCount": self.tallies[i],
+                }
+                for i, response_id in enumerate(self.response_ids)
+            ],
+            "votes": [
+                {"voterId": players.lookup(voter), "responseId": self.response_ids[choice]}
+                for voter, choice in zip(self.voters, self.choices)
+            ],
+            "state": "scoring",
+        }
+
+
+class RoundHistory:
+    """A room's finished rounds: the newest few in memory, the rest in the round archive (all in memory if retention is None)."""
+    __slots__ = ("players", "recent")
+
+    def __init__(self, retention: int = ROUND_RETENTION):
+        self.players = PlayerIds()
+        self.recent = deque(maxlen=retention)  # RoundRecord, oldest first
+
+    def add(self, round_data) -> dict:
+        """Archives a finished round. Returns its expanded form for the round archive."""
+        record = RoundRecord.from_round(round_data, self.players)
+        self.recent.append(record)
+        return record.to_dict(self.players)
+
+    def page(self, before, limit: int) -> list:
+        """Resident rounds numbered below before (all if None), newest first."""
+        rounds = []
+        for record in reversed(self.recent):
+            if len(rounds) >= limit:
+                break
+            if before is None or record.round_number < before:
+                rounds.append(record.to_dict(self.players))
+        return rounds
@@ -0,0 +1,86 @@
+"""
+Structured, leveled logging.
+- Records carry an event name plus key=value fields (room_id, player_id, latency_ms, ...)
+- Disabled levels cost one isEnabledFor check; nothing is formatted on the event loop
+- Records are handed to a queue and written by a background thread, so a slow
+  stderr never blocks the loop
+- Noisy events can be sampled via LOG_SAMPLE_RATES
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import random
+
+from constants import LOG_LEVEL, LOG_SAMPLE_RATES
+
+_listener = None
+
+
+class StructuredLogger:
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(f"who_texted.{name}")
+
+    def debug(self, event: str, /, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, /, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, /, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, /, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def enabled(self, level: int) -> bool:
+        return self._logger.isEnabledFor(level)
+
+    def _log(self, level: int, event: str, fields: dict):
+        if not self._logger.isEnabledFor(level):
+            return
+        rate = LOG_SAMPLE_RATES.get(event)
+        if rate is not None and random.random() >= rate:
+            return
+        self._logger.log(level, event, extra={"fields": fields})
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formats records as `time level logger event key=value ...`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    # The stock QueueHandler formats in the caller's thread; leave that to the listener
+    def prepare(self, record):
+        return record
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(name)
+
+
+def configure_logging(level: str = LOG_LEVEL):
+    """Routes who_texted.* records through a queue to a stderr writer thread. Safe to call twice."""
+    global _listener
+    root = logging.getLogger("who_texted")
+    root.setLevel(level)
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler()
+    stream.setFormatter(StructuredFormatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+
+    records = queue.SimpleQueue()
+    root.addHandler(_DeferredQueueHandler(records))
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(records, stream)
+    _listener.start()
+    atexit.register(_listener.stop)
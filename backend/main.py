@@ -1,16 +1,77 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
 import uuid
 import random
 import json
 
 from websocket import handle_websocket
+from scheduler import PhaseScheduler
+from registry import Registry
+from logger import configure_logging
+from cluster import node_from_env
+from persistence import SQLiteRoomStore
+from sockets import restore_room
+from reaper import RoomReaper
+from prompts import catalog
+from metrics import LoopLagProbe, collect, registry_families, render
+from matchmaking import Matchmaker
+from heartbeat import Heartbeat
+from constants import ROOM_STORE_PATH, ARCHIVE_EVICTED_ROOMS
 
-app = FastAPI()
+configure_logging()
 
-rooms = {}
-connections = {}
+registry = Registry() # live rooms, connections and their lookup indexes
+scheduler = PhaseScheduler() # shared phase timers for every room
+node = node_from_env() # None unless running as one shard of several workers
+
+store = None # room snapshots for warm restarts; each shard keeps its own file
+if ROOM_STORE_PATH:
+    store = SQLiteRoomStore(ROOM_STORE_PATH if node is None else f"{ROOM_STORE_PATH}.{node.worker_id}")
+
+reaper = RoomReaper(registry, scheduler, archive=store if ARCHIVE_EVICTED_ROOMS else None) # idle and over-budget rooms
+registry.matchmaker = Matchmaker(registry, scheduler) # quick-play queue
+registry.heartbeat = Heartbeat(registry, scheduler, node) # pings and drops half-open sockets
+probe = LoopLagProbe() # event-loop lag samples for /metrics
+collect(lambda: registry_families(registry, scheduler, reaper))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if store is not None:
+        if not registry.sessions.secret_configured:
+            registry.sessions.secret = await store.resume_secret() # restored players' tokens must still verify
+        for room in await store.load():
+            restore_room(registry, scheduler, room)
+        registry.observers.append(store)
+        registry.round_archive = store
+        await store.start()
+    if node is not None:
+        await node.start(registry, scheduler)
+    reaper.start()
+    registry.heartbeat.start()
+    probe.start()
+    asyncio.get_running_loop().run_in_executor(None, catalog().warm) # index prompt packs off the loop
+    yield
+    await probe.stop()
+    registry.heartbeat.stop()
+    reaper.stop()
+    if node is not None:
+        await node.stop()
+    if store is not None:
+        await store.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 ### WEBSOCKET ENDPOINT ###
 @app.websocket("/ws")
 async def websocket_endpoint(ws: WebSocket):
-    await handle_websocket(ws=ws, rooms=rooms, connections=connections)
\ No newline at end of file
+    await handle_websocket(ws=ws, registry=registry, scheduler=scheduler, node=node)
+
+@app.get("/stats/rooms")
+async def room_stats():
+    return {**reaper.counters(), "codes": registry.codes.stats()}
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,171 @@
+"""
+Quick play: players ask for a game instead of passing a room code around.
+- Waiting players are kept in a FIFO deque, plus a dict by player id. Joining,
+  cancelling (lazily: the ticket is marked and skipped when it reaches the
+  front) and taking the next player are all O(1)
+- A matching pass runs every MATCH_TICK on the shared PhaseScheduler while
+  anyone is waiting. It fills rooms of MATCH_ROOM_SIZE in arrival order, and
+  once the oldest player has waited MATCH_MAX_WAIT it settles for a smaller room
+  of at least MATCH_MIN_PLAYERS
+- A pass forms at most MATCH_ROOMS_PER_PASS rooms (tens of milliseconds of
+  work); with more full rooms waiting the next pass is due straight away, so a
+  burst drains at full speed without holding up everyone else's events
+- Matched rooms are built with the same helpers as create_room/join_room and
+  started through handle_start_game in the room's actor, as if the first
+  player (the host) had pressed start
+"""
+from collections import deque
+import time
+
+from models import RoomJoinedResponse, QuickPlayQueuedResponse, StartGameRequest
+from broadcaster import send, send_error, envelope
+from helpers import initialize_new_room, join_room
+from sockets import handle_start_game, leave_audience_and_queue
+from constants import MATCH_ROOM_SIZE, MATCH_MIN_PLAYERS, MATCH_MAX_WAIT, MATCH_TICK, MATCH_ROOMS_PER_PASS
+from logger import get_logger
+from metrics import MATCH_WAIT_SECONDS
+
+log = get_logger("matchmaking")
+
+MATCH_KEY = ("matchmaking",)  # scheduler key of the matching pass
+
+
+class Ticket:
+    __slots__ = ("conn", "username", "queued_at", "cancelled")
+
+    def __init__(self, conn, username: str, queued_at: float):
+        self.conn = conn
+        self.username = username
+        self.queued_at = queued_at
+        self.cancelled = False
+
+
+class Matchmaker:
+    def __init__(
+        self,
+        registry,
+        scheduler,
+        room_size: int = MATCH_ROOM_SIZE,
+        min_players: int = MATCH_MIN_PLAYERS,
+        max_wait: float = MATCH_MAX_WAIT,
+        tick: float = MATCH_TICK,
+    ):
+        self.registry = registry
+        self.scheduler = scheduler
+        self.room_size = room_size
+        self.min_players = min_players
+        self.max_wait = max_wait
+        self.tick = tick
+        self._queue = deque()  # Tickets in arrival order; cancelled ones are skipped
+        self._tickets = {}  # player_id -> live Ticket
+        self._cancelled = 0  # cancelled tickets still sitting in the queue
+        self.matched = 0  # players placed since start
+
+    def __len__(self):
+        return len(self._tickets)
+
+    def __contains__(self, player_id: str):
+        return player_id in self._tickets
+
+    def enqueue(self, conn, username: str) -> int:
+        """Queues a player. Returns how many are waiting, them included."""
+        ticket = Ticket(conn, username, time.monotonic())
+        self._tickets[conn.player_id] = ticket
+        self._queue.append(ticket)
+        if not self.scheduler.pending(MATCH_KEY):
+            self.scheduler.schedule(MATCH_KEY, self.tick, self.match)
+        return len(self._tickets)
+
+    def cancel(self, player_id: str) -> bool:
+        ticket = self._tickets.pop(player_id, None)
+        if ticket is None:
+            return False
+        ticket.cancelled = True
+        self._cancelled += 1
+        if self._cancelled > 1024 and self._cancelled > len(self._tickets):
+            # Mostly dead tickets: rebuild instead of letting the queue grow
+            self._queue = deque(ticket for ticket in self._queue if not ticket.cancelled)
+            self._cancelled = 0
+        return True
+
+    def oldest_wait(self, now: float) -> float:
+        self._skip_cancelled()
+        return now - self._queue[0].queued_at if self._queue else 0.0
+
+    # --- Matching ---
+
+    def match(self):
+        """One matching pass; re-arms itself while anyone is still waiting."""
+        now = time.monotonic()
+        rooms = 0
+        while len(self._tickets) >= self.room_size and rooms < MATCH_ROOMS_PER_PASS:
+            self._form(self._take(self.room_size), now)
+            rooms += 1
+        if (
+            rooms < MATCH_ROOMS_PER_PASS
+            and len(self._tickets) >= self.min_players
+            and self.oldest_wait(now) >= self.max_wait
+        ):
+            self._form(self._take(len(self._tickets)), now)
+
+        if len(self._tickets) >= self.room_size:
+            self.scheduler.schedule(MATCH_KEY, 0, self.match)  # backlog: next pass as soon as the loop is free
+        elif self._tickets:
+            self.scheduler.schedule(MATCH_KEY, self.tick, self.match)
+        else:
+            self._queue.clear()  # only cancelled tickets left
+            self._cancelled = 0
+
+    def _skip_cancelled(self):
+        while self._queue and self._queue[0].cancelled:
+            self._queue.popleft()
+            self._cancelled -= 1
+
+    def _take(self, count: int) -> list:
+        tickets = []
+        while len(tickets) < count:
+            self._skip_cancelled()
+            ticket = self._queue.popleft()
+            del self._tickets[ticket.conn.player_id]
+            tickets.append(ticket)
+        return tickets
+
+    def _form(self, tickets: list, now: float):
+        registry = self.registry
+        host = tickets[0]
+        room_id, _ = initialize_new_room(registry, host.conn.player_id, host.username)
+        for ticket in tickets[1:]:
+            join_room(registry, ticket.conn.player_id, ticket.username, room_id)
+        room = registry.rooms[room_id]
+
+        for ticket, player in zip(tickets, room.players):
+            MATCH_WAIT_SECONDS.observe(now - ticket.queued_at)
+            send(ticket.conn, envelope(RoomJoinedResponse(
+                playerId=player.id,
+                roomId=room_id,
+                displayName=player.displayName,
+                isHost=player.isHost,
+                room=room,
+                resumeToken=registry.sessions.issue(room_id, player.id)
+            )))
+        self.matched += len(tickets)
+        log.info("quick_play_matched", room_id=room_id, players=len(tickets), waited_s=round(now - host.queued_at, 3))
+
+        registry.actors.post(
+            room_id, "start_game", handle_start_game,
+            host.conn, registry, self.scheduler, StartGameRequest(roomId=room_id), host.conn.player_id
+        )
+
+
+async def handle_quick_play(conn, registry, scheduler, request, player_id):
+    """Puts the player in the quick-play queue; room_joined follows once they are matched."""
+    if registry.matchmaker is None:
+        send_error(conn, "Quick play is not available", request.type)
+        return
+    if registry.room_of(player_id) is not None or player_id in registry.matchmaker:
+        send_error(conn, "Already in a room or queued", request.type)
+        return
+
+    leave_audience_and_queue(registry, player_id)
+    waiting = registry.matchmaker.enqueue(conn, request.username)
+    send(conn, QuickPlayQueuedResponse(waiting=waiting).model_dump())
@@ -0,0 +1,253 @@
+"""
+Process metrics in the Prometheus text format, served at GET /metrics.
+- Counters and histograms are plain Python objects updated on the event loop:
+  no locks, and a histogram's buckets are allocated once per label value, so an
+  observation is a bisect plus two additions
+- Histograms count per bucket and only add them up at scrape time
+- Gauges that describe current state (rooms by state, connections, queue depth)
+  are not kept up to date at all; collectors registered with collect() read
+  them from the registry when scraped
+- LoopLagProbe samples event-loop lag: how late a sleep wakes up
+"""
+import asyncio
+from bisect import bisect_left
+from collections import Counter as Counter_
+import time
+
+from constants import LOOP_LAG_INTERVAL
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+FANOUT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+WAIT_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60)
+
+_metrics = []  # every Counter and Histogram, in registration order
+_collectors = []  # functions run at scrape time; see collect()
+_probe = None  # the running LoopLagProbe
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}  # label values -> count
+        _metrics.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple = LATENCY_BUCKETS, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self._children = {}  # label values -> _HistogramChild
+        _metrics.append(self)
+
+    def labels(self, *values) -> _HistogramChild:
+        """The series for these label values; callers on hot paths can keep it."""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _HistogramChild(self.buckets)
+        return child
+
+    def observe(self, value: float, *labels):
+        self.labels(*labels).observe(value)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(child.sum)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+def collect(collector):
+    """
+    Registers a function run at scrape time. It returns a list of
+    (name, type, help, labelnames, [(label values, value)]) families.
+    """
+    _collectors.append(collector)
+    return collector
+
+
+def render() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        for name, kind, help, labelnames, samples in collector():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labelnames, labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# --- The backend's own metrics ---
+
+HANDLER_SECONDS = Histogram(
+    "who_texted_handler_seconds", "Time from reading a request to having handled it, mailbox wait included, by event type", labelnames=("event",)
+)
+SERIALIZE_SECONDS = Histogram(
+    "who_texted_serialize_seconds", "Time to encode one outbound frame, by wire format", labelnames=("format",)
+)
+BROADCAST_SECONDS = Histogram(
+    "who_texted_broadcast_seconds", "Time to encode and queue one broadcast for a room"
+)
+BROADCAST_FANOUT = Histogram(
+    "who_texted_broadcast_fanout", "Connections a broadcast was queued for", buckets=FANOUT_BUCKETS
+)
+LOOP_LAG_SECONDS = Histogram(
+    "who_texted_event_loop_lag_seconds", "How late the event loop ran a sampling probe"
+)
+DROPPED_FRAMES = Counter(
+    "who_texted_outbound_dropped_total", "Outbound frames dropped because a connection's queue was full"
+)
+COALESCED_FRAMES = Counter(
+    "who_texted_room_updates_coalesced_total", "room_update broadcasts skipped for a later one in the same room batch"
+)
+ROOM_BATCH_EVENTS = Histogram(
+    "who_texted_room_batch_events", "Events a room actor applied in one batch", buckets=FANOUT_BUCKETS[1:]
+)
+SPECTATOR_SKIPPED = Counter(
+    "who_texted_spectator_updates_skipped_total", "Spectator updates skipped because the spectator was backed up"
+)
+AUDIENCE_VOTES = Counter(
+    "who_texted_audience_votes_total", "Spectator votes counted"
+)
+MATCH_WAIT_SECONDS = Histogram(
+    "who_texted_quick_play_wait_seconds", "Time from quick_play to being placed in a room", buckets=WAIT_BUCKETS
+)
+HEARTBEAT_TIMEOUTS = Counter(
+    "who_texted_heartbeat_timeouts_total", "Connections dropped for not answering pings"
+)
+RATE_LIMITED = Counter(
+    "who_texted_rate_limited_total", "Inbound frames dropped for exceeding a rate limit, by event type", labelnames=("event",)
+)
+
+
+def _probe_last() -> float:
+    return _probe.last if _probe is not None else 0.0
+
+
+def registry_families(registry, scheduler=None, reaper=None) -> list:
+    """Current-state gauges read from the registry at scrape time: one pass over rooms and connections."""
+    rooms, rounds = Counter_(), Counter_()
+    for room in registry.rooms.values():
+        rooms[room.state] += 1
+        if room.currentRoundData is not None:
+            rounds[room.currentRoundData.state] += 1
+
+    local = remote = queued = deepest = 0
+    for conn in registry.connections.values():
+        queue = getattr(conn, "queue", None)
+        if queue is None:
+            remote += 1  # a player on another worker's socket
+            continue
+        local += 1
+        depth = queue.qsize()
+        queued += depth
+        deepest = max(deepest, depth)
+
+    families = [
+        ("who_texted_rooms", "gauge", "Live rooms by state", ("state",), [((state,), n) for state, n in rooms.items()]),
+        ("who_texted_rounds", "gauge", "Rounds in progress by phase", ("phase",), [((phase,), n) for phase, n in rounds.items()]),
+        ("who_texted_connections", "gauge", "Connections by where the socket is held", ("kind",), [(("local",), local), (("remote",), remote)]),
+        ("who_texted_spectators", "gauge", "Connections watching a room", (), [((), len(registry.spectators))]),
+        ("who_texted_suspended_sessions", "gauge", "Players waiting to resume", (), [((), len(registry.sessions))]),
+        ("who_texted_outbound_queue_frames", "gauge", "Frames waiting in outbound queues, all connections", (), [((), queued)]),
+        ("who_texted_outbound_queue_max", "gauge", "Deepest outbound queue of any connection", (), [((), deepest)]),
+        ("who_texted_room_actors", "gauge", "Room actors with events queued or running", (), [((), len(registry.actors))]),
+        ("who_texted_room_mailbox_events", "gauge", "Events waiting in room actor mailboxes", (), [((), registry.actors.queued())]),
+        ("who_texted_event_loop_lag_last_seconds", "gauge", "Most recent event-loop lag sample", (), [((), _probe_last())]),
+    ]
+    if registry.matchmaker is not None:
+        families.append(("who_texted_quick_play_waiting", "gauge", "Players waiting for quick play", (), [((), len(registry.matchmaker))]))
+        families.append(("who_texted_quick_play_oldest_wait_seconds", "gauge", "How long the longest-waiting quick-play player has waited", (), [((), registry.matchmaker.oldest_wait(time.monotonic()))]))
+    if registry.heartbeat is not None:
+        families.append(("who_texted_heartbeat_connections", "gauge", "Connections the heartbeat is watching", (), [((), len(registry.heartbeat))]))
+    if scheduler is not None:
+        families.append(("who_texted_timers", "gauge", "Pending phase, grace and housekeeping timers", (), [((), len(scheduler))]))
+    if reaper is not None:
+        counters = reaper.counters()
+        families.append(("who_texted_resident_room_bytes", "gauge", "Serialized size of resident rooms at the last sweep", (), [((), counters["resident_bytes"])]))
+        families.append(("who_texted_rooms_evicted_total", "counter", "Rooms evicted by the reaper, by reason", ("reason",), [((reason,), n) for reason, n in counters["evicted"].items()]))
+    families.append((
+        "who_texted_room_codes_in_use", "gauge", "Room codes held, by code length", ("length",),
+        [((tier["length"],), tier["in_use"]) for tier in registry.codes.stats()]
+    ))
+    return families
+
+
+class LoopLagProbe:
+    """Sleeps interval seconds at a time and records how much longer each sleep took."""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.last = 0.0  # most recent lag, in seconds
+        self._task = None
+
+    def start(self):
+        global _probe
+        _probe = self
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.last = max(0.0, time.perf_counter() - started - self.interval)
+            LOOP_LAG_SECONDS.observe(self.last)
@@ -1,28 +1,184 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, PrivateAttr
+import json
+import msgpack
+from typing import List, Literal, Optional
 import uuid
 
+from statesync import RoomStateSync
+from history import RoundHistory
+from tally import RoundTally, Standings, AudienceBallot
+import wire
+
 # --- Core Models ---
 
-class Player(BaseModel):
+class TrackedModel(BaseModel):
+    """
+    Base for the core game models.
+    - Assigning a field bumps the model's _version and that of every owner above it
+      (Response -> Round -> Room), so a Room's version changes whenever anything in it does
+    - dump() is model_dump() cached per version; unchanged children reuse their cached dicts
+    - dump_tagged() is the same with wire.FIELD_TAGS keys, cached the same way, for
+      the MessagePack wire format; dump_json() and dump_packed() cache the encodings
+    - List fields are not watched: add items with append() so they are adopted and counted
+    - The root model's _observer, if set, is called with it after every change
+    Cached dumps are shared, so callers must not mutate them.
+    """
+    _version: int = PrivateAttr(default=0)
+    _parent: Optional["TrackedModel"] = PrivateAttr(default=None)
+    _dumped: Optional[dict] = PrivateAttr(default=None)
+    _dumped_version: int = PrivateAttr(default=-1)
+    _json: Optional[str] = PrivateAttr(default=None)
+    _json_version: int = PrivateAttr(default=-1)
+    _tagged: Optional[dict] = PrivateAttr(default=None)
+    _tagged_version: int = PrivateAttr(default=-1)
+    _packed: Optional[bytes] = PrivateAttr(default=None)
+    _packed_version: int = PrivateAttr(default=-1)
+    _observer: Optional[object] = PrivateAttr(default=None)
+
+    def model_post_init(self, __context):
+        for name in type(self).model_fields:
+            self._adopt(getattr(self, name))
+
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs):
+        # pydantic sets up private attributes one at a time, copying each default,
+        # which is most of a model's construction cost. Every default here is
+        # immutable (mutable ones use default_factory), so copying one prebuilt dict
+        # gives the same result. This and the private-attribute fast paths below
+        # lean on pydantic internals (__pydantic_private__, the __wrapped__
+        # model_post_init), which is why requirements.txt pins pydantic
+        super().__pydantic_init_subclass__(**kwargs)
+        defaults, factories = {}, []
+        for name, attr in cls.__private_attributes__.items():
+            if attr.default_factory is not None:
+                factories.append((name, attr.default_factory))
+            else:
+                defaults[name] = attr.default
+        post_init = getattr(cls.model_post_init, "__wrapped__", cls.model_post_init)
+
+        def model_post_init(self, context):
+            if self.__pydantic_private__ is None:
+                private = defaults.copy()
+                for name, factory in factories:
+                    private[name] = factory()
+                object.__setattr__(self, "__pydantic_private__", private)
+            post_init(self, context)
+
+        cls.model_post_init = model_post_init
+
+    def __getattr__(self, name):
+        # Private attributes come straight from their dict: pydantic's own lookup
+        # first probes each one for a descriptor, which is most of a read's cost
+        try:
+            return self.__pydantic_private__[name]
+        except (KeyError, TypeError):
+            return super().__getattr__(name)
+
+    def __setattr__(self, name, value):
+        if name in self.__private_attributes__:
+            self.__pydantic_private__[name] = value
+            return
+        super().__setattr__(name, value)
+        if not name.startswith("_"):
+            self._adopt(value)
+            self.touch()
+
+    def _adopt(self, value):
+        if isinstance(value, TrackedModel):
+            value._parent = self
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, TrackedModel):
+                    item._parent = self
+
+    def touch(self):
+        """Marks this model and its owners as changed."""
+        model, private = self, self.__pydantic_private__
+        while True:
+            private["_version"] += 1
+            if private["_parent"] is None:
+                break
+            model = private["_parent"]
+            private = model.__pydantic_private__
+        if private["_observer"] is not None:
+            private["_observer"](model)
+
+    def append(self, field: str, item):
+        """Appends to a list field, adopting the item and marking the change."""
+        getattr(self, field).append(item)
+        self._adopt(item)
+        self.touch()
+
+    def dump(self) -> dict:
+        if self._dumped_version != self._version:
+            self._dumped = {
+                name: _dump_value(getattr(self, name))
+                for name in type(self).model_fields
+            }
+            self._dumped_version = self._version
+        return self._dumped
+
+    def dump_json(self) -> str:
+        """dump() encoded compactly, cached per version."""
+        if self._json_version != self._version:
+            self._json = json.dumps(self.dump(), separators=(",", ":"), ensure_ascii=False)
+            self._json_version = self._version
+        return self._json
+
+    def dump_tagged(self) -> dict:
+        if self._tagged_version != self._version:
+            self._tagged = {
+                wire.tag_key(name): _tag_value(getattr(self, name))
+                for name in type(self).model_fields
+            }
+            self._tagged_version = self._version
+        return self._tagged
+
+    def dump_packed(self) -> bytes:
+        """dump_tagged() encoded as MessagePack, cached per version."""
+        if self._packed_version != self._version:
+            self._packed = msgpack.packb(self.dump_tagged())
+            self._packed_version = self._version
+        return self._packed
+
+
+def _dump_value(value):
+    if isinstance(value, TrackedModel):
+        return value.dump()
+    if isinstance(value, list):
+        return [_dump_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _dump_value(item) for key, item in value.items()}
+    return value
+
+
+def _tag_value(value):
+    if isinstance(value, TrackedModel):
+        return value.dump_tagged()
+    if isinstance(value, list):
+        return [_tag_value(item) for item in value]
+    return wire.tag(value)
+
+
+class Player(TrackedModel):
     id: str
     username: str
     displayName: Optional[str]
     isHost: bool
     points: int
 
-class Response(BaseModel):
+class Response(TrackedModel):
     id: str
     playerId: Optional[str] = None  # Stored internally, hidden in VotingPhaseResponse, revealed in RevealPhaseResponse
     text: str
     isReal: bool  # True if from real impersonator
     voteCount: int = 0  # Votes received
 
-class Vote(BaseModel):
+class Vote(TrackedModel):
     voterId: str
     responseId: str  # Which response they voted for
 
-class Round(BaseModel):
+class Round(TrackedModel):
     id: str
     roundNumber: int
     prompt: str
@@ -33,7 +189,24 @@ class Round(BaseModel):
     votes: List[Vote] = []
     state: str = "prompt"  # prompt, responding, voting, reveal, scoring
 
-class Room(BaseModel):
+    # Lookup indexes, never serialized; kept in sync by helpers.process_response/process_vote
+    _responses_by_id: dict = PrivateAttr(default_factory=dict)  # response_id -> Response
+    _responders: dict = PrivateAttr(default_factory=dict)  # player_id -> Response
+    _voters: dict = PrivateAttr(default_factory=dict)  # voter_id -> Vote
+    _tally: Optional[RoundTally] = PrivateAttr(default=None)  # running score of the round
+    _audience: Optional[AudienceBallot] = PrivateAttr(default=None)  # spectators' votes, once the first is cast
+
+    def model_post_init(self, __context):
+        super().model_post_init(__context)
+        for response in self.responses:
+            self._responses_by_id[response.id] = response
+            if response.playerId is not None:
+                self._responders[response.playerId] = response
+        for vote in self.votes:
+            self._voters[vote.voterId] = vote
+        self._tally = RoundTally.from_round(self)
+
+class Room(TrackedModel):
     id: str
     hostId: str
     players: List[Player]
@@ -42,7 +215,24 @@ class Room(BaseModel):
     maxRounds: int = 5
     currentPrompt: Optional[str] = None
     currentRoundData: Optional[Round] = None
-    rounds: List[Round] = []
+    rounds: List[Round] = []  # Always empty; kept for clients that decode it. History lives in _history
+    promptTags: Optional[List[str]] = None  # Prompt packs to draw from; None for all
+
+    _sync: RoomStateSync = PrivateAttr(default_factory=RoomStateSync)  # revision tracking, never serialized
+    _members: dict = PrivateAttr(default_factory=dict)  # player_id -> Player, kept in sync by Registry
+    _standings: Optional[Standings] = PrivateAttr(default=None)  # leaderboard on live totals, kept in sync by Registry and helpers
+    _history: RoundHistory = PrivateAttr(default_factory=RoundHistory)  # finished rounds, compacted
+    _prompts: Optional[object] = PrivateAttr(default=None)  # PromptSampler, created with the first round
+
+    def model_post_init(self, __context):
+        super().model_post_init(__context)
+        self._members = {p.id: p for p in self.players}
+        self._standings = Standings.from_room(self)
+        if self.rounds:
+            # Snapshots from before rounds were compacted
+            for round_data in self.rounds:
+                self._history.add(round_data)
+            self.rounds = []
 
 
 # --- Incoming WebSocket messages (client → server) ---
@@ -51,39 +241,87 @@ class BaseWSMessage(BaseModel):
     type: str
 
 class CreateRoomRequest(BaseWSMessage):
+    type: Literal["create_room"] = "create_room"
     username: str
+    promptTags: Optional[List[str]] = None  # Draw prompts only from packs with these tags
 
 class JoinRoomRequest(BaseWSMessage):
+    type: Literal["join_room"] = "join_room"
     roomId: str
     username: str
 
 class SendMessageRequest(BaseWSMessage):
+    type: Literal["send_message"] = "send_message"
     roomId: str
     text: str
 
 class LeaveRoomRequest(BaseWSMessage):
+    type: Literal["leave_room"] = "leave_room"
     roomId: str
 
 class StartGameRequest(BaseWSMessage):
+    type: Literal["start_game"] = "start_game"
     roomId: str
 
 class SubmitResponseRequest(BaseWSMessage):
-    type: str = "submit_response"
+    type: Literal["submit_response"] = "submit_response"
     roomId: str
     text: str
 
 class SubmitVoteRequest(BaseWSMessage):
-    type: str = "submit_vote"
+    type: Literal["submit_vote"] = "submit_vote"
     roomId: str
     responseId: str
 
 class NextRoundRequest(BaseWSMessage):
-    type: str = "next_round"
+    type: Literal["next_round"] = "next_round"
+    roomId: str
+
+class SyncSubscribeRequest(BaseWSMessage):
+    type: Literal["sync_subscribe"] = "sync_subscribe"
+    roomId: str
+    revision: Optional[int] = None  # Last revision the client holds; omit to resync from a snapshot
+
+class SyncAckRequest(BaseWSMessage):
+    type: Literal["sync_ack"] = "sync_ack"
     roomId: str
+    revision: int
+
+class WatchRoomRequest(BaseWSMessage):
+    type: Literal["watch_room"] = "watch_room"
+    roomId: str
+
+class QuickPlayRequest(BaseWSMessage):
+    type: Literal["quick_play"] = "quick_play"
+    username: str
+
+class PongRequest(BaseWSMessage):
+    type: Literal["pong"] = "pong"  # Reply to ping; any frame counts as a sign of life
+
+class AudienceVoteRequest(BaseWSMessage):
+    type: Literal["audience_vote"] = "audience_vote"
+    roomId: str
+    responseId: str
+
+class RoundHistoryRequest(BaseWSMessage):
+    type: Literal["get_round_history"] = "get_round_history"
+    roomId: str
+    before: Optional[int] = None  # Only rounds numbered below this; omit for the newest
+    limit: int = 10
 
 
 # --- Outgoing WebSocket messages (server → client) ---
 
+class ErrorResponse(BaseModel):
+    type: str = "error"
+    message: str
+    requestType: Optional[str] = None  # The offending request's type, if it could be read
+
+class RedirectResponse(BaseModel):
+    type: str = "redirect"
+    roomId: str
+    url: str  # Reconnect here and send join_room again
+
 class RoomJoinedResponse(BaseModel):
     type: str = "room_joined"
     playerId: str
@@ -91,17 +329,45 @@ class RoomJoinedResponse(BaseModel):
     displayName: str
     isHost: bool
     room: Room
+    resumeToken: Optional[str] = None  # reconnect with ?resume=<token> to keep this seat
+
+class SessionResumedResponse(BaseModel):
+    type: str = "session_resumed"
+    playerId: str
+    roomId: str
+    resumeToken: str
+    replayed: int  # number of missed frames that follow this one
 
 class RoomUpdateResponse(BaseModel):
     type: str = "room_update"
     room: Room
 
+class PingResponse(BaseModel):
+    type: str = "ping"  # Answer with pong when nothing else is being sent
+
+class QuickPlayQueuedResponse(BaseModel):
+    type: str = "quick_play_queued"
+    waiting: int  # Players waiting for quick play, including this one; room_joined follows once matched
+
+class SpectatorUpdateResponse(BaseModel):
+    type: str = "spectator_update"
+    roomId: str
+    room: dict  # The room with the round's secrets blanked until the reveal
+    event: Optional[str] = None  # Type of the latest event since the previous update
+    spectators: int  # Size of the audience
+    audienceVotes: Optional[dict] = None  # response_id -> audience votes, from the first audience vote on
+    audienceVoters: int = 0
+
 class ChatMessageResponse(BaseModel):
     type: str = "chat_message"
     senderId: str
     senderDisplayName: str
     text: str
 
+class ChatBatchResponse(BaseModel):
+    type: str = "chat_batch"
+    messages: List[ChatMessageResponse]  # Chat sent within one coalescing tick, oldest first
+
 class GameStartedResponse(BaseModel):
     type: str = "game_start"
     room: Room
@@ -139,12 +405,14 @@ class RevealPhaseResponse(BaseModel):
     room: Room
     responses: List[Response]  # With playerId revealed
     votes: List[Vote]
+    audienceVotes: dict = {}  # response_id -> audience votes; empty if the audience didn't vote
 
 class ScoringPhaseResponse(BaseModel):
     type: str = "scoring_phase"
     room: Room
     scores: dict  # player_id -> points_earned
     roundSummary: dict
+    standings: List[dict] = []  # {playerId, points, rank}, highest first
 
 class RoundCompleteResponse(BaseModel):
     type: str = "round_complete"
@@ -154,4 +422,27 @@ class GameFinishedResponse(BaseModel):
     type: str = "game_finished"
     room: Room
     finalScores: dict  # player_id -> total_points
-    winner: Player
\ No newline at end of file
+    winner: Player
+
+
+# --- Room state sync envelopes (server → client, opt-in via sync_subscribe) ---
+
+class RoomSnapshotResponse(BaseModel):
+    type: str = "room_snapshot"
+    roomId: str
+    revision: int
+    room: dict
+    event: Optional[dict] = None  # The original event, minus its room field
+
+class RoundHistoryResponse(BaseModel):
+    type: str = "round_history"
+    roomId: str
+    rounds: List[dict]  # Finished rounds in Round's shape, newest first; empty when there are no more
+
+class RoomPatchResponse(BaseModel):
+    type: str = "room_patch"
+    roomId: str
+    baseRevision: int
+    revision: int
+    ops: List[dict]  # JSON patch operations taking baseRevision to revision
+    event: Optional[dict] = None
@@ -0,0 +1,266 @@
+"""
+Room persistence for warm restarts.
+- Changed rooms are collected on the event loop and written in one batch every
+  PERSIST_INTERVAL, so a burst of messages to a room costs one write
+- Each write appends the JSON-patch diff since the room's last write to an
+  append-only log; after SNAPSHOT_EVERY entries the room is compacted into a
+  fresh snapshot and its log is cleared, which bounds replay time on startup
+- Rooms the reaper evicts can be archived: their final state is kept in a
+  separate table that is never loaded back
+- Finished rounds are written to a rounds table and read back a page at a time
+  when a client asks for history older than what the room keeps in memory
+- The resume-token secret is generated once and kept in a settings table, so
+  players of restored rooms can still get back in
+- All SQLite work happens on a single background thread
+"""
+import asyncio
+import json
+import secrets
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from constants import PERSIST_INTERVAL, SNAPSHOT_EVERY
+from logger import get_logger
+from models import Room
+from statesync import diff, apply_patch
+
+log = get_logger("persistence")
+
+
+class RoomStore:
+    """Interface the registry notifies; see SQLiteRoomStore."""
+
+    def room_changed(self, room: Room):
+        pass
+
+    def room_removed(self, room_id: str):
+        pass
+
+    def archive(self, room: Room):
+        pass
+
+    def archive_round(self, room_id: str, round_data: dict):
+        pass
+
+    async def load_rounds(self, room_id: str, before, limit: int) -> list:
+        return []
+
+    async def load(self) -> list:
+        return []
+
+    async def resume_secret(self):
+        return None
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class SQLiteRoomStore(RoomStore):
+    def __init__(self, path: str, interval: float = PERSIST_INTERVAL, snapshot_every: int = SNAPSHOT_EVERY):
+        self.path = path
+        self.interval = interval
+        self.snapshot_every = snapshot_every
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="room-store")
+        self._db = None  # only touched on the executor thread
+        self._dirty = {}  # room_id -> Room, changed since the last flush
+        # ("round", room_id, round dict), ("archive", room_id, state) and ("remove", room_id, None)
+        # waiting to be written, in order: a code can be freed and reused before the next
+        # flush, and the old room's rows must go before the new room's arrive
+        self._pending = []
+        self._persisted = {}  # room_id -> last written state (shared, immutable dumps)
+        self._log_sizes = {}  # room_id -> log entries since the last snapshot (executor thread)
+        self._task = None
+
+    # --- Registry notifications (event loop) ---
+
+    def room_changed(self, room: Room):
+        self._dirty[room.id] = room
+
+    def room_removed(self, room_id: str):
+        self._dirty.pop(room_id, None)
+        self._persisted.pop(room_id, None)
+        self._pending.append(("remove", room_id, None))
+
+    def archive(self, room: Room):
+        self._pending.append(("archive", room.id, room.dump()))
+
+    def archive_round(self, room_id: str, round_data: dict):
+        self._pending.append(("round", room_id, round_data))
+
+    async def load_rounds(self, room_id: str, before, limit: int) -> list:
+        """Finished rounds numbered below before (all if None), newest first."""
+        # Rounds still waiting in the batch aren't on disk yet
+        await self.flush()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._read_rounds, room_id, before, limit)
+
+    async def resume_secret(self) -> bytes:
+        """The HMAC secret for resume tokens, generated on first use and kept across restarts."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._read_secret)
+
+    # --- Lifecycle ---
+
+    async def load(self) -> list:
+        """Rebuilds every stored room: its snapshot plus the changes logged after it."""
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        states = await loop.run_in_executor(self._executor, self._read_all)
+
+        rooms = []
+        for room_id, state in states.items():
+            try:
+                room = Room.model_validate(state)
+            except Exception as e:
+                log.error("room_restore_failed", room_id=room_id, error=repr(e))
+                continue
+            self._persisted[room_id] = room.dump()
+            rooms.append(room)
+
+        log.info("rooms_restored", rooms=len(rooms), ms=round((time.perf_counter() - started) * 1000, 1))
+        return rooms
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        self._executor.shutdown(wait=True)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                log.error("persist_failed", error=repr(e))
+
+    async def flush(self):
+        if not self._dirty and not self._pending:
+            return
+
+        dirty, self._dirty = self._dirty, {}
+        pending, self._pending = self._pending, []
+
+        # Dumps are cached and never mutated, so the writer thread can diff them safely
+        batch = []
+        for room_id, room in dirty.items():
+            state = room.dump()
+            batch.append((room_id, self._persisted.get(room_id), state))
+            self._persisted[room_id] = state
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._write, batch, pending)
+
+    # --- Executor thread ---
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots (room_id TEXT PRIMARY KEY, state TEXT NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS changes ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, room_id TEXT NOT NULL, ops TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS changes_room ON changes (room_id, seq)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS archive ("
+                "room_id TEXT NOT NULL, archived_at REAL NOT NULL, state TEXT NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS rounds ("
+                "room_id TEXT NOT NULL, round_number INTEGER NOT NULL, round TEXT NOT NULL, "
+                "PRIMARY KEY (room_id, round_number))"
+            )
+            self._db.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+        return self._db
+
+    def _read_secret(self) -> bytes:
+        db = self._connect()
+        with db:
+            # OR IGNORE: another process sharing the file may have just stored one
+            db.execute(
+                "INSERT OR IGNORE INTO settings (key, value) VALUES ('resume_secret', ?)", (secrets.token_bytes(32),)
+            )
+        return db.execute("SELECT value FROM settings WHERE key = 'resume_secret'").fetchone()[0]
+
+    def _read_all(self) -> dict:
+        db = self._connect()
+        states = {
+            room_id: json.loads(state)
+            for room_id, state in db.execute("SELECT room_id, state FROM snapshots")
+        }
+        for room_id, ops in db.execute("SELECT room_id, ops FROM changes ORDER BY seq"):
+            if room_id in states:
+                states[room_id] = apply_patch(states[room_id], json.loads(ops))
+                self._log_sizes[room_id] = self._log_sizes.get(room_id, 0) + 1
+        return states
+
+    def _read_rounds(self, room_id: str, before, limit: int) -> list:
+        if before is None:
+            before = 2 ** 31
+        rows = self._connect().execute(
+            "SELECT round FROM rounds WHERE room_id = ? AND round_number < ? "
+            "ORDER BY round_number DESC LIMIT ?",
+            (room_id, before, limit)
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def _write(self, batch: list, pending: list = ()):
+        db = self._connect()
+        with db:
+            now = time.time()
+            for op, room_id, data in pending:
+                if op == "round":
+                    db.execute(
+                        "INSERT OR REPLACE INTO rounds (room_id, round_number, round) VALUES (?, ?, ?)",
+                        (room_id, data["roundNumber"], json.dumps(data, separators=(",", ":")))
+                    )
+                elif op == "archive":
+                    # Archived rooms take their rounds with them, since room codes get reused
+                    history = [
+                        json.loads(row[0]) for row in db.execute(
+                            "SELECT round FROM rounds WHERE room_id = ? ORDER BY round_number", (room_id,)
+                        )
+                    ]
+                    db.execute(
+                        "INSERT INTO archive (room_id, archived_at, state) VALUES (?, ?, ?)",
+                        (room_id, now, json.dumps(dict(data, rounds=history), separators=(",", ":")))
+                    )
+                else:
+                    db.execute("DELETE FROM snapshots WHERE room_id = ?", (room_id,))
+                    db.execute("DELETE FROM changes WHERE room_id = ?", (room_id,))
+                    db.execute("DELETE FROM rounds WHERE room_id = ?", (room_id,))
+                    self._log_sizes.pop(room_id, None)
+
+            for room_id, previous, state in batch:
+                if previous is None or self._log_sizes.get(room_id, 0) >= self.snapshot_every:
+                    db.execute(
+                        "INSERT OR REPLACE INTO snapshots (room_id, state) VALUES (?, ?)",
+                        (room_id, json.dumps(state, separators=(",", ":")))
+                    )
+                    db.execute("DELETE FROM changes WHERE room_id = ?", (room_id,))
+                    self._log_sizes[room_id] = 0
+                    continue
+
+                ops = diff(previous, state)
+                if ops:
+                    db.execute(
+                        "INSERT INTO changes (room_id, ops) VALUES (?, ?)",
+                        (room_id, json.dumps(ops, separators=(",", ":")))
+                    )
+                    self._log_sizes[room_id] = self._log_sizes.get(room_id, 0) + 1
@@ -1,7 +1,28 @@
 """
 Prompt templates for the game.
 These are formatted with {target} (person being impersonated) and {sender} (person who sent the message).
+- Templates are compiled once into literal/field segments, so rendering is a join
+- Besides the built-in PROMPT_TEMPLATES, prompt packs are loaded from PROMPT_PACK_DIR:
+  one template per line, optionally preceded by "# tags: a, b" and "# weight: 2"
+  header lines. Only the header is read at load; a pack's line offsets are
+  indexed through mmap in the background at startup (or on first draw), and each
+  line is compiled when it is first drawn
+- Each room draws through a PromptSampler: a random affine permutation per pack
+  with a cursor, so prompts don't repeat until a pack has been used up
 """
+from array import array
+from functools import lru_cache
+import math
+import mmap
+import os
+import random
+from string import Formatter
+import threading
+
+from constants import PROMPT_PACK_DIR, PROMPT_CACHE_SIZE
+from logger import get_logger
+
+log = get_logger("prompts")
 
 PROMPT_TEMPLATES = [
     "{sender} why did you leave your hoodie at my house again??",
@@ -31,9 +52,215 @@ PROMPT_TEMPLATES = [
     "{sender} are you coming to dinner?",
 ]
 
-def generate_prompt(target_player_name: str, sender_player_name: str) -> str:
-    """Generate a random prompt by selecting a template and filling in player names."""
-    import random
-    template = random.choice(PROMPT_TEMPLATES)
-    return template.format(target=target_player_name, sender=sender_player_name)
 
+class PromptTemplate:
+    __slots__ = ("segments",)
+
+    FIELDS = {"target", "sender"}
+
+    def __init__(self, template: str):
+        segments = []
+        for literal, field, spec, conversion in Formatter().parse(template):
+            if literal:
+                segments.append((literal, None))
+            if field is not None:
+                if field not in self.FIELDS or spec or conversion:
+                    raise ValueError(f"unsupported field {{{field}}} in prompt template")
+                segments.append((None, field))
+        self.segments = tuple(segments)
+
+    def render(self, target: str, sender: str) -> str:
+        names = {"target": target, "sender": sender}
+        return "".join(literal if field is None else names[field] for literal, field in self.segments)
+
+
+class PromptPack:
+    """A named list of templates, with tags and a sampling weight."""
+
+    def __init__(self, name: str, tags=(), weight: float = 1.0):
+        self.name = name
+        self.tags = frozenset(tags)
+        self.weight = weight
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def template(self, index: int) -> PromptTemplate:
+        raise NotImplementedError
+
+
+class BuiltinPack(PromptPack):
+    def __init__(self, templates: list, name: str = "core", tags=(), weight: float = 1.0):
+        super().__init__(name, tags, weight)
+        self._templates = [PromptTemplate(t) for t in templates]
+
+    def __len__(self):
+        return len(self._templates)
+
+    def template(self, index: int) -> PromptTemplate:
+        return self._templates[index]
+
+
+class FilePack(PromptPack):
+    """A pack file, indexed on first use and compiled a line at a time."""
+
+    def __init__(self, path: str):
+        name = os.path.splitext(os.path.basename(path))[0]
+        tags, weight, body_start = (), 1.0, 0
+        with open(path, "rb") as f:
+            for line in f:
+                text = line.decode().strip()
+                if not text.startswith("#"):
+                    break
+                key, _, value = text[1:].partition(":")
+                if key.strip() == "tags":
+                    tags = [t.strip() for t in value.split(",") if t.strip()]
+                elif key.strip() == "weight":
+                    weight = float(value)
+                body_start += len(line)
+        super().__init__(name, tags, weight)
+        self.path = path
+        self._body_start = body_start
+        self._file = None
+        self._map = None
+        self._offsets = None  # start offset of each non-empty line
+        self._lock = threading.Lock()  # indexing may run on a warm-up thread
+
+    def _index(self):
+        with self._lock:
+            if self._offsets is None:
+                self._build_index()
+
+    def _build_index(self):
+        self._file = open(self.path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        offsets = array("Q")
+        position = self._body_start
+        while position < size:
+            end = self._map.find(b"\n", position)
+            if end == -1:
+                end = size
+            if self._map[position:end].strip():
+                offsets.append(position)
+            position = end + 1
+        self._offsets = offsets
+        log.info("prompt_pack_indexed", pack=self.name, prompts=len(offsets))
+
+    def __len__(self):
+        if self._offsets is None:
+            self._index()
+        return len(self._offsets)
+
+    def template(self, index: int) -> PromptTemplate:
+        return _compile_line(self, index)
+
+    def _line(self, index: int) -> str:
+        if self._offsets is None:
+            self._index()
+        start = self._offsets[index]
+        end = self._map.find(b"\n", start)
+        return self._map[start:end if end != -1 else len(self._map)].decode().strip()
+
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def _compile_line(pack: FilePack, index: int) -> PromptTemplate:
+    return PromptTemplate(pack._line(index))
+
+
+class PromptCatalog:
+    def __init__(self, packs: list):
+        self.packs = [pack for pack in packs if pack.weight > 0]
+
+    @classmethod
+    def load(cls, pack_dir: str = PROMPT_PACK_DIR) -> "PromptCatalog":
+        packs = [BuiltinPack(PROMPT_TEMPLATES)]
+        if pack_dir and not os.path.isabs(pack_dir):
+            pack_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), pack_dir)
+        if pack_dir and os.path.isdir(pack_dir):
+            for filename in sorted(os.listdir(pack_dir)):
+                if filename.endswith(".txt"):
+                    packs.append(FilePack(os.path.join(pack_dir, filename)))
+        return cls(packs)
+
+    def warm(self):
+        """Indexes every file pack; run off the event loop to keep the first draws fast."""
+        for pack in self.packs:
+            len(pack)
+
+    def select(self, tags=None) -> list:
+        """Packs carrying any of tags (all packs if tags is empty), falling back to every pack."""
+        if not tags:
+            return self.packs
+        wanted = set(tags)
+        return [pack for pack in self.packs if pack.tags & wanted] or self.packs
+
+
+class PromptSampler:
+    """
+    Per-room prompt draws without repeats. Each pack is walked in the order
+    i -> (a * i + b) mod n for a random a coprime to n, which is a fresh
+    shuffle that costs three ints instead of a shuffled copy of the pack.
+    """
+
+    def __init__(self, catalog: "PromptCatalog", tags=None, rng: random.Random = None):
+        self.packs = list(catalog.select(tags))
+        self.rng = rng or random.Random()
+        # Drawn from instead if every selected pack turns out to be empty
+        self._fallback = next((pack for pack in catalog.packs if isinstance(pack, BuiltinPack)), None)
+        self._weights = [pack.weight for pack in self.packs]
+        self._walks = [None] * len(self.packs)  # per pack: [a, b, cursor, n]
+
+    def _walk(self, i: int) -> list:
+        walk = self._walks[i]
+        if walk is None or walk[2] >= walk[3]:
+            n = len(self.packs[i])
+            a = self.rng.randrange(1, n) if n > 1 else 1
+            while math.gcd(a, n) != 1:
+                a = self.rng.randrange(1, n)
+            walk = self._walks[i] = [a, self.rng.randrange(n) if n else 0, 0, n]
+        return walk
+
+    def next(self) -> PromptTemplate:
+        failures = 0
+        while failures < 100:
+            if len(self.packs) > 1:
+                i = self.rng.choices(range(len(self.packs)), weights=self._weights)[0]
+            else:
+                i = 0
+            walk = self._walk(i)
+            a, b, cursor, n = walk
+            if n == 0:
+                # Empty pack file: stop drawing from it, falling back to the built-in prompts if it was the last
+                del self.packs[i], self._weights[i], self._walks[i]
+                if not self.packs:
+                    if self._fallback is None:
+                        break
+                    self.packs, self._weights, self._walks = [self._fallback], [self._fallback.weight], [None]
+                    self._fallback = None
+                continue
+            walk[2] += 1
+            try:
+                return self.packs[i].template((a * cursor + b) % n)
+            except (ValueError, UnicodeDecodeError) as e:
+                log.warning("bad_prompt_skipped", pack=self.packs[i].name, error=repr(e))
+                failures += 1
+        raise RuntimeError("no usable prompt templates")
+
+
+_catalog = None
+
+
+def catalog() -> PromptCatalog:
+    """The process-wide catalog, loaded on first use."""
+    global _catalog
+    if _catalog is None:
+        _catalog = PromptCatalog.load()
+    return _catalog
+
+
+def generate_prompt(target_player_name: str, sender_player_name: str, sampler: PromptSampler = None, rng: random.Random = None) -> str:
+    """Generate a prompt from the room's sampler (or a fresh one drawing from rng) and fill in player names."""
+    if sampler is None:
+        sampler = PromptSampler(catalog(), rng=rng)
+    return sampler.next().render(target_player_name, sender_player_name)
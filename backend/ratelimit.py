@@ -0,0 +1,65 @@
+"""
+Inbound rate limiting, per connection.
+- Token buckets: each refills at its rate (tokens per second) up to its burst, and
+  every inbound frame takes a token from the connection-wide bucket ("*") and
+  one from its event type's bucket, if that type has a budget
+- Frames over budget are dropped before they reach a handler; the client gets
+  one error per run of dropped frames rather than one per frame
+- Budgets come from RATE_LIMITS; buckets are created on first use
+"""
+import time
+
+from constants import RATE_LIMITS
+
+ANY = "*"  # budget key covering every inbound frame
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated", "warned")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+        self.warned = False  # the client was told about the current run of rejections
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.warned = False
+            return True
+        return False
+
+
+class RateLimiter:
+    __slots__ = ("budgets", "rejected", "_buckets")
+
+    def __init__(self, budgets: dict = RATE_LIMITS):
+        self.budgets = budgets  # event type (or ANY) -> (rate, burst)
+        self.rejected = 0
+        self._buckets = {}
+
+    def allow(self, event_type: str = ANY) -> bool:
+        """Takes a token for one frame of event_type. Event types without a budget are always allowed."""
+        bucket = self._buckets.get(event_type)
+        if bucket is None:
+            budget = self.budgets.get(event_type)
+            if budget is None:
+                return True
+            bucket = self._buckets[event_type] = TokenBucket(*budget, time.monotonic())
+
+        if bucket.take(time.monotonic()):
+            return True
+        self.rejected += 1
+        return False
+
+    def warn(self, event_type: str = ANY) -> bool:
+        """True once per run of frames event_type's bucket rejected: whether to tell the client."""
+        bucket = self._buckets.get(event_type)
+        if bucket is None or bucket.warned:
+            return False
+        bucket.warned = True
+        return True
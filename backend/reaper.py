@@ -0,0 +1,125 @@
+"""
+Room garbage collection.
+- Every REAPER_INTERVAL the reaper walks rooms from least to most recently
+  active (Registry.last_active) and evicts those idle longer than their state's
+  ROOM_TTL; the walk stops at the first room younger than the shortest TTL
+- If resident room state is over ROOM_MEMORY_BUDGET, the least recently active
+  rooms are evicted until it fits. Size is estimated from each room's cached
+  serialized form, so it tracks what the room holds rather than exact RSS
+- Evicted rooms can be archived to the room store first; players still
+  connected are told the room was closed
+"""
+import time
+from collections import Counter
+
+from broadcaster import send_error
+from constants import ROOM_TTL, ROOM_MEMORY_BUDGET, REAPER_INTERVAL
+from logger import get_logger
+
+log = get_logger("reaper")
+
+SWEEP_KEY = "reaper"  # scheduler key
+
+
+class RoomReaper:
+    def __init__(
+        self,
+        registry,
+        scheduler,
+        archive=None,
+        ttls: dict = ROOM_TTL,
+        memory_budget: int = ROOM_MEMORY_BUDGET,
+        interval: float = REAPER_INTERVAL,
+    ):
+        self.registry = registry
+        self.scheduler = scheduler
+        self.archive = archive  # a RoomStore, or None to drop evicted rooms outright
+        self.ttls = ttls
+        self.memory_budget = memory_budget
+        self.interval = interval
+        self.evicted = Counter()  # reason -> rooms evicted since start
+        self.resident_bytes = 0  # estimate from the last sweep
+
+    def start(self):
+        self.scheduler.schedule(SWEEP_KEY, self.interval, self.sweep)
+
+    def stop(self):
+        self.scheduler.cancel(SWEEP_KEY)
+
+    def counters(self) -> dict:
+        return {
+            "resident_rooms": len(self.registry.rooms),
+            "resident_bytes": self.resident_bytes,
+            "evicted": dict(self.evicted),
+        }
+
+    def sweep(self):
+        started = time.perf_counter()
+        try:
+            expired = self._expire()
+            over_budget = self._enforce_budget()
+            if expired or over_budget:
+                log.info(
+                    "rooms_reaped",
+                    expired=expired,
+                    over_budget=over_budget,
+                    resident=len(self.registry.rooms),
+                    resident_bytes=self.resident_bytes,
+                    ms=round((time.perf_counter() - started) * 1000, 2)
+                )
+        finally:
+            self.start()
+
+    def _expire(self) -> int:
+        if not self.ttls:
+            return 0
+        now = time.monotonic()
+        shortest = min(self.ttls.values())
+
+        expired = []
+        for room_id, last_active in self.registry.last_active.items():
+            idle = now - last_active
+            if idle < shortest:
+                break  # everything after this is more recent still
+            room = self.registry.rooms.get(room_id)
+            ttl = self.ttls.get(room.state) if room else None
+            if ttl is not None and idle >= ttl:
+                expired.append(room)
+
+        for room in expired:
+            self.evict(room, f"idle_{room.state}")
+        return len(expired)
+
+    def _enforce_budget(self) -> int:
+        rooms = self.registry.rooms
+        sizes = {room_id: len(room.dump_json()) for room_id, room in rooms.items()}
+        self.resident_bytes = sum(sizes.values())
+        if self.memory_budget is None or self.resident_bytes <= self.memory_budget:
+            return 0
+
+        victims = []
+        for room_id in self.registry.last_active:
+            if self.resident_bytes <= self.memory_budget:
+                break
+            victims.append(rooms[room_id])
+            self.resident_bytes -= sizes[room_id]
+
+        for room in victims:
+            self.evict(room, "memory_budget")
+        return len(victims)
+
+    def evict(self, room, reason: str):
+        """Removes a room and everything tied to it: timers, sessions and player indexes."""
+        if self.archive is not None:
+            self.archive.archive(room)
+
+        for player in room.players:
+            self.scheduler.cancel(("evict", player.id))
+            self.registry.sessions.end(player.id)
+            conn = self.registry.connections.get(player.id)
+            if conn is not None:
+                send_error(conn, f"Room {room.id} was closed", None)
+
+        self.scheduler.cancel(room.id)
+        self.registry.remove_room(room.id)
+        self.evicted[reason] += 1
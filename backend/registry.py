@@ -0,0 +1,117 @@
+from collections import OrderedDict
+import time
+from typing import Optional
+
+from models import Player, Room
+from sessions import SessionManager
+from roomcodes import RoomCodeAllocator
+from actors import RoomActors
+from spectators import SpectatorHub
+
+
+class Registry:
+    """
+    Owns every live room and connection, replacing the bare rooms/connections dicts.
+    Keeps O(1) indexes consistent as players join, leave and disconnect:
+    - player_rooms: player_id -> room_id
+    - room._members: player_id -> Player, per room
+    - room._standings: the room's leaderboard, per room
+    - last_active: room_id -> time of last change, least recently active first
+    Round-level indexes (responses by id, responders, voters) live on each Round.
+    Observers (e.g. a RoomStore) are told when a room changes or is removed.
+    sessions tracks players whose socket dropped but who may still resume.
+    actors runs each room's events one at a time, in batches (see actors.py).
+    spectators holds each room's audience, apart from its players.
+    matchmaker and heartbeat (set up by main) queue quick play and watch sockets for silence.
+    """
+
+    def __init__(self):
+        self.owns_room = None  # room code -> bool; set when sharded so new rooms land on this worker
+        self.rooms: dict = {}  # room_id -> Room
+        self.connections: dict = {}  # player_id -> Connection
+        self.player_rooms: dict = {}  # player_id -> room_id
+        self.last_active = OrderedDict()  # room_id -> monotonic time, least recently active first
+        self.observers: list = []  # objects with room_changed(room) / room_removed(room_id)
+        self.sessions = SessionManager()
+        self.codes = RoomCodeAllocator()
+        self.actors = RoomActors()
+        self.spectators = SpectatorHub()
+        self.matchmaker = None  # Matchmaker for quick play; set up by main
+        self.heartbeat = None  # Heartbeat pinging local sockets; set up by main
+        self.round_archive = None  # RoomStore holding finished rounds beyond each room's retention
+        self.pending_chat: dict = {}  # room_id -> ChatMessageResponses waiting for the next coalescing tick
+
+    # --- Rooms ---
+
+    def get_room(self, room_id: str) -> Optional[Room]:
+        return self.rooms.get(room_id)
+
+    def add_room(self, room: Room):
+        self.rooms[room.id] = room
+        self.codes.claim(room.id)
+        for player in room.players:
+            self.player_rooms[player.id] = room.id
+        room._observer = self._room_changed
+        self._room_changed(room)
+
+    def remove_room(self, room_id: str) -> Optional[Room]:
+        room = self.rooms.pop(room_id, None)
+        self.last_active.pop(room_id, None)
+        if room:
+            self.codes.release(room_id)
+            for player in room.players:
+                if self.player_rooms.get(player.id) == room_id:
+                    del self.player_rooms[player.id]
+            room._observer = None
+            self.spectators.room_removed(room_id)
+            for observer in self.observers:
+                observer.room_removed(room_id)
+        return room
+
+    def mark_active(self, room_id: str):
+        self.last_active[room_id] = time.monotonic()
+        self.last_active.move_to_end(room_id)
+
+    def _room_changed(self, room: Room):
+        self.mark_active(room.id)
+        self.spectators.changed(room)
+        for observer in self.observers:
+            observer.room_changed(room)
+
+    # --- Players ---
+
+    def room_of(self, player_id: str) -> Optional[Room]:
+        room_id = self.player_rooms.get(player_id)
+        return self.rooms.get(room_id) if room_id else None
+
+    def get_player(self, player_id: str) -> Optional[Player]:
+        room = self.room_of(player_id)
+        return room._members.get(player_id) if room else None
+
+    def add_player(self, room: Room, player: Player):
+        room.append("players", player)
+        room._members[player.id] = player
+        room._standings.add(player.id, player.points)
+        self.player_rooms[player.id] = room.id
+
+    def remove_player(self, room: Room, player_id: str) -> Optional[Player]:
+        """Removes a player from a room and from every index. Returns the removed Player."""
+        player = room._members.pop(player_id, None)
+        if player is None:
+            return None
+        room.players = [p for p in room.players if p is not player]
+        room._standings.remove(player_id)
+        if self.player_rooms.get(player_id) == room.id:
+            del self.player_rooms[player_id]
+        conn = self.connections.get(player_id)
+        if conn is not None:
+            conn.reset_sync()  # whatever room they go to next starts from a snapshot
+        return player
+
+    # --- Connections ---
+
+    def connect(self, player_id: str, conn):
+        self.connections[player_id] = conn
+
+    def disconnect(self, player_id: str):
+        return self.connections.pop(player_id, None)
@@ -0,0 +1,150 @@
+"""
+Room code allocation in O(1).
+- Each tier is every code of one length over ROOM_CODE_ALPHABET. Codes are handed
+  out by walking a keyed pseudo-random permutation of the tier (a small Feistel
+  network), so consecutive rooms get unrelated codes and no code repeats until
+  the tier has been walked once
+- Deleted rooms release their code onto a FIFO free-list, which is reused
+  before walking further; FIFO keeps a just-released code out of circulation
+  as long as possible
+- New rooms use the shortest tier that is below ROOM_CODE_TIER_FILL, so codes
+  stay short and live codes stay sparse enough that guessing one is unlikely
+- When sharded, codes this worker doesn't own are skipped; on average that costs
+  one step per worker
+"""
+from collections import deque
+import hashlib
+import secrets
+
+from constants import ROOM_CODE_ALPHABET, ROOM_CODE_TIERS, ROOM_CODE_TIER_FILL
+
+FEISTEL_ROUNDS = 4
+
+
+class _Tier:
+    __slots__ = ("length", "capacity", "half_bits", "next_index", "free", "in_use", "examined", "accepted")
+
+    def __init__(self, length: int, base: int):
+        self.length = length
+        self.capacity = base ** length
+        bits = max(2, (self.capacity - 1).bit_length())
+        self.half_bits = (bits + 1) // 2
+        self.next_index = 0  # position in the permutation
+        self.free = deque()  # released codes, oldest first
+        self.in_use = 0
+        self.examined = 0  # candidates looked at / accepted, to estimate this worker's share
+        self.accepted = 0
+
+    def share(self) -> float:
+        return self.accepted / self.examined if self.examined else 1.0
+
+    def utilization(self) -> float:
+        return self.in_use / (self.capacity * self.share())
+
+
+class RoomCodeAllocator:
+    def __init__(
+        self,
+        alphabet: str = ROOM_CODE_ALPHABET,
+        tiers: tuple = ROOM_CODE_TIERS,
+        fill: float = ROOM_CODE_TIER_FILL,
+        key: bytes = None,
+    ):
+        self.alphabet = alphabet
+        self.fill = fill
+        self.key = key or secrets.token_bytes(16)
+        self._tiers = [_Tier(length, len(alphabet)) for length in tiers]
+        self._by_length = {tier.length: tier for tier in self._tiers}
+        self._digits = {char: i for i, char in enumerate(alphabet)}
+
+    # --- Allocation ---
+
+    def allocate(self, taken=(), accept=None) -> str:
+        """
+        Returns an unused code. taken is checked so codes held by rooms this
+        allocator never issued (e.g. restored from storage) are skipped;
+        accept, if given, limits codes to those it returns True for.
+        """
+        for tier in self._tiers:
+            if tier.utilization() >= self.fill and tier is not self._tiers[-1]:
+                continue
+            code = self._allocate_from(tier, taken, accept)
+            if code is not None:
+                return code
+        raise RuntimeError("room code space exhausted")
+
+    def _allocate_from(self, tier: _Tier, taken, accept):
+        while tier.free:
+            code = tier.free.popleft()
+            if code not in taken:
+                return code
+
+        while tier.next_index < tier.capacity:
+            code = self._encode(self._permute(tier, tier.next_index), tier.length)
+            tier.next_index += 1
+            if code in taken:
+                continue
+            tier.examined += 1
+            if accept is not None and not accept(code):
+                continue
+            tier.accepted += 1
+            return code
+        return None
+
+    def claim(self, code: str):
+        """Marks a code as held by a live room."""
+        tier = self._by_length.get(len(code))
+        if tier is not None and self._valid(code):
+            tier.in_use += 1
+
+    def release(self, code: str):
+        """Returns a deleted room's code to its tier."""
+        tier = self._by_length.get(len(code))
+        if tier is not None and self._valid(code):
+            tier.in_use = max(0, tier.in_use - 1)
+            tier.free.append(code)
+
+    def stats(self) -> list:
+        return [
+            {
+                "length": tier.length,
+                "capacity": tier.capacity,
+                "in_use": tier.in_use,
+                "utilization": round(tier.utilization(), 4),
+                "free_list": len(tier.free),
+                "walked": tier.next_index,
+            }
+            for tier in self._tiers
+        ]
+
+    # --- Code space ---
+
+    def _valid(self, code: str) -> bool:
+        return all(char in self._digits for char in code)
+
+    def _encode(self, index: int, length: int) -> str:
+        base = len(self.alphabet)
+        chars = []
+        for _ in range(length):
+            index, digit = divmod(index, base)
+            chars.append(self.alphabet[digit])
+        return "".join(chars)
+
+    def _round(self, tier: _Tier, round_number: int, value: int) -> int:
+        digest = hashlib.blake2b(
+            value.to_bytes(8, "little"), digest_size=8, key=self.key,
+            person=bytes([tier.length, round_number])
+        ).digest()
+        return int.from_bytes(digest, "little") & ((1 << tier.half_bits) - 1)
+
+    def _permute(self, tier: _Tier, index: int) -> int:
+        """Bijection on [0, capacity): Feistel over the enclosing power of two, cycle-walking back into range."""
+        mask = (1 << tier.half_bits) - 1
+        value = index
+        while True:
+            left, right = value >> tier.half_bits, value & mask
+            for round_number in range(FEISTEL_ROUNDS):
+                left, right = right, left ^ self._round(tier, round_number, right)
+            value = (left << tier.half_bits) | right
+            if value < tier.capacity:
+                return value
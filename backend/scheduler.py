@@ -0,0 +1,109 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+from logger import get_logger
+
+log = get_logger("scheduler")
+
+
+class Timer:
+    __slots__ = ("when", "key", "callback", "args", "cancelled")
+
+    def __init__(self, when: float, key, callback, args: tuple):
+        self.when = when
+        self.key = key
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+
+class PhaseScheduler:
+    """
+    Heap-based timer scheduler shared by every room.
+    - One background task sleeps until the earliest deadline, so thousands of
+      pending timers cost a heap entry each instead of a parked coroutine
+    - Timers are keyed (e.g. by room_id); scheduling a key again replaces its
+      previous timer, and cancel() drops it
+    - Callbacks are plain functions run on the event loop; they must not block
+    """
+
+    def __init__(self):
+        self._heap = []  # (when, seq, Timer); cancelled timers are skipped lazily
+        self._timers = {}  # key -> live Timer
+        self._cancelled = 0  # cancelled entries still sitting in the heap
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._task = None
+
+    def schedule(self, key, delay: float, callback, *args) -> Timer:
+        """Run callback(*args) after delay seconds, replacing any timer under the same key."""
+        self.cancel(key)
+        timer = Timer(time.monotonic() + delay, key, callback, args)
+        self._timers[key] = timer
+        heapq.heappush(self._heap, (timer.when, next(self._seq), timer))
+        self._ensure_running()
+        if self._heap[0][2] is timer:
+            self._wakeup.set()  # new earliest deadline
+        return timer
+
+    def cancel(self, key) -> bool:
+        timer = self._timers.pop(key, None)
+        if timer is None:
+            return False
+        timer.cancelled = True
+        self._cancelled += 1
+        if self._cancelled > 64 and self._cancelled > len(self._heap) // 2:
+            # Mostly dead entries: rebuild instead of letting the heap grow
+            self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+        return True
+
+    def pending(self, key) -> bool:
+        return key in self._timers
+
+    def __len__(self):
+        return len(self._timers)
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            # Drop cancelled timers from the top of the heap
+            while self._heap and self._heap[0][2].cancelled:
+                heapq.heappop(self._heap)
+                self._cancelled -= 1
+
+            if not self._heap:
+                timeout = None
+            else:
+                timeout = self._heap[0][0] - time.monotonic()
+
+            if timeout is None or timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, timer = heapq.heappop(self._heap)
+            del self._timers[timer.key]
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                log.error("timer_failed", key=timer.key, error=repr(e))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
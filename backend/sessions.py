@@ -0,0 +1,127 @@
+"""
+Resumable sessions, so a dropped socket doesn't cost a seat.
+- RoomJoinedResponse carries a resume token: the room and player ids signed with
+  an HMAC secret, WHO_TEXTED_RESUME_SECRET. Without it the secret is generated
+  and kept in the room store, so tokens outlive a restart; with no store either,
+  it lasts as long as the process (as do its rooms)
+- A player whose socket drops is suspended instead of removed; they keep their
+  seat until resumed or evicted after RESUME_GRACE
+- While a room has suspended players, frames it sends are kept in a bounded
+  per-room ring buffer; resuming replays only what that player missed
+"""
+from collections import deque
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from typing import Optional
+
+from constants import RESUME_BUFFER
+
+
+class _RoomBuffer:
+    __slots__ = ("seq", "frames", "waiting")
+
+    def __init__(self, size: int):
+        self.seq = 0  # sequence number of the next recorded frame
+        self.frames = deque(maxlen=size)  # (seq, player_id or None for everyone, frame)
+        self.waiting = 0  # suspended players in the room
+
+
+class SessionManager:
+    def __init__(self, secret: bytes = None, buffer_size: int = RESUME_BUFFER):
+        if secret is None:
+            secret = os.environ.get("WHO_TEXTED_RESUME_SECRET", "").encode() or None
+        self.secret_configured = secret is not None  # else main swaps in the room store's
+        self.secret = secret or secrets.token_bytes(32)
+        self.buffer_size = buffer_size
+        self._suspended = {}  # player_id -> (room_id, seq of the first frame they missed, or None)
+        self._buffers = {}  # room_id -> _RoomBuffer, only while someone there is suspended
+
+    # --- Tokens ---
+
+    def _sign(self, payload: str) -> str:
+        digest = hmac.new(self.secret, payload.encode(), hashlib.sha256).digest()[:16]
+        return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+    def issue(self, room_id: str, player_id: str) -> str:
+        payload = f"{room_id}.{player_id}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, token: str) -> Optional[tuple]:
+        """Returns (room_id, player_id) for a genuine token, else None."""
+        payload, _, signature = token.rpartition(".")
+        room_id, _, player_id = payload.partition(".")
+        if not room_id or not player_id or not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        return room_id, player_id
+
+    # --- Suspension ---
+
+    def suspend(self, room_id: str, player_id: str, replayable: bool = True):
+        """
+        Starts holding the player's seat. replayable=False (e.g. after a restart,
+        when what they last received is unknown) makes resume() send full state.
+        """
+        if player_id in self._suspended:
+            return
+        buffer = self._buffers.get(room_id)
+        if buffer is None:
+            buffer = self._buffers[room_id] = _RoomBuffer(self.buffer_size)
+        buffer.waiting += 1
+        self._suspended[player_id] = (room_id, buffer.seq if replayable else None)
+
+    def __len__(self):
+        return len(self._suspended)
+
+    def is_suspended(self, player_id: str) -> bool:
+        return player_id in self._suspended
+
+    def resume(self, player_id: str) -> Optional[list]:
+        """
+        Ends a suspension and returns the frames the player missed, oldest first.
+        Returns None if they weren't suspended or the buffer has already dropped
+        frames they need; the caller then sends the full room state instead.
+        """
+        entry = self._suspended.get(player_id)
+        if entry is None:
+            return None
+        room_id, start = entry
+        buffer = self._buffers[room_id]
+        overflowed = start is None or (
+            buffer.seq > start and (not buffer.frames or buffer.frames[0][0] > start)
+        )
+
+        missed = None
+        if not overflowed:
+            missed = [
+                frame for seq, target, frame in buffer.frames
+                if seq >= start and (target is None or target == player_id)
+            ]
+        self.end(player_id)
+        return missed
+
+    def end(self, player_id: str):
+        """Forgets a suspension, after resuming or evicting the player."""
+        entry = self._suspended.pop(player_id, None)
+        if entry is None:
+            return
+        room_id = entry[0]
+        buffer = self._buffers[room_id]
+        buffer.waiting -= 1
+        if buffer.waiting == 0:
+            del self._buffers[room_id]
+
+    # --- Recording ---
+
+    def recording(self, room_id: str) -> bool:
+        return room_id in self._buffers
+
+    def record(self, room_id: str, frame: str, player_id: str = None):
+        """Keeps a frame for suspended players; player_id limits it to one of them."""
+        buffer = self._buffers.get(room_id)
+        if buffer is None:
+            return
+        buffer.frames.append((buffer.seq, player_id, frame))
+        buffer.seq += 1
@@ -1,383 +1,566 @@
 import random
-import asyncio
 
 from models import (
-    RoomJoinedResponse, RoomUpdateResponse, ChatMessageResponse, GameStartedResponse,
-    RoundSetupResponse, PromptDisplayResponse, ResponseSubmittedResponse,
+    Response, RoomJoinedResponse, RoomUpdateResponse, ChatMessageResponse, ChatBatchResponse, GameStartedResponse,
+    RoundSetupResponse, PromptDisplayResponse, ResponseSubmittedResponse, SessionResumedResponse,
     VotingPhaseResponse, VoteSubmittedResponse, RevealPhaseResponse,
-    ScoringPhaseResponse, RoundCompleteResponse, GameFinishedResponse
+    ScoringPhaseResponse, RoundCompleteResponse, GameFinishedResponse, RoundHistoryResponse
 )
 
+from broadcaster import send, send_to, send_error, broadcast, sync_frame, envelope, RoomEnvelope
+from logger import get_logger
+from metrics import AUDIENCE_VOTES
+from constants import RESUME_GRACE, ROUND_HISTORY_PAGE, CHAT_COALESCE_TICK
 from helpers import (
-    send, broadcast, initialize_new_room, join_room,
-    initialize_round, start_new_round, validate_response, process_response,
-    check_all_responses_submitted, process_vote, calculate_round_scores,
-    check_game_completion, validate_state_transition
+    validate_room_id, initialize_new_room, join_room,
+    remove_player_round_data, process_audience_vote, audience_results
 )
+import game
 
-async def handle_create_room(ws, rooms, request, player_id):
-    room_id, display_name = initialize_new_room(rooms, player_id, request.username)
+log = get_logger("sockets")
 
-    response = RoomJoinedResponse(
+async def handle_create_room(conn, registry, scheduler, request, player_id):
+    leave_audience_and_queue(registry, player_id)
+    room_id, display_name = initialize_new_room(registry, player_id, request.username, request.promptTags)
+
+    response = envelope(RoomJoinedResponse(
         playerId=player_id,
         roomId=room_id,
         displayName=display_name,
         isHost=True,
-        room=rooms[room_id]
-    ).model_dump()
+        room=registry.rooms[room_id],
+        resumeToken=registry.sessions.issue(room_id, player_id)
+    ))
 
-    await send(ws, response)
+    send(conn, response)
 
-async def handle_join_room(ws, rooms, connections, request, player_id):
+async def handle_join_room(conn, registry, scheduler, request, player_id):
     room_id = request.roomId
 
+    if not validate_room_id(request, registry):
+        send_error(conn, f"Room {room_id} not found", request.type)
+        return
+
+    leave_audience_and_queue(registry, player_id) # taking a seat stops watching or waiting for quick play
     display_name, room = join_room(
-        rooms, player_id, request.username, room_id
+        registry, player_id, request.username, room_id
     )
 
-    response = RoomJoinedResponse(
+    response = envelope(RoomJoinedResponse(
         playerId=player_id,
         roomId=room_id,
         displayName=display_name,
         isHost=False,
-        room=rooms[room_id]
-    ).model_dump()
+        room=registry.rooms[room_id],
+        resumeToken=registry.sessions.issue(room_id, player_id)
+    ))
 
-    await send(ws, response)
+    send(conn, response)
 
-    payload = RoomUpdateResponse(room=room).model_dump()
+    payload = envelope(RoomUpdateResponse(room=room))
 
-    await broadcast(
-        rooms=rooms,
-        connections=connections,
+    broadcast(
+        registry=registry,
         room_id=room_id,
         payload=payload
     )
 
-async def handle_start_game(rooms, connections, request, player_id):
-    room_id = request.roomId
-    room = rooms[room_id]
-    
-    # Validate host
-    # May delete because frontend only shows start game button to host anyway
-    host = next((p for p in room.players if p.id == player_id), None)
-    if not host or not host.isHost:
-        print(f"Player {player_id} is not the host, cannot start game")
-        return
-    
-    # Validate minimum players
-    if len(room.players) < 3:
-        print(f"Need at least 3 players to start game, currently {len(room.players)}")
+def leave_audience_and_queue(registry, player_id):
+    """Stops the player watching a room or waiting for quick play, whichever they were doing."""
+    registry.spectators.unwatch(player_id)
+    if registry.matchmaker is not None:
+        registry.matchmaker.cancel(player_id)
+
+async def handle_start_game(conn, registry, scheduler, request, player_id):
+    room = registry.get_room(request.roomId)
+    if not room:
+        log.info("room_not_found", room_id=request.roomId, player_id=player_id)
         return
-    
-    # Set room state to "playing" (per spec)
-    room.currentRound = 1
-    room.state = "playing"
-    
-    try:        
-        # Use start_new_round helper (per spec) - this creates round and sends messages
-        await start_new_round(room, rooms, connections)
-        
-        # Broadcast room update AGAIN after round is created so all players get complete state with round data
-        complete_update = GameStartedResponse(room=room).model_dump()
-        await broadcast(rooms, connections, room_id, complete_update)
-        
-        # After a delay, transition round to responding state
-        await asyncio.sleep(3)  # Give players time to see prompt
-        
-    except Exception as e:
-        print(f"Error starting game: {e}")
-        room.state = "lobby"
-        room.currentRound = 0
-        room.currentRoundData = None
-        room.currentPrompt = None
-
-async def handle_send_message(rooms, connections, request, player_id):
+
+    # Host and player-count checks are the state machine's (game.py)
+    run_game_event(registry, scheduler, room, "start_game", player_id, conn=conn)
+
+async def handle_send_message(conn, registry, scheduler, request, player_id):
     room_id = request.roomId
     
-    if room_id not in rooms:
-        print(f"Room {room_id} not found")
+    room = registry.get_room(room_id)
+    if not room:
+        log.info("room_not_found", room_id=room_id, player_id=player_id)
         return
 
-    sender = next((p for p in rooms[room_id].players if p.id == player_id), None)
+    sender = room._members.get(player_id)
     if not sender:
-        print(f"Player {player_id} not found in room {room_id}")
+        log.info("player_not_in_room", room_id=room_id, player_id=player_id)
         return
 
-    payload = ChatMessageResponse(
+    message = ChatMessageResponse(
         type="chat_message",
         senderId=sender.id,
         senderDisplayName=sender.displayName or sender.username,  # Fallback to username if displayName is None
         text=request.text
-    ).model_dump()
-
-    await broadcast(
-        rooms=rooms,
-        connections=connections,
-        room_id=room_id,
-        payload=payload
     )
 
-async def handle_leave_room(rooms, connections, request, player_id):
+    registry.mark_active(room_id) # chat doesn't change the room, but it keeps it alive
+
+    queue_chat(registry, scheduler, room_id, message)
+
+
+def queue_chat(registry, scheduler, room_id, message):
+    """
+    Holds a chat message for CHAT_COALESCE_TICK, so messages sent close together
+    reach each player as one chat_batch frame instead of one frame apiece.
+    """
+    if not CHAT_COALESCE_TICK:
+        broadcast(registry, room_id, message.model_dump())
+        return
+
+    pending = registry.pending_chat.setdefault(room_id, [])
+    pending.append(message)
+    if len(pending) == 1:
+        room_timer(registry, scheduler, room_id, CHAT_COALESCE_TICK, flush_chat, registry, room_id, key=("chat", room_id))
+
+
+def flush_chat(registry, room_id):
+    """Sends a room's held chat: alone as chat_message, several as chat_batch."""
+    messages = registry.pending_chat.pop(room_id, None)
+    if not messages or not registry.get_room(room_id):
+        return
+    if len(messages) == 1:
+        broadcast(registry, room_id, messages[0].model_dump())
+    else:
+        broadcast(registry, room_id, ChatBatchResponse(messages=messages).model_dump())
+
+async def handle_pong(conn, registry, scheduler, request, player_id):
+    # The receive loop already noted the frame in conn.last_seen; from now on
+    # the heartbeat can time this client out
+    conn.answers_pings = True
+
+
+async def handle_leave_room(conn, registry, scheduler, request, player_id):
     room_id = request.roomId
+
+    if registry.spectators.unwatch(player_id):
+        return # was only watching
     
-    if room_id not in rooms:
-        print(f"Room {room_id} not found")
+    room = registry.get_room(room_id)
+    if not room:
+        send_error(conn, f"Room {room_id} not found", request.type)
         return
 
-    leaving_player = next((p for p in rooms[room_id].players if p.id == player_id), None)
-
-    rooms[room_id].players = [p for p in rooms[room_id].players if p.id != player_id] # remove player with specified player_id
+    leaving_player = registry.remove_player(room, player_id) # remove player with specified player_id
+    if leaving_player and room.currentRoundData:
+        remove_player_round_data(room, player_id)
 
-    if leaving_player and leaving_player.isHost and len(rooms[room_id].players) > 0:
-        random_player_index = random.randint(0, len(rooms[room_id].players) - 1)
-        rooms[room_id].players[random_player_index].isHost = True
-        rooms[room_id].hostId = rooms[room_id].players[random_player_index].id
+    if leaving_player and leaving_player.isHost and len(room.players) > 0:
+        random_player_index = random.randint(0, len(room.players) - 1)
+        room.players[random_player_index].isHost = True
+        room.hostId = room.players[random_player_index].id
 
     # if room has no players, remove the room from rooms
-    if len(rooms[room_id].players) > 0:
-        response = RoomUpdateResponse(room=rooms[room_id]).model_dump()
-        await broadcast(
-            rooms=rooms,
-            connections=connections,
+    if len(room.players) > 0:
+        response = envelope(RoomUpdateResponse(room=room))
+        broadcast(
+            registry=registry,
             room_id=room_id,
             payload=response,
             exclude_player_id=player_id # only send update to existing players
         )
+        if leaving_player:
+            advance_if_complete(registry, scheduler, room)
     else:
-        del rooms[room_id]
+        scheduler.cancel(room_id)
+        registry.remove_room(room_id)
 
-async def handle_submit_response(rooms, connections, request, player_id):
-    """Handle response submission from a player."""
-    room_id = request.roomId
-    room = rooms.get(room_id)
-    
-    if not room or not room.currentRoundData:
-        print(f"Room {room_id} or round data not found")
-        return
-    
-    # Validate response
-    if not validate_response(room, player_id, request.text):
-        print(f"Invalid response from player {player_id}")
+async def handle_submit_response(conn, registry, scheduler, request, player_id):
+    """Handle response submission from a player; voting opens once everyone has submitted."""
+    room = registry.get_room(request.roomId)
+    if not room:
+        log.info("room_not_found", room_id=request.roomId, player_id=player_id)
         return
-    
-    # Process response
-    response = process_response(room, player_id, request.text)
-    
-    # Check if all submitted
-    all_submitted = check_all_responses_submitted(room)
-    
-    # Send confirmation to submitting player
-    ws = connections.get(player_id)
-    if ws:
-        confirm_response = ResponseSubmittedResponse(
-            room=room,
-            allSubmitted=all_submitted
-        ).model_dump()
-        await send(ws, confirm_response)
-    
-    # If all submitted, transition to voting
-    if all_submitted:
-        # Room.state stays "playing", only Round.state changes
-        room.currentRoundData.state = "voting"
-        
-        # Create anonymous responses for voting (hide playerId and isReal status)
-        # Note: Original responses have playerId set, but we create new anonymous copies for voting
-        anonymous_responses = [
-            Response(
-                id=r.id,
-                playerId=None,  # Already None per spec
-                text=r.text,
-                isReal=False,  # Hide real status
-                voteCount=0
-            ) for r in room.currentRoundData.responses
-        ]
-        
-        # Broadcast voting phase to all players
-        voting_response = VotingPhaseResponse(
-            room=room,
-            responses=anonymous_responses
-        ).model_dump()
-        
-        await broadcast(rooms, connections, room_id, voting_response)
 
+    run_game_event(registry, scheduler, room, "submit_response", player_id, request.text, conn=conn)
 
-async def handle_submit_vote(rooms, connections, request, player_id):
-    """Handle vote submission from a player."""
-    room_id = request.roomId
-    room = rooms.get(room_id)
-    
-    if not room or not room.currentRoundData:
-        print(f"Room {room_id} or round data not found")
+
+async def handle_submit_vote(conn, registry, scheduler, request, player_id):
+    """Handle vote submission from a player; the reveal follows once everyone has voted."""
+    room = registry.get_room(request.roomId)
+    if not room:
+        log.info("room_not_found", room_id=request.roomId, player_id=player_id)
         return
-    
-    # Process vote
-    all_voted = process_vote(room, player_id, request.responseId)
-    
-    # Send confirmation to voting player
-    ws = connections.get(player_id)
-    if ws:
-        confirm_response = VoteSubmittedResponse(
-            room=room,
-            allVoted=all_voted
-        ).model_dump()
-        await send(ws, confirm_response)
-    
-    # If all voted, transition to reveal
-    if all_voted:
-        # Room.state stays "playing", only Round.state changes
-        room.currentRoundData.state = "reveal"
-        
-        # Broadcast reveal phase with all information (playerIds already in responses)
-        reveal_response = RevealPhaseResponse(
-            room=room,
-            responses=room.currentRoundData.responses,  # playerId already set
-            votes=room.currentRoundData.votes
-        ).model_dump()
-        
-        await broadcast(rooms, connections, room_id, reveal_response)
-        
-        # After 5 seconds, transition to scoring
-        await asyncio.sleep(5)
-        
-        # Calculate scores
-        scores = calculate_round_scores(room.currentRoundData, room.players)
-        
-        # Update player points
-        for player in room.players:
-            if player.id in scores:
-                player.points += scores[player.id]['points_earned']
-        
-        # Transition to scoring (Room.state stays "playing")
-        room.currentRoundData.state = "scoring"
-        
-        # Create round summary (convert all values to strings for JSON compatibility)
-        round_summary = {
-            'roundNumber': str(room.currentRoundData.roundNumber),
-            'targetPlayerId': room.currentRoundData.targetPlayerId,
-            'realImpersonatorId': room.currentRoundData.realImpersonatorId,
-            'totalVotes': str(len(room.currentRoundData.votes))
-        }
-        
-        scoring_response = ScoringPhaseResponse(
-            room=room,
-            scores={pid: data['points_earned'] for pid, data in scores.items()},
-            roundSummary=round_summary
-        ).model_dump()
-        
-        await broadcast(rooms, connections, room_id, scoring_response)
-        
-        # Store completed round
-        room.rounds.append(room.currentRoundData)
-        
-        # Send round complete message (optional - can be used for UI transitions)
-        complete_response = RoundCompleteResponse(room=room).model_dump()
-        await broadcast(rooms, connections, room_id, complete_response)
 
+    run_game_event(registry, scheduler, room, "submit_vote", player_id, request.responseId, conn=conn)
 
-async def handle_next_round(rooms, connections, request, player_id):
-    """Handle transition to next round."""
-    room_id = request.roomId
-    room = rooms.get(room_id)
-    
+
+async def handle_next_round(conn, registry, scheduler, request, player_id):
+    """Handle transition to next round (or the end of the game), from the host."""
+    room = registry.get_room(request.roomId)
     if not room:
-        print(f"Room {room_id} not found")
-        return
-    
-    # Validate host
-    host = next((p for p in room.players if p.id == player_id), None)
-    if not host or not host.isHost:
-        print(f"Player {player_id} is not the host")
+        log.info("room_not_found", room_id=request.roomId, player_id=player_id)
         return
-    
-    # Check if game is complete
-    if check_game_completion(room):
-        # Game finished
-        room.state = "finished"
-        
-        # Find winner
-        if not room.players:
-            print("No players in room, cannot determine winner")
-            return
-        
-        # Find player(s) with max points (handle ties)
-        max_points = max(p.points for p in room.players)
-        winners = [p for p in room.players if p.points == max_points]
-        winner = winners[0]  # Use first winner if tie
-        final_scores = {p.id: p.points for p in room.players}
-        
-        finished_response = GameFinishedResponse(
-            room=room,
-            finalScores=final_scores,
-            winner=winner
-        ).model_dump()
-        
-        await broadcast(rooms, connections, room_id, finished_response)
-        return
-    
-    # Start next round
-    room.currentRound += 1
-    # Room.state stays "playing"
-    
-    try:
-        # Use start_new_round helper (per spec)
-        await start_new_round(room, rooms, connections)
-        
-        # Broadcast room update
-        update_response = RoomUpdateResponse(room=room).model_dump()
-        await broadcast(rooms, connections, room_id, update_response)
-        
-        # After delay, transition round to responding state
-        await asyncio.sleep(3)  # Give players time to see prompt
-        
-        if room.currentRoundData:
-            room.currentRoundData.state = "responding"
-            # Broadcast state update
-            update_response = RoomUpdateResponse(room=room).model_dump()
-            await broadcast(rooms, connections, room_id, update_response)
-        
-    except Exception as e:
-        print(f"Error starting next round: {e}")
-        room.state = "lobby"
-        room.currentRoundData = None
-        room.currentPrompt = None
+
+    run_game_event(registry, scheduler, room, "next_round", player_id, conn=conn)
 
 
-async def handle_disconnect(rooms, connections, player_id):
-    print("Client disconnected:", player_id)
+def evict_player(registry, scheduler, player_id):
+    """Removes a player from their room for good: after their grace period, or right away."""
+    log.info("client_disconnected", player_id=player_id)
+    registry.sessions.end(player_id)
+    scheduler.cancel(("evict", player_id))
 
-    # Remove player from rooms
-    for room_id, room in rooms.items():
-        if any(p.id == player_id for p in room.players):
-            room.players = [p for p in room.players if p.id != player_id]
+    # Find the player's room through the index instead of scanning every room
+    room = registry.room_of(player_id)
+    if room:
+        room_id = room.id
+        registry.remove_player(room, player_id)
+        
+        # If game is in progress, clean up player's responses and votes
+        if room.currentRoundData:
+            remove_player_round_data(room, player_id)
             
-            # If game is in progress, clean up player's responses and votes
-            if room.currentRoundData:
-                # Remove player's responses
-                room.currentRoundData.responses = [
-                    r for r in room.currentRoundData.responses 
-                    if r.playerId != player_id
-                ]
-                # Remove player's votes
-                room.currentRoundData.votes = [
-                    v for v in room.currentRoundData.votes 
-                    if v.voterId != player_id
-                ]
-                
-                # If player was the target, we need to handle this specially
-                # For now, if target disconnects, we'll let the round continue
-                # but this is a game-breaking scenario that should be handled better
-                if room.currentRoundData.targetPlayerId == player_id:
-                    print(f"WARNING: Target player {player_id} disconnected during round!")
+            # If player was the target, we need to handle this specially
+            # For now, if target disconnects, we'll let the round continue
+            # but this is a game-breaking scenario that should be handled better
+            if room.currentRoundData.targetPlayerId == player_id:
+                log.warning("target_disconnected", room_id=room_id, player_id=player_id)
 
+        if room.players:
             # Broadcast updated room
-            await broadcast(
-                rooms,
-                connections,
+            broadcast(
+                registry,
                 room_id,
-                RoomUpdateResponse(room=room).model_dump(),
+                envelope(RoomUpdateResponse(room=room)),
                 exclude_player_id=player_id
             )
-            break
+            advance_if_complete(registry, scheduler, room)
+        else:
+            scheduler.cancel(room_id)
+            registry.remove_room(room_id)
     
-    connections.pop(player_id, None)
\ No newline at end of file
+    registry.disconnect(player_id)
+
+
+# --- Session resumption ---
+
+def connection_closed(registry, scheduler, conn, grace=RESUME_GRACE):
+    """Runs connection_lost in the player's room actor, after the room's queued events."""
+    room = registry.room_of(conn.player_id)
+    if room is None:
+        connection_lost(registry, scheduler, conn, grace)
+    else:
+        registry.actors.post(room.id, "disconnect", connection_lost, registry, scheduler, conn, grace)
+
+
+def connection_lost(registry, scheduler, conn, grace=RESUME_GRACE):
+    """
+    Called when a player's socket goes away. Seated players keep their seat for
+    grace seconds (RESUME_GRACE unless the heartbeat timed them out); anyone else
+    is cleaned up immediately.
+    """
+    player_id = conn.player_id
+    if registry.connections.get(player_id) is not conn:
+        return  # already replaced by a resumed connection
+    leave_audience_and_queue(registry, player_id)
+
+    room = registry.room_of(player_id)
+    if room is None or grace is None:
+        evict_player(registry, scheduler, player_id)
+        return
+
+    registry.disconnect(player_id)
+    suspend_player(registry, scheduler, room.id, player_id, grace=grace)
+
+
+def suspend_player(registry, scheduler, room_id, player_id, replayable=True, grace=RESUME_GRACE):
+    log.info("client_suspended", room_id=room_id, player_id=player_id)
+    registry.sessions.suspend(room_id, player_id, replayable)
+    room_timer(
+        registry, scheduler, room_id, grace,
+        expire_session, registry, scheduler, player_id, key=("evict", player_id)
+    )
+
+
+def expire_session(registry, scheduler, player_id):
+    """Grace period over: evicts the player, unless they resumed (or dropped again) while this waited in the mailbox."""
+    if not registry.sessions.is_suspended(player_id) or scheduler.pending(("evict", player_id)):
+        return
+    evict_player(registry, scheduler, player_id)
+
+
+def resume_session(conn, registry, scheduler, player_id) -> bool:
+    """
+    Puts a reconnecting player back in their seat. They get a short session_resumed
+    frame followed by whatever they missed, or a full room_joined if too much was
+    missed to replay. Returns False if the seat is gone.
+    """
+    room = registry.room_of(player_id)
+    player = registry.get_player(player_id)
+    if not room or not player:
+        return False
+
+    scheduler.cancel(("evict", player_id))
+    missed = registry.sessions.resume(player_id)
+    token = registry.sessions.issue(room.id, player_id)
+    log.info("client_resumed", room_id=room.id, player_id=player_id, replayed=len(missed) if missed is not None else None)
+
+    if missed is None:
+        send(conn, envelope(RoomJoinedResponse(
+            playerId=player_id,
+            roomId=room.id,
+            displayName=player.displayName,
+            isHost=player.isHost,
+            room=room,
+            resumeToken=token
+        )))
+        return True
+
+    send(conn, SessionResumedResponse(
+        playerId=player_id,
+        roomId=room.id,
+        resumeToken=token,
+        replayed=len(missed)
+    ).model_dump())
+    for frame in missed:
+        conn.enqueue(conn.codec.from_json(frame))  # kept as JSON while they were away
+    return True
+
+
+def restore_room(registry, scheduler, room):
+    """Adds a room loaded from storage: its players wait to resume and its phase timer is re-armed."""
+    registry.add_room(room)
+    if RESUME_GRACE is not None:
+        for player in room.players:
+            suspend_player(registry, scheduler, room.id, player.id, replayable=False)
+    resume_phase_timer(registry, scheduler, room)
+
+
+# --- Running the game state machine (game.py) ---
+
+def room_timer(registry, scheduler, room_id, delay, callback, *args, key=None):
+    """
+    Arms a timer (keyed by room_id unless key is given) whose callback is posted to
+    the room's actor when it fires, to run in order with the room's other events.
+    """
+    scheduler.schedule(
+        room_id if key is None else key, delay,
+        registry.actors.post, room_id, callback.__name__, callback, *args
+    )
+
+
+def run_game_event(registry, scheduler, room, event, player_id=None, data=None, round_id=None, conn=None):
+    """Applies a game event to the room and carries out what it calls for."""
+    try:
+        _, effects = game.apply(room, event, player_id, data, round_id)
+    except ValueError as e:  # an illegal transition: a bug in the rules table, not the request
+        log.error("game_event_failed", room_id=room.id, event=event, error=repr(e))
+        return
+    run_effects(registry, scheduler, room, event, effects, player_id, conn)
+
+
+def run_effects(registry, scheduler, room, event, effects, player_id=None, conn=None):
+    for effect in effects:
+        kind = effect[0]
+        if kind == "broadcast":
+            broadcast(registry, room.id, MESSAGES[effect[1]](room, *effect[2:]))
+        elif kind == "send":
+            send_to(registry, room.id, effect[1], MESSAGES[effect[2]](room, effect[1], *effect[3:]))
+        elif kind == "reply":
+            send(conn, MESSAGES[effect[1]](room, *effect[2:]))
+        elif kind == "timer":
+            _, delay, timer_event, round_id = effect
+            room_timer(registry, scheduler, room.id, delay, phase_timer, registry, scheduler, room.id, timer_event, round_id)
+        elif kind == "cancel_timer":
+            scheduler.cancel(room.id)
+        elif kind == "archive":
+            if registry.round_archive is not None:
+                registry.round_archive.archive_round(room.id, effect[1])
+        elif kind == "reject":
+            log.info(f"{event}_rejected", room_id=room.id, player_id=player_id, reason=effect[1])
+        elif kind == "error":
+            log.error(f"{event}_failed", room_id=room.id, error=effect[1])
+
+
+def phase_timer(registry, scheduler, room_id, event, round_id):
+    """A phase's time ran out (prompt shown, deadline passed, reveal over)."""
+    room = registry.get_room(room_id)
+    if room:
+        run_game_event(registry, scheduler, room, event, round_id=round_id)
+
+
+def advance_if_complete(registry, scheduler, room):
+    """
+    After a player leaves mid-round: moves the round on if it was only waiting
+    for them, rather than holding everyone else until the phase deadline.
+    """
+    run_game_event(registry, scheduler, room, "player_left")
+
+
+def resume_phase_timer(registry, scheduler, room):
+    """
+    Re-arms the pending transition for a room restored from storage.
+    Remaining time is not stored, so the phase gets its full duration again.
+    """
+    run_effects(registry, scheduler, room, "resume", game.timer(room))
+
+
+# Outbound frames named by the state machine's effects: message -> builder(room, *args)
+
+def _round_setup(room, player_id):
+    round_data = room.currentRoundData
+    target = room._members[round_data.targetPlayerId]
+    sender = room._members[round_data.promptSenderId]
+    return envelope(RoundSetupResponse(
+        room=room,
+        targetPlayerName=target.displayName or target.username,
+        promptSenderName=sender.displayName or sender.username,
+        yourRole="real_impersonator" if player_id == round_data.realImpersonatorId else "fake_responder"
+    ))
+
+
+def _prompt_display(room):
+    target = room._members[room.currentRoundData.targetPlayerId]
+    return envelope(PromptDisplayResponse(
+        room=room,
+        promptText=room.currentRoundData.prompt,
+        targetPlayerName=target.displayName or target.username
+    ))
+
+
+def _voting_phase(room):
+    # Anonymous copies for voting: who wrote what, and which is real, stay hidden
+    anonymous_responses = [
+        Response(id=r.id, playerId=None, text=r.text, isReal=False, voteCount=0)
+        for r in room.currentRoundData.responses
+    ]
+    return envelope(VotingPhaseResponse(room=room, responses=anonymous_responses))
+
+
+def _reveal_phase(room):
+    round_data = room.currentRoundData
+    return envelope(RevealPhaseResponse(
+        room=room,
+        responses=round_data.responses,  # playerId already set
+        votes=round_data.votes,
+        audienceVotes=audience_results(round_data)  # counts, however big the audience
+    ))
+
+
+def _scoring_phase(room, scores):
+    round_data = room.currentRoundData
+    # Round summary values are strings for JSON compatibility
+    round_summary = {
+        'roundNumber': str(round_data.roundNumber),
+        'targetPlayerId': round_data.targetPlayerId,
+        'realImpersonatorId': round_data.realImpersonatorId,
+        'totalVotes': str(len(round_data.votes))
+    }
+    return envelope(ScoringPhaseResponse(
+        room=room,
+        scores=scores,
+        roundSummary=round_summary,
+        standings=room._standings.table()
+    ))
+
+
+def _game_finished(room, winner):
+    return envelope(GameFinishedResponse(
+        room=room,
+        finalScores={p.id: p.points for p in room.players},
+        winner=winner
+    ))
+
+
+MESSAGES = {
+    "round_setup": _round_setup,
+    "prompt_display": _prompt_display,
+    "game_start": lambda room: envelope(GameStartedResponse(room=room)),
+    "room_update": lambda room: envelope(RoomUpdateResponse(room=room)),
+    "response_submitted": lambda room, all_submitted: envelope(ResponseSubmittedResponse(room=room, allSubmitted=all_submitted)),
+    "voting_phase": _voting_phase,
+    "vote_submitted": lambda room, all_voted: envelope(VoteSubmittedResponse(room=room, allVoted=all_voted)),
+    "reveal_phase": _reveal_phase,
+    "scoring_phase": _scoring_phase,
+    "round_complete": lambda room: envelope(RoundCompleteResponse(room=room)),
+    "game_finished": _game_finished,
+}
+
+
+async def handle_sync_subscribe(conn, registry, scheduler, request, player_id):
+    """
+    Opts the connection into delta room sync.
+    Clients that pass the last revision they hold get a patch from there;
+    everyone else (first join, resync) gets a full snapshot.
+    """
+    room = registry.get_room(request.roomId)
+    if not room or player_id not in room._members:
+        log.info("sync_rejected", room_id=request.roomId, player_id=player_id)
+        return
+
+    conn.delta_sync = True
+    conn.sync_revision = request.revision
+    conn.sync_room_id = room.id
+    frame, revision = sync_frame(conn, RoomEnvelope(room), {})
+    if conn.enqueue(frame):
+        conn.sync_revision = revision
+
+
+async def handle_sync_ack(conn, registry, scheduler, request, player_id):
+    """
+    Records the revision the client has applied.
+    An ack behind what was sent means frames were lost, so the next patch is
+    re-based on the acknowledged revision.
+    """
+    if not conn.delta_sync or request.roomId != conn.sync_room_id:
+        return  # an ack for a room the connection has since left
+    if conn.sync_revision is None or request.revision < conn.sync_revision:
+        conn.sync_revision = request.revision
+
+
+async def handle_watch_room(conn, registry, scheduler, request, player_id):
+    """
+    Adds the connection to a room's audience. Spectators aren't players: they get
+    the room with its secrets blanked, on the audience's own tick (see spectators.py).
+    """
+    room = registry.get_room(request.roomId)
+    if not room:
+        send_error(conn, f"Room {request.roomId} not found", request.type)
+        return
+    if player_id in room._members:
+        send_error(conn, "Players can't watch their own room", request.type)
+        return
+
+    registry.spectators.watch(room, conn)
+    log.info("spectator_joined", room_id=room.id, player_id=player_id, audience=registry.spectators.audience(room.id))
+
+
+async def handle_audience_vote(conn, registry, scheduler, request, player_id):
+    """
+    A spectator's vote during the voting phase. Counted in O(1) with no reply;
+    the audience sees the tallies on its next tick and the players at the reveal.
+    """
+    room = registry.get_room(request.roomId)
+    seat = registry.spectators.seat(request.roomId, player_id)
+    if not room or seat is None:
+        send_error(conn, f"Not watching room {request.roomId}", request.type)
+        return
+
+    if not process_audience_vote(room, seat, request.responseId):
+        send_error(conn, "Vote not counted", request.type)
+        return
+    AUDIENCE_VOTES.inc()
+    registry.spectators.changed(room)
+
+
+async def handle_get_round_history(conn, registry, scheduler, request, player_id):
+    """Pages back through a room's finished rounds: resident ones first, then the round archive."""
+    room = registry.get_room(request.roomId)
+    if not room or player_id not in room._members:
+        send_error(conn, f"Room {request.roomId} not found", request.type)
+        return
+
+    limit = max(1, min(request.limit, ROUND_HISTORY_PAGE))
+    rounds = room._history.page(request.before, limit)
+    if len(rounds) < limit and registry.round_archive is not None:
+        before = rounds[-1]["roundNumber"] if rounds else request.before
+        rounds += await registry.round_archive.load_rounds(room.id, before, limit - len(rounds))
+
+    send(conn, RoundHistoryResponse(roomId=room.id, rounds=rounds).model_dump())
@@ -0,0 +1,191 @@
+"""
+Spectators: connections watching a room without playing in it.
+- Kept apart from room.players, so broadcast() and the game never iterate them
+- A room change (seen through the registry's room observer) only marks the
+  room dirty; broadcasts add which event it was. One ticker task sends each dirty
+  room's audience the room as it is then, every SPECTATOR_TICK: a burst of
+  events costs spectators one frame, and the frame is encoded once per wire
+  format and shared by the whole audience
+- Frames are a full (redacted) room, so a spectator that falls behind just
+  skips updates until its queue drains; the room stays dirty until every
+  spectator has the latest
+- Each spectator gets an audience seat, a small int that indexes the audience
+  ballot's bitset of who has voted (tally.AudienceBallot). An audience and its
+  seats last as long as the room, so a spectator who leaves and watches again
+  gets their old seat back (and can't vote twice), and seats are never reused.
+  Ballot tallies go out with the room on the same tick
+- Until the reveal the round's secrets are blanked: realImpersonatorId, and
+  which player wrote which response (Response.playerId, isReal)
+- The audience is sent to SPECTATOR_FANOUT_CHUNK connections at a time with
+  the event loop given back in between, so a large audience doesn't hold up
+  the players' own events
+"""
+import asyncio
+
+from models import SpectatorUpdateResponse
+from helpers import audience_results
+from broadcaster import send_error
+from constants import SPECTATOR_TICK, SPECTATOR_FANOUT_CHUNK, SPECTATOR_BACKLOG
+from logger import get_logger
+from metrics import SPECTATOR_SKIPPED
+
+log = get_logger("spectators")
+
+SECRET_PHASES = ("prompt", "responding", "voting")  # round states that hide who wrote what
+
+
+def redact(room) -> dict:
+    """The room as spectators see it. Built on the room's cached dump, which is left untouched."""
+    view = room.dump()
+    round_data = view.get("currentRoundData")
+    if round_data is None or round_data["state"] not in SECRET_PHASES:
+        return view
+    return {
+        **view,
+        "currentRoundData": {
+            **round_data,
+            "realImpersonatorId": None,
+            "responses": [{**r, "playerId": None, "isReal": False} for r in round_data["responses"]],
+        },
+    }
+
+
+class _Audience:
+    __slots__ = ("conns", "seats", "next_seat", "event", "stale", "behind")
+
+    def __init__(self):
+        self.conns = {}  # player_id -> Connection
+        self.seats = {}  # player_id -> audience seat, kept after they stop watching
+        self.next_seat = 0
+        self.event = None  # type of the latest event since the audience's last frame
+        self.stale = False  # the room changed since the audience's last frame
+        self.behind = set()  # spectators skipped last time, backed up
+
+
+class SpectatorHub:
+    def __init__(self, tick: float = SPECTATOR_TICK, chunk: int = SPECTATOR_FANOUT_CHUNK, backlog: int = SPECTATOR_BACKLOG):
+        self.tick = tick
+        self.chunk = chunk
+        self.backlog = backlog
+        self._audiences = {}  # room_id -> _Audience
+        self._watching = {}  # spectator's player_id -> room_id
+        self._dirty = {}  # room_id -> Room changed since its audience's last frame
+        self._task = None
+
+    def __len__(self):
+        return len(self._watching)
+
+    def audience(self, room_id: str) -> int:
+        audience = self._audiences.get(room_id)
+        return len(audience.conns) if audience else 0
+
+    def watching(self, player_id: str):
+        return self._watching.get(player_id)
+
+    def seat(self, room_id: str, player_id: str):
+        """player_id's audience seat in the room, or None if they aren't watching it."""
+        audience = self._audiences.get(room_id)
+        if audience is None or player_id not in audience.conns:
+            return None
+        return audience.seats[player_id]
+
+    def watch(self, room, conn):
+        """Adds conn to the room's audience and sends it the room right away."""
+        self.unwatch(conn.player_id)
+        audience = self._audiences.get(room.id)
+        if audience is None:
+            audience = self._audiences[room.id] = _Audience()
+        audience.conns[conn.player_id] = conn
+        if conn.player_id not in audience.seats:
+            audience.seats[conn.player_id] = audience.next_seat
+            audience.next_seat += 1
+        self._watching[conn.player_id] = room.id
+        conn.enqueue(conn.codec.encode(self._payload(room, audience, event=None)))
+
+    def unwatch(self, player_id: str) -> bool:
+        room_id = self._watching.pop(player_id, None)
+        if room_id is None:
+            return False
+        audience = self._audiences[room_id]
+        del audience.conns[player_id]
+        audience.behind.discard(player_id)
+        if not audience.conns:  # the audience (and its seats) stays until the room is removed
+            self._dirty.pop(room_id, None)
+        return True
+
+    def changed(self, room, event: str = None):
+        """Called on every room change and room-carrying broadcast; cheap when nobody is watching."""
+        audience = self._audiences.get(room.id)
+        if audience is None or not audience.conns:
+            return
+        if event is not None:
+            audience.event = event
+        audience.stale = True
+        self._dirty[room.id] = room
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def room_removed(self, room_id: str):
+        audience = self._audiences.pop(room_id, None)
+        self._dirty.pop(room_id, None)
+        if audience is None:
+            return
+        for player_id, conn in audience.conns.items():
+            del self._watching[player_id]
+            send_error(conn, f"Room {room_id} closed", "watch_room")
+
+    def _payload(self, room, audience: _Audience, event) -> dict:
+        round_data = room.currentRoundData
+        ballot = round_data._audience if round_data else None
+        return SpectatorUpdateResponse(
+            roomId=room.id,
+            room=redact(room),
+            event=event,
+            spectators=len(audience.conns),
+            audienceVotes=audience_results(round_data) if ballot else None,
+            audienceVoters=ballot.voters if ballot else 0
+        ).model_dump()
+
+    async def _run(self):
+        try:
+            while self._dirty:
+                await asyncio.sleep(self.tick)
+                dirty, self._dirty = self._dirty, {}
+                for room in dirty.values():
+                    await self._flush(room)
+        except Exception as e:
+            log.error("spectator_tick_failed", error=repr(e))
+        finally:
+            self._task = None
+
+    async def _flush(self, room):
+        audience = self._audiences.get(room.id)
+        if audience is None:
+            return
+        if audience.stale:
+            conns = list(audience.conns.values())
+        else:  # only catching up spectators that were backed up
+            conns = [audience.conns[player_id] for player_id in audience.behind if player_id in audience.conns]
+        payload = self._payload(room, audience, audience.event)
+        audience.event = None
+        audience.stale = False
+        audience.behind = set()
+
+        frames = {}  # codec name -> frame, shared by the whole audience
+        behind = audience.behind
+        for start in range(0, len(conns), self.chunk):
+            for conn in conns[start:start + self.chunk]:
+                queue = getattr(conn, "queue", None)
+                if queue is not None and queue.qsize() >= self.backlog:
+                    behind.add(conn.player_id)
+                    continue
+                codec = conn.codec
+                if codec.name not in frames:
+                    frames[codec.name] = codec.encode(payload)
+                conn.enqueue(frames[codec.name])
+            await asyncio.sleep(0)  # let the players' events in between chunks
+
+        if behind:
+            SPECTATOR_SKIPPED.inc(amount=len(behind))
+            if self._audiences.get(room.id) is audience:
+                self._dirty.setdefault(room.id, room)  # try them again next tick
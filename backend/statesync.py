@@ -0,0 +1,131 @@
+"""
+Versioned room state sync.
+Each room keeps a monotonically increasing revision and a bounded history of
+JSON-patch-style diffs between consecutive serialized states, so clients that
+opt in receive small patches instead of the full Room on every event.
+"""
+from collections import deque
+from typing import Optional
+
+from constants import ROOM_PATCH_HISTORY
+
+
+def _escape(key) -> str:
+    """Escape a key for use as a JSON pointer segment (RFC 6901)."""
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def diff(old, new, path: str = "") -> list:
+    """
+    Returns the JSON patch operations (add, remove, replace) that turn old into new.
+    Dicts are diffed by key and lists by index; anything else is replaced whole.
+    """
+    if old is new or old == new:
+        return []
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key, value in new.items():
+            pointer = f"{path}/{_escape(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": pointer, "value": value})
+            else:
+                ops.extend(diff(old[key], value, pointer))
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list):
+        ops = []
+        common = min(len(old), len(new))
+        for i in range(common):
+            ops.extend(diff(old[i], new[i], f"{path}/{i}"))
+        for i in range(common, len(new)):
+            ops.append({"op": "add", "path": f"{path}/{i}", "value": new[i]})
+        # Remove from the end so earlier indices stay valid
+        for i in range(len(old) - 1, common - 1, -1):
+            ops.append({"op": "remove", "path": f"{path}/{i}"})
+        return ops
+
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+class RoomStateSync:
+    """
+    Revision tracker for one room.
+    - commit() records a new serialized state and bumps the revision if it changed;
+      passing the room's mutation version skips the diff when nothing was touched
+    - ops_since() returns the patch from an older revision to the current one,
+      or None if that revision has fallen out of the history (client needs a snapshot)
+    """
+
+    def __init__(self, history_size: int = ROOM_PATCH_HISTORY):
+        self.revision = 0
+        self.snapshot: Optional[dict] = None
+        self.history = deque(maxlen=history_size)  # (revision, ops) pairs
+        self.committed_version = None
+
+    def commit(self, state: dict, version: int = None) -> int:
+        if version is not None and version == self.committed_version:
+            return self.revision
+        self.committed_version = version
+
+        if self.snapshot is None:
+            self.snapshot = state
+            self.revision += 1
+            return self.revision
+
+        ops = diff(self.snapshot, state)
+        if ops:
+            self.revision += 1
+            self.history.append((self.revision, ops))
+            self.snapshot = state
+        return self.revision
+
+    def ops_since(self, revision: int) -> Optional[list]:
+        if revision == self.revision:
+            return []
+        if revision > self.revision or not self.history:
+            return None
+
+        oldest_base = self.history[0][0] - 1
+        if revision < oldest_base:
+            return None
+
+        ops = []
+        for rev, rev_ops in self.history:
+            if rev > revision:
+                ops.extend(rev_ops)
+        return ops
+
+
+def apply_patch(doc, ops: list):
+    """Applies operations produced by diff() to doc in place and returns the result."""
+    for op in ops:
+        parts = [
+            part.replace("~1", "/").replace("~0", "~")
+            for part in op["path"].split("/")[1:]
+        ]
+        if not parts:
+            doc = op["value"]
+            continue
+
+        target = doc
+        for part in parts[:-1]:
+            target = target[int(part)] if isinstance(target, list) else target[part]
+
+        last = parts[-1]
+        if isinstance(target, list):
+            index = int(last)
+            if op["op"] == "add":
+                target.insert(index, op["value"])
+            elif op["op"] == "remove":
+                del target[index]
+            else:
+                target[index] = op["value"]
+        elif op["op"] == "remove":
+            del target[last]
+        else:
+            target[last] = op["value"]
+    return doc
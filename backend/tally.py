@@ -0,0 +1,229 @@
+"""
+Incremental scoring.
+- RoundTally keeps a round's correct/fooled counts and every player's points for
+  the round, updated in O(1) as responses and votes come and go, so scoring just
+  reads them. Scoring rules:
+  - real impersonator: +2 per vote for the real response, +1 per vote for any other
+  - fake responder: +1 per vote their response received
+  - voter: +1 for picking the real response (not the impersonator themselves)
+  - nobody scores in a round without a real response
+- Standings is a room's leaderboard on live totals (points plus the current round's
+  provisional points), kept sorted as totals change, so ranks and the leader are
+  read without recomputing. Provisional totals are server-side only until scoring,
+  since they would give away the real response
+- AudienceBallot counts a round's audience votes: a counter per response and a
+  bitset of audience seats that have voted, so a vote is O(1) and the tallies
+  are the same size however many people watch. The audience doesn't score
+Changes return the (player_id, points) credits they made so the caller can pass
+them on to Standings.
+"""
+from array import array
+from bisect import bisect_left, insort
+from itertools import count
+
+
+class RoundTally:
+    __slots__ = ("impersonator", "real_response", "correct", "fooled", "points", "closed", "_authors", "_votes")
+
+    def __init__(self, impersonator_id: str):
+        self.impersonator = impersonator_id
+        self.real_response = None  # id of the real response, once submitted
+        self.correct = 0  # votes for the real response
+        self.fooled = 0  # votes for anything else
+        self.points = {}  # player_id -> points this round
+        self.closed = False  # scored; later changes no longer count
+        self._authors = {}  # response_id -> author of a fake response still in the round
+        self._votes = {}  # voter_id -> (response_id, whether it was the real one)
+
+    @classmethod
+    def from_round(cls, round_data) -> "RoundTally":
+        tally = cls(round_data.realImpersonatorId)
+        for response in round_data.responses:
+            tally.response_added(response)
+        for vote in round_data.votes:
+            response = round_data._responses_by_id.get(vote.responseId)
+            tally._count(vote.voterId, vote.responseId, response is not None and response.isReal)
+        tally.closed = round_data.state == "scoring"
+        return tally
+
+    @property
+    def valid(self) -> bool:
+        return self.real_response is not None and not self.closed
+
+    def scores(self, players) -> dict:
+        """player_id -> points this round, for each of players."""
+        if self.real_response is None:
+            return {p.id: 0 for p in players}
+        return {p.id: self.points.get(p.id, 0) for p in players}
+
+    def discard(self) -> list:
+        """Closes a round that ends without being scored. Returns the credits that undo its provisional points."""
+        credits = self._all_points(-1) if self.valid else []
+        self.closed = True
+        return credits
+
+    # --- Changes ---
+
+    def response_added(self, response) -> list:
+        if response.isReal:
+            self.real_response = response.id
+            return self._all_points(1) if self.valid else []
+        if response.playerId is not None:
+            self._authors[response.id] = response.playerId
+        return []
+
+    def response_removed(self, response) -> list:
+        if response.id == self.real_response:
+            credits = self._all_points(-1) if self.valid else []
+            self.real_response = None
+            return credits
+        author = self._authors.pop(response.id, None)
+        if author is None or not response.voteCount:
+            return []
+        # Votes it got still count as fooled for the impersonator, but no longer for its author
+        return self._credit([(author, -response.voteCount)])
+
+    def vote_added(self, voter_id: str, response) -> list:
+        return self._count(voter_id, response.id, response.isReal)
+
+    def vote_removed(self, voter_id: str) -> list:
+        vote = self._votes.pop(voter_id, None)
+        if vote is None:
+            return []
+        response_id, is_real = vote
+        if is_real:
+            self.correct -= 1
+            credits = [(self.impersonator, -2)]
+            if voter_id != self.impersonator:
+                credits.append((voter_id, -1))
+        else:
+            self.fooled -= 1
+            credits = [(self.impersonator, -1)]
+            if response_id in self._authors:
+                credits.append((self._authors[response_id], -1))
+        return self._credit(credits)
+
+    def _count(self, voter_id: str, response_id: str, is_real: bool) -> list:
+        self._votes[voter_id] = (response_id, is_real)
+        if is_real:
+            self.correct += 1
+            credits = [(self.impersonator, 2)]
+            if voter_id != self.impersonator:
+                credits.append((voter_id, 1))
+        else:
+            self.fooled += 1
+            credits = [(self.impersonator, 1)]
+            if response_id in self._authors:
+                credits.append((self._authors[response_id], 1))
+        return self._credit(credits)
+
+    def _credit(self, credits: list) -> list:
+        if self.closed:
+            return []
+        for player_id, points in credits:
+            self.points[player_id] = self.points.get(player_id, 0) + points
+        return credits if self.real_response is not None else []
+
+    def _all_points(self, sign: int) -> list:
+        return [(player_id, sign * points) for player_id, points in self.points.items() if points]
+
+
+class Standings:
+    """
+    A room's players ordered by live total, highest first; ties keep join order.
+    Entries are kept in a sorted list: O(log n) to find, and a memmove of a few
+    pointers to move, for a room's worth of players.
+    """
+    __slots__ = ("_entries", "_keys", "_seq")
+
+    def __init__(self):
+        self._entries = []  # sorted (-total, seq, player_id)
+        self._keys = {}  # player_id -> its entry
+        self._seq = count()
+
+    @classmethod
+    def from_room(cls, room) -> "Standings":
+        standings = cls()
+        tally = room.currentRoundData._tally if room.currentRoundData else None
+        for player in room.players:
+            provisional = tally.points.get(player.id, 0) if tally is not None and tally.valid else 0
+            standings.add(player.id, player.points + provisional)
+        return standings
+
+    def add(self, player_id: str, total: int):
+        key = (-total, next(self._seq), player_id)
+        self._keys[player_id] = key
+        insort(self._entries, key)
+
+    def remove(self, player_id: str):
+        key = self._keys.pop(player_id, None)
+        if key is not None:
+            del self._entries[bisect_left(self._entries, key)]
+
+    def adjust(self, player_id: str, points: int):
+        key = self._keys.get(player_id)
+        if key is None or not points:
+            return
+        del self._entries[bisect_left(self._entries, key)]
+        key = (key[0] - points, key[1], player_id)
+        self._keys[player_id] = key
+        insort(self._entries, key)
+
+    def apply(self, credits: list):
+        for player_id, points in credits:
+            self.adjust(player_id, points)
+
+    # --- Reads ---
+
+    def total(self, player_id: str):
+        key = self._keys.get(player_id)
+        return -key[0] if key is not None else None
+
+    def rank(self, player_id: str):
+        """1 + the number of players strictly ahead; tied players share a rank."""
+        key = self._keys.get(player_id)
+        return bisect_left(self._entries, (key[0],)) + 1 if key is not None else None
+
+    def leader(self):
+        return self._entries[0][2] if self._entries else None
+
+    def table(self) -> list:
+        """The leaderboard as the wire sends it, highest first."""
+        return [
+            {"playerId": player_id, "points": -neg_total, "rank": self.rank(player_id)}
+            for neg_total, _, player_id in self._entries
+        ]
+
+
+class AudienceBallot:
+    """A round's audience vote, opened on the first audience vote of the voting phase."""
+    __slots__ = ("slots", "counts", "voted", "voters", "closed")
+
+    def __init__(self, response_ids):
+        self.slots = {response_id: i for i, response_id in enumerate(response_ids)}  # response_id -> counter
+        self.counts = array("L", bytes(array("L").itemsize * len(self.slots)))
+        self.voted = bytearray()  # bit per audience seat
+        self.voters = 0
+        self.closed = False  # voting is over; the counts are final
+
+    def vote(self, seat: int, response_id: str) -> bool:
+        """Counts seat's vote. False if the ballot is closed, the seat already voted or the response isn't on it."""
+        slot = self.slots.get(response_id)
+        if slot is None or self.closed:
+            return False
+        byte, bit = divmod(seat, 8)
+        if byte >= len(self.voted):
+            self.voted.extend(bytes(byte + 1 - len(self.voted)))
+        elif self.voted[byte] & (1 << bit):
+            return False
+        self.voted[byte] |= 1 << bit
+        self.counts[slot] += 1
+        self.voters += 1
+        return True
+
+    def results(self, response_ids) -> dict:
+        """response_id -> audience votes, for the responses still in the round."""
+        return {
+            response_id: self.counts[self.slots[response_id]] if response_id in self.slots else 0
+            for response_id in response_ids
+        }
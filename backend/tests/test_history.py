@@ -0,0 +1,27 @@
+from history import RoundHistory
+from models import Response, Round
+
+
+def finished_round(number: int) -> Round:
+    return Round(
+        id=f"r{number}", roundNumber=number, prompt="hi", targetPlayerId="a", promptSenderId="b", realImpersonatorId="c",
+        responses=[Response(id=f"x{number}", playerId="c", text=f"reply {number}", isReal=True)],
+        state="scoring",
+    )
+
+
+def test_without_retention_every_round_stays_resident():
+    history = RoundHistory(retention=None)
+    for number in range(1, 11):
+        history.add(finished_round(number))
+
+    assert [r["roundNumber"] for r in history.page(None, 20)] == list(range(10, 0, -1))
+    assert [r["roundNumber"] for r in history.page(4, 20)] == [3, 2, 1]
+
+
+def test_retention_keeps_only_the_newest_rounds():
+    history = RoundHistory(retention=3)
+    for number in range(1, 11):
+        history.add(finished_round(number))
+
+    assert [r["roundNumber"] for r in history.page(None, 20)] == [10, 9, 8]
@@ -0,0 +1,56 @@
+import asyncio
+
+from models import Player, Room
+from persistence import SQLiteRoomStore
+
+
+def new_room(room_id: str, host_id: str) -> Room:
+    host = Player(id=host_id, username=host_id, displayName=host_id, isHost=True, points=0)
+    return Room(id=room_id, hostId=host_id, players=[host])
+
+
+def archived_round(number: int, text: str) -> dict:
+    return {"roundNumber": number, "responses": [{"text": text}]}
+
+
+def test_reused_code_does_not_inherit_round_history(tmp_path):
+    async def run():
+        store = SQLiteRoomStore(str(tmp_path / "rooms.db"))
+        try:
+            store.room_changed(new_room("GGBZ", "a"))
+            store.archive_round("GGBZ", archived_round(1, "secret text from b"))
+            await store.flush()
+
+            # The room empties out and its code is handed straight to the next room,
+            # all before the next flush
+            store.archive_round("GGBZ", archived_round(2, "secret text from c"))
+            store.room_removed("GGBZ")
+            store.room_changed(new_room("GGBZ", "z"))
+            await store.flush()
+            assert await store.load_rounds("GGBZ", None, 10) == []
+
+            # The new room's own rounds are kept
+            store.archive_round("GGBZ", archived_round(1, "new game"))
+            assert [r["responses"][0]["text"] for r in await store.load_rounds("GGBZ", None, 10)] == ["new game"]
+        finally:
+            await store.stop()
+
+    asyncio.run(run())
+
+
+def test_removal_and_new_rounds_in_one_flush(tmp_path):
+    async def run():
+        store = SQLiteRoomStore(str(tmp_path / "rooms.db"))
+        try:
+            store.archive_round("GGBZ", archived_round(1, "old game"))
+            store.archive_round("GGBZ", archived_round(2, "old game"))
+            store.room_removed("GGBZ")
+            store.room_changed(new_room("GGBZ", "z"))
+            store.archive_round("GGBZ", archived_round(1, "new game"))
+            rounds = await store.load_rounds("GGBZ", None, 10)
+            assert [r["responses"][0]["text"] for r in rounds] == ["new game"]
+            assert [room.hostId for room in await store.load()] == ["z"]
+        finally:
+            await store.stop()
+
+    asyncio.run(run())
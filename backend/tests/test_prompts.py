@@ -0,0 +1,14 @@
+import random
+
+from prompts import BuiltinPack, FilePack, PromptCatalog, PromptSampler, PROMPT_TEMPLATES
+
+
+def test_empty_sole_pack_falls_back_to_builtin(tmp_path):
+    path = tmp_path / "spooky.txt"
+    path.write_text("# tags: spooky\n")  # a header and no prompts
+    catalog = PromptCatalog([BuiltinPack(PROMPT_TEMPLATES), FilePack(str(path))])
+
+    sampler = PromptSampler(catalog, ["spooky"], random.Random(1))
+    assert [pack.name for pack in sampler.packs] == ["spooky"]
+    assert sampler.next().render("T", "S")
+    assert [pack.name for pack in sampler.packs] == ["core"]
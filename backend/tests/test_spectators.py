@@ -0,0 +1,65 @@
+import asyncio
+
+from helpers import process_audience_vote
+from models import Player, Response, Room, Round
+from spectators import SpectatorHub
+from wire import JSON
+
+
+class FakeConn:
+    codec = JSON
+
+    def __init__(self, player_id: str):
+        self.player_id = player_id
+        self.frames = []
+
+    def enqueue(self, frame):
+        self.frames.append(frame)
+
+
+def voting_room() -> Room:
+    players = [Player(id=p, username=p, displayName=p, isHost=p == "a", points=0) for p in "abc"]
+    round_data = Round(
+        id="r1", roundNumber=1, prompt="hi", targetPlayerId="a", promptSenderId="b", realImpersonatorId="c",
+        responses=[Response(id="x", playerId="b", text="yo", isReal=False), Response(id="y", playerId="c", text="sup", isReal=True)],
+        state="voting",
+    )
+    return Room(id="ROOM", hostId="a", players=players, state="playing", currentRoundData=round_data)
+
+
+def audience_vote(hub: SpectatorHub, room: Room, player_id: str, response_id: str) -> bool:
+    seat = hub.seat(room.id, player_id)
+    return seat is not None and process_audience_vote(room, seat, response_id)
+
+
+def test_rewatching_does_not_grant_a_second_vote():
+    async def run():
+        hub = SpectatorHub(tick=60)
+        room = voting_room()
+        hub.watch(room, FakeConn("t"))  # keeps the audience open throughout
+        conn = FakeConn("s")
+
+        hub.watch(room, conn)
+        assert audience_vote(hub, room, "s", "x")
+
+        hub.watch(room, conn)  # watching again from the same connection
+        assert not audience_vote(hub, room, "s", "y")
+
+        hub.unwatch("s")
+        assert hub.seat(room.id, "s") is None
+        hub.watch(room, FakeConn("s"))  # and after leaving, from a new one
+        assert not audience_vote(hub, room, "s", "y")
+
+        ballot = room.currentRoundData._audience
+        assert ballot.voters == 1
+        assert ballot.results(["x", "y"]) == {"x": 1, "y": 0}
+
+        # The others still have seats of their own, even once the audience has emptied out
+        assert audience_vote(hub, room, "t", "y")
+        hub.unwatch("s")
+        hub.unwatch("t")
+        hub.watch(room, FakeConn("u"))
+        assert audience_vote(hub, room, "u", "y")
+        assert ballot.voters == 3
+
+    asyncio.run(run())
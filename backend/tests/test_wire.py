@@ -0,0 +1,19 @@
+import pytest
+from pydantic import ValidationError
+
+from handlers import parse_message
+from wire import JSON, MSGPACK
+
+
+@pytest.mark.parametrize("codec", [JSON, MSGPACK])
+def test_decode_round_trips(codec):
+    payload = {"type": "join_room", "roomId": "ABCD", "username": "ana"}
+    frame = codec.encode(payload)
+    assert codec.decode(frame) == payload
+    assert parse_message(frame if codec.binary else frame.encode(), codec).roomId == "ABCD"
+
+
+@pytest.mark.parametrize("codec, frame", [(JSON, b"{not json"), (JSON, "\"unterminated"), (MSGPACK, b"\xc1")])
+def test_decode_rejects_malformed_frames(codec, frame):
+    with pytest.raises(ValidationError, match="Invalid (JSON|MessagePack) frame"):
+        codec.decode(frame)
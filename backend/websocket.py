@@ -1,72 +1,107 @@
 from fastapi import WebSocket, WebSocketDisconnect
+import time
 import uuid
 
-from sockets import (
-    handle_create_room, handle_join_room, handle_send_message, 
-    handle_leave_room, handle_disconnect, handle_start_game,
-    handle_submit_response, handle_submit_vote, handle_next_round
-)
-from helpers import validate_room_id
-from handlers import parse_message
-
-async def handle_websocket(ws: WebSocket, rooms: dict, connections: dict):
-    await ws.accept()
-    player_id = str(uuid.uuid4()) # generates a random player_id 
-    connections[player_id] = ws # maps player id to websocket connection
-
-    print("Client connected:", player_id)
+from pydantic import ValidationError
+
+from sockets import connection_closed, resume_session
+from broadcaster import Connection, send_error
+from handlers import parse_message, describe_error, dispatch
+from logger import get_logger
+from wire import negotiate
+from ratelimit import RateLimiter, ANY
+from metrics import HANDLER_SECONDS, RATE_LIMITED
+
+log = get_logger("websocket")
+
+async def handle_websocket(ws: WebSocket, registry, scheduler, node=None):
+    # Clients pick a wire format by offering its subprotocol; no offer means JSON
+    offered = ws.scope.get("subprotocols") or []
+    codec = negotiate(offered)
+    await ws.accept(subprotocol=codec.name if codec.name in offered else None)
+
+    # Reconnecting with ?resume=<token> from room_joined keeps the player's seat
+    token = ws.query_params.get("resume")
+    session = registry.sessions.verify(token) if token else None
+    player_id = session[1] if session else str(uuid.uuid4()) # generates a random player_id 
+    conn = Connection(ws, player_id, codec=codec)
+    limiter = RateLimiter() # inbound budgets for this socket
+    previous = registry.connections.get(player_id)
+    registry.connect(player_id, conn) # maps player id to its outbound connection
+    if previous is not None:
+        previous.supersede() # the old socket hasn't noticed it's dead yet
+    heartbeat = registry.heartbeat
+    if heartbeat is not None:
+        heartbeat.add(conn) # pinged when quiet, dropped when silent
+
+    log.info("client_connected", player_id=player_id, resuming=session is not None, codec=codec.name)
+    if session and node is not None and not node.owns(session[0]):
+        node.resume(conn, session[0])
+    elif token and not (session and resume_session(conn, registry, scheduler, player_id)):
+        send_error(conn, "Session expired", "resume")
 
     try:
         while True: # keeps connection open
             message = await ws.receive()
+            conn.last_seen = time.monotonic() # any frame shows the client is still there
 
             if message["type"] == "websocket.disconnect":
-                print(f"Disconnecting {player_id}")
+                log.info("client_disconnecting", player_id=player_id)
                 break
 
-            raw = message.get("text")
+            raw = message.get("text") or message.get("bytes")
             if not raw:
                 continue
 
-            request = parse_message(raw) # pydantic
-
-            print(f"REQUEST {request.type}")
-
-            # ---- Routing by type ----
-            match request.type:
-
-                case "create_room":
-                    await handle_create_room(ws, rooms, request, player_id)
-
-                case "join_room":
-                    if not validate_room_id(request, rooms):
-                        continue
-
-                    await handle_join_room(ws, rooms, connections, request, player_id)
-
-                case "start_game":
-                    await handle_start_game(rooms, connections, request, player_id)
-
-                case "send_message":
-                    await handle_send_message(ws, rooms, connections, request, player_id)
-
-                case "leave_room":
-                    if not validate_room_id(request, rooms):
-                        break
+            # Over-budget frames are dropped before they are even parsed
+            if not limiter.allow():
+                _rate_limited(conn, limiter, None)
+                continue
 
-                    await handle_leave_room(rooms, connections, request, player_id)
+            started = time.perf_counter()
+            try:
+                request = parse_message(raw, codec) # pydantic, straight from the raw frame
+            except ValidationError as e:
+                error_message, request_type = describe_error(e)
+                log.info("bad_request", player_id=player_id, event=request_type, error=error_message)
+                send_error(conn, error_message, request_type)
+                continue
 
-                case "submit_response":
-                    await handle_submit_response(rooms, connections, request, player_id)
+            if not limiter.allow(request.type):
+                _rate_limited(conn, limiter, request.type)
+                continue
 
-                case "submit_vote":
-                    await handle_submit_vote(rooms, connections, request, player_id)
+            # When sharded, requests for rooms owned by another worker go there instead;
+            # pongs answer this socket's heartbeat, so they are always handled here
+            if node is not None and request.type != "pong" and node.intercept(conn, request, raw):
+                continue
 
-                case "next_round":
-                    await handle_next_round(rooms, connections, request, player_id)
+            await dispatch(conn, registry, scheduler, request, player_id)
 
-            print(f"Rooms {rooms}")
-            print(f"Connections {connections}")
+            latency = time.perf_counter() - started
+            HANDLER_SECONDS.observe(latency, request.type)
+            log.debug(
+                "message_handled",
+                event=request.type,
+                room_id=getattr(request, "roomId", None),
+                player_id=player_id,
+                latency_ms=round(latency * 1000, 3)
+            )
 
     except WebSocketDisconnect:
-        await handle_disconnect(rooms, connections, player_id)
+        log.info("client_disconnecting", player_id=player_id)
+
+    finally:
+        if heartbeat is not None:
+            heartbeat.discard(conn)
+        if node is not None:
+            node.forward_disconnect(conn)
+        connection_closed(registry, scheduler, conn)
+        await conn.close()
+
+
+def _rate_limited(conn, limiter, request_type):
+    RATE_LIMITED.inc(request_type or ANY)
+    if limiter.warn(request_type or ANY):
+        log.info("rate_limited", player_id=conn.player_id, event=request_type, rejected=limiter.rejected)
+        send_error(conn, "Too many requests, slow down", request_type)
@@ -0,0 +1,159 @@
+"""
+Wire formats for the /ws endpoint, negotiated through the WebSocket subprotocol.
+- who-texted.json (or no subprotocol): JSON text frames, unchanged
+- who-texted.msgpack.v1: MessagePack binary frames. Map keys that appear in
+  FIELD_TAGS are sent as their index instead of the name (a one-byte int), both
+  ways; any other key (player ids in scores, ...) stays a string. Values are never
+  tagged, so JSON patch paths still use field names
+- The envelope is the same in every format: a map with "type" and the event's
+  fields, so the two differ only in bytes
+FIELD_TAGS is append-only: a tag, once shipped, keeps its meaning. Removing or
+reordering entries needs a new subprotocol version.
+"""
+import json
+
+import msgpack
+from pydantic import ValidationError
+from pydantic_core import PydanticCustomError
+
+FIELD_TAGS = (
+    # Envelope
+    "type", "room", "roomId", "playerId", "event", "message", "requestType",
+    # Room
+    "id", "hostId", "players", "state", "currentRound", "maxRounds", "currentPrompt",
+    "currentRoundData", "rounds", "promptTags",
+    # Player
+    "username", "displayName", "isHost", "points",
+    # Round, Response, Vote
+    "roundNumber", "prompt", "targetPlayerId", "promptSenderId", "realImpersonatorId",
+    "responses", "votes", "text", "isReal", "voteCount", "voterId", "responseId",
+    # Events
+    "resumeToken", "replayed", "url", "senderId", "senderDisplayName", "targetPlayerName",
+    "promptSenderName", "yourRole", "promptText", "allSubmitted", "allVoted", "scores",
+    "roundSummary", "totalVotes", "finalScores", "winner", "before", "limit",
+    # Room state sync
+    "revision", "baseRevision", "ops", "op", "path", "value",
+    # Standings
+    "standings", "rank",
+    # Chat
+    "messages",
+    # Spectators
+    "spectators", "audienceVotes", "audienceVoters",
+    # Matchmaking
+    "waiting",
+)
+_TAG_OF = {name: tag for tag, name in enumerate(FIELD_TAGS)}
+
+
+def tag_key(key):
+    return _TAG_OF.get(key, key)
+
+
+def tag(value):
+    """Replaces known map keys with their tags, recursively."""
+    if isinstance(value, dict):
+        return {_TAG_OF.get(key, key): tag(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [tag(item) for item in value]
+    return value
+
+
+def untag(value):
+    """Inverse of tag(). Unknown int keys are left as they are."""
+    if isinstance(value, dict):
+        return {
+            (FIELD_TAGS[key] if isinstance(key, int) and 0 <= key < len(FIELD_TAGS) else key): untag(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [untag(item) for item in value]
+    return value
+
+
+def pack(payload) -> bytes:
+    return msgpack.packb(tag(payload))
+
+
+def invalid_frame(fmt: str, error: Exception, raw) -> ValidationError:
+    """The ValidationError for a frame that isn't valid fmt, as handlers report any malformed request."""
+    return ValidationError.from_exception_data("IncomingMessage", [{
+        "type": PydanticCustomError("frame_invalid", "Invalid {format} frame: {error}", {"format": fmt, "error": type(error).__name__}),
+        "loc": (),
+        "input": raw,
+    }])
+
+
+class JsonCodec:
+    name = "who-texted.json"
+    binary = False
+
+    def encode(self, payload: dict) -> str:
+        """Serialize a payload once, in the same compact form Starlette's send_json produces."""
+        return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+    def encode_room(self, fields: dict, room) -> str:
+        """An envelope carrying the room, with the room's cached JSON spliced in."""
+        head = self.encode(fields)
+        if head == "{}":
+            return '{"room":' + room.dump_json() + "}"
+        return head[:-1] + ',"room":' + room.dump_json() + "}"
+
+    def from_json(self, frame: str) -> str:
+        return frame
+
+    def decode(self, raw: str | bytes):
+        """
+        Decodes a frame into a plain dict. Raises ValidationError if it is not JSON.
+        parse_message validates JSON frames straight from the raw text instead.
+        """
+        try:
+            return json.loads(raw)
+        except (ValueError, TypeError) as e:
+            raise invalid_frame("JSON", e, raw)
+
+
+class MsgpackCodec:
+    name = "who-texted.msgpack.v1"
+    binary = True
+
+    def encode(self, payload: dict) -> bytes:
+        return pack(payload)
+
+    def encode_room(self, fields: dict, room) -> bytes:
+        """An envelope carrying the room, with the room's cached MessagePack appended as the last entry."""
+        packer = msgpack.Packer()
+        head = bytearray(packer.pack_map_header(len(fields) + 1))
+        for key, value in fields.items():
+            head += packer.pack(tag_key(key))
+            head += packer.pack(tag(value))
+        head += packer.pack(_TAG_OF["room"])
+        head += room.dump_packed()
+        return bytes(head)
+
+    def from_json(self, frame: str) -> bytes:
+        """Transcodes a JSON frame, e.g. one replayed to a resumed session or relayed by another worker."""
+        return pack(json.loads(frame))
+
+    def decode(self, raw: bytes):
+        """Decodes a client frame into plain names. Raises ValidationError if it is not MessagePack."""
+        try:
+            return untag(msgpack.unpackb(raw, strict_map_key=False))
+        except (ValueError, TypeError, msgpack.UnpackException) as e:
+            raise invalid_frame("MessagePack", e, raw)
+
+
+JSON = JsonCodec()
+MSGPACK = MsgpackCodec()
+CODECS = {codec.name: codec for codec in (JSON, MSGPACK)}
+
+
+def negotiate(offered) -> JsonCodec | MsgpackCodec:
+    """
+    Picks the first subprotocol the client offered that we speak.
+    Returns JSON when it offered none of ours; the caller accepts without a
+    subprotocol in that case, as before negotiation existed.
+    """
+    for name in offered or ():
+        if name in CODECS:
+            return CODECS[name]
+    return JSON